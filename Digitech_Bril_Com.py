@@ -4,6 +4,10 @@ import time
 import datetime
 import digitech_gui
 import os
+from output_writers import CommitPolicy
+from acquisition_engine import AcquisitionEngine
+import protocol
+import profiling
 
 
 # Configure serial port
@@ -19,33 +23,55 @@ os.makedirs(DEFAULT_OUTPUT_PATH, exist_ok=True)
 OUTPUT_FILE = 'received_data'
 CTRL_LOG_FILE = 'command_log'
 
-def get_log_file():
-    datestamp = datetime.datetime.now().strftime("%d_%m_%Y")
-    return os.path.join(DEFAULT_OUTPUT_PATH, CTRL_LOG_FILE+f"_{datestamp}.txt")
-
-def get_output_file():
-    datestamp = datetime.datetime.now().strftime("%d_%m_%Y")
-    return os.path.join(DEFAULT_OUTPUT_PATH, OUTPUT_FILE+f"_{datestamp}.txt")
-
+# Persistent writers: one open handle per sink, reopened only when the day changes.
+# Data lines are group-committed (every 100 lines or 2 s, whichever first), command log
+# lines are committed one by one. Set fsync=True to force every commit to disk.
+# A per-minute time index (received_data_DD_MM_YYYY.idx) is built while data lines are appended.
+DATA_COMMIT_POLICY = CommitPolicy(every_lines=100, every_ms=2000, fsync=False)
+LOG_COMMIT_POLICY = CommitPolicy(every_lines=1, fsync=False)
 
 
 PERIODIC_TRIGGER_PERIOD = 20        #seconds
 
-# Semaphore to control access to the serial port
-# This is used to prevent multiple threads from writing to the serial port at the same time
-semaphore = threading.Semaphore(1)
-
 BOARD_ID_OFFSET = 33
 BOARD__MAGIC_ID = 100 -BOARD_ID_OFFSET #a message with BOARD MAGIC ID is processed by the board wathever its actual id
 BOARD_DEFAULT_ID = 0 # 
 BOARD_ID = BOARD_DEFAULT_ID
 
-BOARD_ID_BYTE = bytes.fromhex(hex(BOARD_ID + BOARD_ID_OFFSET)[2:])
-CMD_TERMINATOR = bytes.fromhex('0a')
+# Boards handled by this process: (serial port, board ID, periodic trigger period in s).
+# Boards on the same port share the RS485 bus and are told apart by their ID; with more than
+# one board the output files get a _bNN suffix (e.g. received_data_b03_DD_MM_YYYY.txt).
+BOARDS = [
+    (SERIAL_PORT, BOARD_ID, PERIODIC_TRIGGER_PERIOD),
+]
 
 DAC_REF_VOLTAGE = 3
 DAC_MAX_N = 1023
 
+# Optional compact binary copy of the data lines (see binary_store.py), written next to the
+# text files as received_data_DD_MM_YYYY_NNN.bin and readable with numpy.memmap
+BINARY_STORE_ENABLED = False
+
+# Closed daily files (received_data / command_log) are compressed in the background and the
+# originals removed once the copy is verified: ('.xz', 1), ('.gz', 6), ('.bz2', 9) or None
+COMPRESSION = ('.xz', 1)
+
+# Runtime metrics: Prometheus text on http://127.0.0.1:METRICS_PORT/metrics (None disables it,
+# e.g. 9108 to enable it) and a [Metrics] snapshot line in the command log every METRICS_LOG_PERIOD seconds
+METRICS_PORT = None
+METRICS_LOG_PERIOD = 600
+
+# Raw serial capture: every chunk read from / written to the ports is journaled next to the logs
+# (serial_capture_<port>_DD_MM_YYYY_HHMMSS.tbj) for "python serial_journal.py replay"
+SERIAL_CAPTURE = False
+
+# Hours of data kept in memory per board for the GUI rate monitor (0 disables it)
+RATE_MONITOR_HOURS = 6
+
+# Started / stopped from the prompt ("profile", "memtrace"); reports go to the output directory
+PROFILER = profiling.SamplingProfiler()
+MEMORY_TRACER = profiling.MemoryTracer()
+
 HELP_CMD_MSG = """
     USER INPUT   \t     OPCODE      \t      Description                     \t      Arguments
     ===============================================================================================
@@ -67,6 +93,10 @@ HELP_CMD_MSG = """
     getconf      \t     p (0x70)    \t      Get Volt and Temp Thr Config    \t      
     start        \t     q (0x71)    \t      Start Data Acquisition          \t      
     stop         \t     r (0x72)    \t      Stop Data Acquisition           \t      
+    trigger      \t     (--local)   \t      Trigger stats / set period      \t      [period_s]
+    boards       \t     (--local)   \t      List the configured boards      \t      
+    profile      \t     (--local)   \t      Sampling profiler of all threads\t      [start [ms]|stop|dump]
+    memtrace     \t     (--local)   \t      Memory allocation trace         \t      [start [frames]|stop|dump]
     help         \t     (--local)   \t      Print this help message         \t      
 """
 
@@ -81,29 +111,6 @@ DAC_CHANNELS_ID = {
         'h' : bytes([ord("h")])
         }
 
-#Thread for serial read and log
-def read_from_serial(ser):
-    while True:
-        # Acquire the semaphore to ensure only one thread accesses the serial port at a time
-        semaphore.acquire()
-        if ser.in_waiting:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                cur_time = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S");
-                print("["+cur_time+"] \t"+f"{line}")
-                # Only write to ctrl_file if line starts with >, =, U, or tab, but NOT if it starts with '>Data'
-                if ( (line[0] == '>' or line[0] == '=' or line[0] == 'U' or line[0] == '\t' and not line.lstrip().startswith('>Data') ) ):
-                    with open(get_log_file(), 'a') as ctrl_file:
-                        ctrl_file.write(cur_time+"\t"+line + '\n')
-                        ctrl_file.flush()
-                else:               #data line
-                    with open(get_output_file(), 'a') as file:
-                        file.write(cur_time+"\t"+line + '\n')
-                        file.flush()
-        # Release the semaphore to allow other threads to access the serial port
-        semaphore.release()
-        time.sleep(0.1)
-
 """
 USER INPUT    OPCODE              Description
 ================================================
@@ -129,400 +136,144 @@ USER INPUT    OPCODE              Description
 ====================================================
 """
 
-#function for formatting command
-def format_command(cmd_char, payload):
-    command_map = {
-        'getstatus' : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("a")]) +     CMD_TERMINATOR,
-        'getdata'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("b")]) +     CMD_TERMINATOR,
-        'setdate'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("c")]) + p + CMD_TERMINATOR,
-        'settime'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("d")]) + p + CMD_TERMINATOR,
-        'getdatetime':lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("e")]) +     CMD_TERMINATOR,
-        'getdac'    : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("f")]) +     CMD_TERMINATOR,
-        'setdac'    : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("g")]) + p + CMD_TERMINATOR,
-        'gettemp'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("h")]) +     CMD_TERMINATOR,
-        'reset'     : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("i")]) +     CMD_TERMINATOR,
-        'setid'     : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("j")]) + p + CMD_TERMINATOR,
-        'getid'     : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("k")]) +     CMD_TERMINATOR,
-        'setoverv'  : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("l")]) + p + CMD_TERMINATOR,
-        'setundv'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("m")]) + p + CMD_TERMINATOR,
-        'setovert'  : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("n")]) + p + CMD_TERMINATOR,
-        'setundt'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("o")]) + p + CMD_TERMINATOR,
-        'getconf'   : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("p")]) +     CMD_TERMINATOR,
-        'start'     : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("q")]) +     CMD_TERMINATOR,
-        'stop'      : lambda p:     CMD_TERMINATOR + BOARD_ID_BYTE + bytes([ord("r")]) +     CMD_TERMINATOR,
-    }
-    formatter = command_map.get(cmd_char.lower())
-    if formatter:
-        return formatter(payload)
-    else:
+#function for formatting command (frames come from the shared protocol module)
+def format_command(cmd_char, payload, board_id=None):
+    try:
+        return protocol.frame(BOARD_ID if board_id is None else board_id, cmd_char, payload)
+    except ValueError:
         return None
 
-#thread for periodically triggering data messages
-def periodic_trigger_msg(ser,period=PERIODIC_TRIGGER_PERIOD):
-    print("Start collecting data in 10s")
-    time.sleep(10)
-    while True:
-        time.sleep(0.1) #wait 100 ms for alignment
-        try:
-            formatted = format_command('getdata',0)
-            if (formatted):
-                semaphore.acquire()
-                ser.write(formatted)
-                semaphore.release()
-        except:
-            print("Error Periodic trigger")
-        time.sleep(period)
-
 #Thread for listen user inputs and send commands to board
-def listen_for_commands(ser):
+# Commands go to the first configured board; prefix them with @<board ID> (or @all) to address
+# another board, "boards" lists the configured boards.
+def listen_for_commands(engine):
+    default_board = engine.boards[0]
     while True:
         try:
             print("\nEnter \"help\" for command list")
             command = input("[Command] Enter command (format command payload): ").strip()
 
-            #check user input
-            if len(command) >= 2 and command[0].isalpha():
-                cmd = command.split()[0].lower()
-
-                # GET STATUS
-                if cmd == 'getstatus':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                         print(f"[Error] Invalid command ({cmd}). Example: getstatus")
-
-                #GET DATA
-                elif cmd == 'getdata':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: getdata")
-
-                #GET DATE AND TIME
-                if cmd == 'getdatetime':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: getdatetime")
-                
-                #SET TIME
-                elif cmd == 'settime':
-                    date = datetime.datetime.now()
-                    payload = date.strftime("%H%M%S")
-                    payload = bytes(payload,"ascii")
-                    formatted = format_command(cmd,payload)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: settime")
-                
-                #SET DATE
-                elif cmd == 'setdate':
-                    date = datetime.datetime.now()
-                    payload = date.strftime("%d%m%Y")
-                    payload = bytes(payload,"ascii")
-                    formatted = format_command(cmd,payload)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: setdate")
-
-                #SET DAC THR
-                if cmd == 'setdac':
-                    try:
-                        dac_channel_str = command.split()[1].lower()
-                        #get desired DAC channel from command ("a","b",..."h")
-                        payload = DAC_CHANNELS_ID.get(dac_channel_str)
-                        #get desired Voltage value in V
-                        thr_v = float(command.split()[2])
-                        #convert desired Voltage value to mV
-                        thr_n = int(thr_v*1000)
-                        # get the corresponding ascii string
-                        thr_k = int(thr_n/1000)
-                        thr_h = int((thr_n%1000)/100)
-                        thr_d = int((thr_n%100)/10)
-                        thr_u = int((thr_n%10))
-                        thr_str = str(thr_k)+str(thr_h)+str(thr_d)+str(thr_u)
-                        #get the final command string 
-                        payload = payload + bytes(thr_str,"ascii")
-                        formatted = format_command(cmd,payload)
-                        if formatted:
-                            semaphore.acquire()
-                            ser.write(formatted)
-                            semaphore.release()
-                            print(f"[Sent] {formatted}")
-                            with open(get_log_file(), 'a') as ctrl_file:
-                                cur_time = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-                                ctrl_file.write(f"{cur_time}\t >Set DAC: CHN = {dac_channel_str}, THR = {thr_v}V\n")
-                                ctrl_file.flush()
-                        else:
-                            print(f"[Error] Invalid command ({cmd}). Example: setdac a 1.3")
-                    except:
-                        print('Error in conversion')
-                    
-                
-                #GET DAC THR
-                if cmd == 'getdac':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: getdac")
-
-                #GET Temp
-                if cmd == 'gettemp':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: getdac")
-
-                #RESET
-                elif cmd == 'reset':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                        print(f"[Error] Invalid command ({cmd}). Example: reset")
-
-                #SET ID
-                elif cmd == 'setid':
-                    try:
-                        num = command.split()[1]
-
-                        if((int(num) < 62) or (int(num) == BOARD__MAGIC_ID)):    
-                            num = int(num)+33 #offset ascii table
-                            #payload = bytes.fromhex(hex(num)[2:])
-                            payload = chr(num).encode('ASCII')
-                            formatted = format_command(cmd,payload)
-                            if formatted:
-                                semaphore.acquire()
-                                ser.write(formatted)
-                                semaphore.release()
-                                print(f"[Sent] {formatted}")
-                        else:
-                            print(f"[Error] Maximum id = 63 ({cmd}). Example: setid 23")
-                    except:
-                         print(f"[Error] Invalid command ({cmd}). Example: setid 23")
-
-                # GET ID
-                elif cmd == 'getid':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                         print(f"[Error] Invalid command ({cmd}). Example: getid")
-
-                #SET OVERV
-                elif cmd == 'setoverv':
-                    try:
-                        overv_str = command.split()[1].lower()
-                        thr_n = int(float(overv_str)*1000 )
-                        thr_dk = int(thr_n/10000)
-                        thr_k = int((thr_n%10000)/1000)
-                        thr_h = int((thr_n%1000)/100)
-                        thr_d = int((thr_n%100)/10)
-                        thr_u = int((thr_n%10))
-                        thr_str = str(thr_dk)+str(thr_k)+str(thr_h)+str(thr_d)+str(thr_u)
-                        payload =  bytes(thr_str,"ascii")
-                        formatted = format_command(cmd,payload)
-                        if formatted:
-                            semaphore.acquire()
-                            ser.write(formatted)
-                            semaphore.release()
-                            print(f"[Sent] {formatted}")
-                        else:
-                            print(f"[Error] Invalid command ({cmd}). Example: setoverv 16.5")
-
-                    except:
-                        print('Error in conversion')
-                
-
-                #SET UNDERV
-                elif cmd == 'setundv':
-                    try:
-                        undv_str = command.split()[1].lower()
-                        thr_n = int(float(undv_str)*1000 )
-                        thr_dk = int(thr_n/10000)
-                        thr_k = int((thr_n%10000)/1000)
-                        thr_h = int((thr_n%1000)/100)
-                        thr_d = int((thr_n%100)/10)
-                        thr_u = int((thr_n%10))
-                        thr_str = str(thr_dk)+str(thr_k)+str(thr_h)+str(thr_d)+str(thr_u)
-                        payload =  bytes(thr_str,"ascii")
-                        formatted = format_command(cmd,payload)
-                        if formatted:
-                            semaphore.acquire()
-                            ser.write(formatted)
-                            semaphore.release()
-                            print(f"[Sent] {formatted}")
-                        else:
-                            print(f"[Error] Invalid command ({cmd}). Example: setdac")
-
-                    except:
-                        print('Error in conversion')
-
-                #SET OVERT
-                elif cmd == 'setovert':
-                    try:
-                        overt_str = command.split()[1].lower()
-                        thr_n = int(float(overt_str)*100 )
-                        thr_sign = '+'
-                        if (thr_n <0):
-                            thr_sign = '-'
-                        thr_n = abs(thr_n)
-                        thr_k = int(thr_n/1000)
-                        thr_h = int((thr_n%1000)/100)
-                        thr_d = int((thr_n%100)/10)
-                        thr_u = int((thr_n%10))
-                        thr_str = thr_sign+str(thr_k)+str(thr_h)+str(thr_d)+str(thr_u)
-                        payload =  bytes(thr_str,"ascii")
-                        formatted = format_command(cmd,payload)
-                        if formatted:
-                            semaphore.acquire()
-                            ser.write(formatted)
-                            semaphore.release()
-                            print(f"[Sent] {formatted}")
-                        else:
-                            print(f"[Error] Invalid command ({cmd}). Example: setovert 50.5")
-
-                    except:
-                        print('Error in conversion')
-                
-                #SET UNDERTEMPERATURE
-                elif cmd == 'setundt':
-                    try:
-                        overt_str = command.split()[1].lower()
-                        thr_n = int(float(overt_str)*100 )
-                        thr_sign = '+'
-                        if (thr_n <0):
-                            thr_sign = '-'
-                        thr_n = abs(thr_n)
-                        thr_k = int(thr_n/1000)
-                        thr_h = int((thr_n%1000)/100)
-                        thr_d = int((thr_n%100)/10)
-                        thr_u = int((thr_n%10))
-                        thr_str = thr_sign+str(thr_k)+str(thr_h)+str(thr_d)+str(thr_u)
-                        payload =  bytes(thr_str,"ascii")
-                        formatted = format_command(cmd,payload)
-                        if formatted:
-                            semaphore.acquire()
-                            ser.write(formatted)
-                            semaphore.release()
-                            print(f"[Sent] {formatted}")
-                        else:
-                            print(f"[Error] Invalid command ({cmd}). Example: setundt -5.5")
-
-                    except:
-                        print('Error in conversion')
-
-                #GET CONFIG
-                elif cmd == 'getconf':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                         print(f"[Error] Invalid command ({cmd}). Example: getconf")
-                    
-                # START COUNT
-                elif cmd == 'start':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                         print(f"[Error] Invalid command ({cmd}). Example: start")
-
-                # STOP COUNT
-                elif cmd == 'stop':
-                    formatted = format_command(cmd,0)
-                    if formatted:
-                        semaphore.acquire()
-                        ser.write(formatted)
-                        semaphore.release()
-                        print(f"[Sent] {formatted}")
-                    else:
-                         print(f"[Error] Invalid command ({cmd}). Example: stop")
-                
-                elif cmd == 'help':
-                    print(HELP_CMD_MSG)
-
-            else:
-                print(HELP_CMD_MSG)
+            targets = [default_board]
+            if command.startswith('@'):
+                target, _, command = command.partition(' ')
+                command = command.strip()
+                try:
+                    targets = engine.boards if target == '@all' else [engine.board(int(target[1:]))]
+                except (ValueError, KeyError):
+                    print(f"[Error] Unknown board ({target}). Example: @3 getstatus")
+                    continue
+            if command.lower() == 'boards':
+                for board in engine.boards:
+                    print(f"    board {board.board_id} on {board.port.name}, trigger every {board.trigger.period} s, "
+                          f"status {board.status.describe()}")
+                continue
+            if command.lower().startswith('trigger'):
+                trigger_command(command, targets)
+                continue
+            if command.lower().split(' ')[0] in ('profile', 'memtrace'):
+                profiling_command(command, engine.output_path)
+                continue
+            for board in targets:
+                execute_command(command, board)
         except KeyboardInterrupt:
             print("\n[Info] Command input stopped.")
             break
 
+# "trigger" prints the periodic trigger statistics, "trigger <s>" changes the period
+def trigger_command(command, boards):
+    words = command.split()
+    for board in boards:
+        if len(words) > 1:
+            try:
+                board.trigger.set_period(float(words[1]))
+            except ValueError:
+                print("[Error] Invalid trigger period. Example: trigger 20")
+                return
+        print(f"    board {board.board_id}: {board.trigger.stats()}")
+
+# "profile start [ms]|stop|dump" and "memtrace start [frames]|stop|dump": stop and dump write a
+# timestamped report in directory, stop also ends the profiling; without argument print the state
+def profiling_command(command, directory):
+    words = command.lower().split()
+    tool = PROFILER if words[0] == 'profile' else MEMORY_TRACER
+    action = words[1] if len(words) > 1 else ''
+    try:
+        if action == 'start':
+            if words[0] == 'profile':
+                started = tool.start(float(words[2]) / 1000 if len(words) > 2 else None)
+            else:
+                started = tool.start(int(words[2]) if len(words) > 2 else profiling.DEFAULT_FRAMES)
+            print(f"[Info] {words[0]} {'started' if started else 'already running'}")
+        elif action in ('stop', 'dump'):
+            if not tool.running:
+                print(f"[Info] {words[0]} is not running")
+                return
+            path = tool.dump(directory)
+            if action == 'stop':
+                tool.stop()
+            print(f"[Info] {words[0]} report written to {path}")
+        elif action == '':
+            print(f"    {words[0]}: {'running' if tool.running else 'stopped'}")
+        else:
+            print(f"[Error] Unknown {words[0]} action ({action}). Example: {words[0]} start")
+    except ValueError:
+        print(f"[Error] Invalid {words[0]} argument. Example: profile start 10 / memtrace start 10")
+    except OSError as e:
+        print(f"[Error] {words[0]} report not written: {e}")
+
+# Parse one user command and send it to the given board
+def execute_command(command, board):
+    #check user input
+    if len(command) < 2 or not command[0].isalpha():
+        print(HELP_CMD_MSG)
+        return
+    words = command.split()
+    cmd = words[0].lower()
+    if cmd == 'help':
+        print(HELP_CMD_MSG)
+        return
+    if cmd not in protocol.OPCODES:
+        return
+    try:
+        payload = protocol.payload_from_args(cmd, words[1:])
+    except ValueError as e:
+        print(f"[Error] Invalid command ({cmd}): {e}. Example: {protocol.USAGE.get(cmd, cmd)}")
+        return
+    formatted = board.format_command(cmd, payload)
+    board.write(formatted)
+    print(f"[Sent] {formatted}")
+    if cmd == 'setdac':
+        cur_time = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        board.log_writer.write_line(f"{cur_time}\t >Set DAC: CHN = {words[1].lower()}, THR = {float(words[2])}V")
+
 
 #Program entry point
 def main():
-    trigger_period = PERIODIC_TRIGGER_PERIOD
+    engine = AcquisitionEngine(format_command, DEFAULT_OUTPUT_PATH, OUTPUT_FILE, CTRL_LOG_FILE, BAUD_RATE,
+                               DATA_COMMIT_POLICY, LOG_COMMIT_POLICY, BINARY_STORE_ENABLED, RATE_MONITOR_HOURS,
+                               COMPRESSION, METRICS_PORT, METRICS_LOG_PERIOD, SERIAL_CAPTURE)
     try:
-        with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1) as ser, open(get_output_file(), 'a') as file:
-            print(f"Listening on {SERIAL_PORT} at {BAUD_RATE} baud...")
-
-            # Synchronize time with the board at startup
-            now = datetime.datetime.now()
-            setdate_payload = bytes(now.strftime("%d%m%Y"), "ascii")
-            settime_payload = bytes(now.strftime("%H%M%S"), "ascii")
-            setdate_cmd = format_command('setdate', setdate_payload)
-            settime_cmd = format_command('settime', settime_payload)
-            if setdate_cmd:
-                ser.write(setdate_cmd)
-                print(f"[Startup] Sent setdate: {setdate_cmd}")
-            else:
-                print("[Startup] Failed to send setdate command.")
-            if settime_cmd:
-                ser.write(settime_cmd)
-                print(f"[Startup] Sent settime: {settime_cmd}")
-            else:
-                print("[Startup] Failed to send settime command.")
-
-            # Start threads for reading from serial, periodic trigger, and command listening
-            threading.Thread(target=read_from_serial, args=(ser,), daemon=True).start()
-            threading.Thread(target=periodic_trigger_msg, args=(ser,trigger_period), daemon=True).start()
-            threading.Thread(target=listen_for_commands, args=(ser,), daemon=True).start()
-            # Start the GUI
-            digitech_gui.start_gui(ser, format_command, DAC_CHANNELS_ID, BOARD__MAGIC_ID, CTRL_FILE=get_log_file())
+        engine.configure(BOARDS)
+        for port in engine.ports.values():
+            print(f"Listening on {port.name} at {BAUD_RATE} baud...")
+
+        # Start reader and periodic trigger threads, then synchronize time with the boards
+        engine.start()
+        engine.sync_time()
+        print("Start collecting data in 10s")
+
+        threading.Thread(target=listen_for_commands, args=(engine,), daemon=True).start()
+        # Start the GUI (commands go to the first configured board)
+        board = engine.boards[0]
+        digitech_gui.start_gui(board, board.format_command, DAC_CHANNELS_ID, BOARD__MAGIC_ID, CTRL_FILE=board.log_writer,
+                               rates=board.rates, status=board.status)
     except serial.SerialException as e:
         print(f"Serial error: {e}")
     except KeyboardInterrupt:
         print("Stopped by user.")
+    finally:
+        # commit whatever is still buffered
+        engine.stop()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,370 @@
+import datetime
+import threading
+import time
+
+import serial
+
+from serial_reader import SerialReader
+from output_writers import DailyFileWriter, COMMIT_BATCHED, COMMIT_EVERY_LINE
+from binary_store import BinaryRecordWriter
+from data_parser import parse_data_line
+from time_index import TimeIndexWriter
+from rollups import RollupWriter
+from command_dispatcher import CommandDispatcher, PRIORITY_INTERACTIVE
+from trigger_scheduler import TriggerScheduler
+from rate_ring import RateRing
+from status_monitor import StatusMonitor
+import protocol
+from compressed_files import Compressor
+from serial_journal import SerialJournal, CapturingSerial, journal_path
+import metrics
+from metrics import Sample
+
+# Acquisition engine: many (serial port, board ID) pairs in one process.
+# - PortSession: one serial port, one bulk reader thread and one command dispatcher (the only
+#   writer of the port, see command_dispatcher.py). Boards sharing a port sit on the same RS485
+#   bus: only the addressed board answers, so every received line is routed to the board
+#   addressed by the command being answered.
+# - BoardSession: one board, with its own output files, time index, minute/hour roll-ups
+#   (see rollups.py), optional binary store and periodic getdata trigger (see trigger_scheduler.py),
+#   and optionally an in-memory ring of the latest records for the live rate monitor (see rate_ring.py).
+#   Its status word is followed as the lines arrive; edges raise rate-limited alarms in the command
+#   log and the GUI (see status_monitor.py). Of the Count Deactivated replies to the idle polls only
+#   the first one is logged, the others are counted in one summary line.
+# - AcquisitionEngine: owns the ports and boards and is the single command surface. With
+#   compression set, the daily text files are compressed once closed (see compressed_files.py).
+#   Its collector exports the counters of all the components (see metrics.py), optionally on a
+#   local HTTP port and as a periodic [Metrics] line in every board's command log. With capture set,
+#   the raw traffic of every port is journaled for replay (see serial_journal.py).
+# Frames are built by the injected format_command(cmd, payload, board_id).
+
+TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+
+# Replies and reset banners go to the command log, everything else is data
+def is_log_line(line):
+    return line[0] == '>' or line[0] == '=' or line[0] == 'U' or line[0] == '\t'
+
+
+class BoardSession:
+
+    def __init__(self, port, board_id, output_path, data_prefix, log_prefix, trigger_period,
+                 data_policy=COMMIT_BATCHED, log_policy=COMMIT_EVERY_LINE, binary_store=False, monitor_hours=0,
+                 on_rollover=None):
+        self.port = port
+        self.board_id = board_id
+        self.data_writer = DailyFileWriter(output_path, data_prefix, data_policy, on_rollover=on_rollover)
+        self.log_writer = DailyFileWriter(output_path, log_prefix, log_policy, on_rollover=on_rollover)
+        self.time_index = TimeIndexWriter()
+        self.rollups = RollupWriter()
+        self.binary_writer = BinaryRecordWriter(output_path, data_prefix, board_id=board_id) if binary_store else None
+        self.trigger = TriggerScheduler(self, trigger_period)
+        self.status = StatusMonitor(self._status_event)
+        self.deactivated = 0            # Count Deactivated replies in a row: only the first one is logged
+        self.rates = None
+        if monitor_hours:
+            try:
+                self.rates = RateRing(monitor_hours * 3600)
+            except ImportError:
+                print(f"[Warning] {self.name}: numpy not available, rate monitor disabled")
+
+    @property
+    def name(self):
+        return f"{self.port.name}#{self.board_id}"
+
+    def format_command(self, cmd, payload=0):
+        return self.port.engine.format_command(cmd, payload, self.board_id)
+
+    # Queue a frame for this board; returns a Future with the response lines
+    def submit(self, frame, priority=PRIORITY_INTERACTIVE, timeout=None, retries=None):
+        future = self.port.dispatcher.submit(self, frame, priority, timeout, retries)
+        self.track_dac_threshold(frame, future)
+        if frame[2:3] in (b'q', b'i'):
+            # start / reset: the trigger leaves the idle polling
+            self.trigger.resume()
+        if frame[2:3] in (b'r', b'i'):
+            # stop / reset: the acquisition going off is not an alarm
+            self.status.expect_stop()
+        return future
+
+    # Serial port like write (GUI and command prompt use the board as their serial port):
+    # does not wait, a missing response is reported on the console
+    def write(self, frame):
+        self.submit(frame).add_done_callback(self._report)
+
+    def _report(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"[Error] {self.name}: {future.exception()}")
+
+    # Format and queue a command; returns the Future, or None for an unknown command
+    def send(self, cmd, payload=0, priority=PRIORITY_INTERACTIVE):
+        frame = self.format_command(cmd, payload)
+        if not frame:
+            return None
+        return self.submit(frame, priority)
+
+    def log(self, text):
+        self.log_writer.write_line(datetime.datetime.now().strftime(TIME_FORMAT) + "\t" + text)
+
+    def _status_event(self, event):
+        text = f"[{'Alarm' if event.level == 'alarm' else 'Status'}] {self.name}: {event.text} (status {event.word}, from {event.source})"
+        print(text)
+        self.log(text)
+
+    # setdac frames are inspected so the binary store header follows the thresholds in effect
+    # once the board has acknowledged them
+    def track_dac_threshold(self, frame, future):
+        if self.binary_writer is None or not frame or frame[2:3] != b'g':
+            return
+        try:
+            thresholds = {chr(frame[3]): int(frame[4:8])}
+        except ValueError:
+            return
+
+        def acknowledged(f):
+            if not f.cancelled() and f.exception() is None:
+                self.binary_writer.set_metadata(thresholds=thresholds)
+        future.add_done_callback(acknowledged)
+
+    def handle_line(self, arrival, line):
+        arrival = datetime.datetime.fromtimestamp(arrival)
+        cur_time = arrival.strftime(TIME_FORMAT)
+        print("[" + cur_time + "] \t" + (f"[{self.board_id}] " if len(self.port.engine.boards) > 1 else "") + line)
+        if line == protocol.DATA_DEACTIVATED_REPLY:
+            # answer to every idle poll: logged once, counted afterwards
+            self.status.observe_stopped(arrival)
+            self.deactivated += 1
+            if self.deactivated == 1:
+                self.log_writer.write_line(cur_time + "\t" + line, arrival)
+            return
+        self._end_deactivated(arrival)
+        if is_log_line(line):
+            self.log_writer.write_line(cur_time + "\t" + line, arrival)
+            if line[0] in '=U':
+                # reset banner
+                self.trigger.resume()
+            else:
+                status = protocol.status_from_reply(line)
+                if status is not None:
+                    self.status.observe(status, arrival, 'getstatus')
+            return
+        offset = self.data_writer.write_line(cur_time + "\t" + line, arrival)
+        record = parse_data_line(line)
+        if record is not None:
+            self.status.observe(record.status, arrival)
+            self.time_index.observe(self.data_writer.path, record.timestamp, offset)
+            self.rollups.observe(self.data_writer.path, record)
+            if self.binary_writer is not None:
+                self.binary_writer.write_record(record, arrival)
+            if self.rates is not None:
+                self.rates.append(record)
+
+    # One summary line for the Count Deactivated replies that were not logged
+    def _end_deactivated(self, arrival=None):
+        repeated, self.deactivated = self.deactivated - 1, 0
+        if repeated > 0:
+            when = arrival or datetime.datetime.now()
+            self.log_writer.write_line(f"{when.strftime(TIME_FORMAT)}\t[Trigger] {self.name}: {repeated} more "
+                                       f"'{protocol.DATA_DEACTIVATED_REPLY}' replies while stopped", arrival)
+
+    def stop(self):
+        self.trigger.stop()
+
+    def close(self):
+        self._end_deactivated()
+        self.data_writer.close()
+        self.log_writer.close()
+        self.time_index.close()
+        self.rollups.close()
+        if self.binary_writer is not None:
+            self.binary_writer.close()
+
+
+class PortSession:
+
+    def __init__(self, engine, name, baud_rate, ser=None, capture=False):
+        self.engine = engine
+        self.name = name
+        self.ser = ser if ser is not None else serial.Serial(name, baud_rate, timeout=1)
+        self.journal = None
+        if capture:
+            self.journal = SerialJournal(journal_path(engine.output_path, name), name, baud_rate)
+            self.ser = CapturingSerial(self.ser, self.journal)
+        self.boards = {}
+        self.reader = SerialReader(self.ser)
+        self.dispatcher = CommandDispatcher(self)
+        self.current = None
+        self.routed = threading.Event()         # set once the end of the stream (reader's None) is routed
+        self.line_delay = metrics.REGISTRY.histogram('line_delay_seconds', "Line arrival to written", port=name)
+
+    def start(self):
+        self.reader.start()
+        self.dispatcher.start()
+        threading.Thread(target=self._route_loop, name=f"route-{self.name}", daemon=True).start()
+
+    def _route_loop(self):
+        while True:
+            item = self.reader.lines.get()
+            if item is None:
+                self.routed.set()
+                break
+            board = self.current or next(iter(self.boards.values()), None)
+            self.dispatcher.on_line(item[1])
+            if board is not None:
+                board.handle_line(*item)
+            self.line_delay.observe(time.time() - item[0])
+
+    def close(self):
+        self.dispatcher.stop()
+        self.reader.stop()
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+
+
+class AcquisitionEngine:
+
+    def __init__(self, format_command, output_path, data_prefix='received_data', log_prefix='command_log',
+                 baud_rate=115200, data_policy=COMMIT_BATCHED, log_policy=COMMIT_EVERY_LINE, binary_store=False,
+                 monitor_hours=0, compression=None, metrics_port=None, metrics_log_period=None, capture=False):
+        self.format_command = format_command
+        self.output_path = output_path
+        self.data_prefix = data_prefix
+        self.log_prefix = log_prefix
+        self.baud_rate = baud_rate
+        self.data_policy = data_policy
+        self.log_policy = log_policy
+        self.binary_store = binary_store
+        self.monitor_hours = monitor_hours
+        # compression: (codec extension, level), e.g. ('.xz', 1); None keeps the text files as they are
+        self.compressor = Compressor(*compression) if compression else None
+        self.metrics_port = metrics_port
+        self.metrics_log_period = metrics_log_period
+        self.capture = capture
+        self.metrics_server = None
+        self._metrics_stop = threading.Event()
+        self.ports = {}
+        self.boards = []
+
+    # Output files keep the historical names for a single board and get a _bNN suffix otherwise
+    def _prefixes(self, board_id, multi):
+        if not multi:
+            return self.data_prefix, self.log_prefix
+        return f"{self.data_prefix}_b{board_id:02d}", f"{self.log_prefix}_b{board_id:02d}"
+
+    # boards: list of (port, board ID, trigger period in s)
+    def configure(self, boards, serial_ports=None):
+        multi = len(boards) > 1
+        for port_name, board_id, period in boards:
+            port = self.ports.get(port_name)
+            if port is None:
+                ser = (serial_ports or {}).get(port_name)
+                port = self.ports[port_name] = PortSession(self, port_name, self.baud_rate, ser, self.capture)
+            data_prefix, log_prefix = self._prefixes(board_id, multi)
+            board = BoardSession(port, board_id, self.output_path, data_prefix, log_prefix, period,
+                                 self.data_policy, self.log_policy, self.binary_store, self.monitor_hours,
+                                 self.compressor.submit if self.compressor else None)
+            port.boards[board_id] = board
+            self.boards.append(board)
+        return self
+
+    def board(self, key):
+        for board in self.boards:
+            if key in (board.board_id, board.name):
+                return board
+        raise KeyError(f"Unknown board {key}")
+
+    def start(self, trigger_delay=10):
+        metrics.REGISTRY.add_collector(self.collect_metrics)
+        if self.metrics_port:
+            # a debugging aid: never stop the acquisition because the port is taken
+            try:
+                self.metrics_server = metrics.serve(self.metrics_port)
+                print(f"Metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+            except OSError as e:
+                self.metrics_server = None
+                print(f"[Metrics] Warning: endpoint on port {self.metrics_port} not started ({e})")
+        if self.metrics_log_period:
+            metrics.log_snapshots(self.metrics_log_period, self.log_metrics, self._metrics_stop)
+        if self.compressor is not None:
+            # files of the previous days left uncompressed (process stopped before midnight, failures)
+            self.compressor.start()
+            self.compressor.sweep(self.output_path, [prefix for board in self.boards
+                                                     for prefix in (board.data_writer.prefix, board.log_writer.prefix)])
+        for port in self.ports.values():
+            port.start()
+        for board in self.boards:
+            board.trigger.start(trigger_delay)
+        return self
+
+    # Synchronize the board clocks with the PC
+    def sync_time(self):
+        now = datetime.datetime.now()
+        for board in self.boards:
+            for cmd, fmt in (('setdate', "%d%m%Y"), ('settime', "%H%M%S")):
+                frame = board.format_command(cmd, bytes(now.strftime(fmt), "ascii"))
+                if frame:
+                    board.submit(frame)
+                    print(f"[Startup] Sent {cmd} to board {board.board_id}: {frame}")
+                else:
+                    print(f"[Startup] Failed to send {cmd} command to board {board.board_id}.")
+
+    # Counters and gauges of ports, boards, writers and compressor, read at export time
+    def collect_metrics(self):
+        for port in self.ports.values():
+            labels = {'port': port.name}
+            reader, dispatcher = port.reader.stats(), port.dispatcher
+            yield Sample('reader_lines_total', 'counter', "Lines framed by the serial reader", labels, reader['lines'])
+            yield Sample('reader_bytes_total', 'counter', "Bytes read from the serial port", labels, reader['bytes'])
+            yield Sample('reader_lines_per_second', 'gauge', "Received lines/s (last seconds)", labels, reader['lines_per_s'])
+            yield Sample('reader_queued_lines', 'gauge', "Lines waiting to be written", labels, reader['queued'])
+            yield Sample('commands_sent_total', 'counter', "Frames written to the port", labels, dispatcher.sent)
+            yield Sample('commands_retried_total', 'counter', "Frames written again after a timeout", labels, dispatcher.retried)
+            yield Sample('commands_timeouts_total', 'counter', "Frames never answered", labels, dispatcher.timeouts)
+            yield Sample('commands_pending', 'gauge', "Frames waiting for the port", labels, dispatcher.pending())
+            if port.journal is not None:
+                yield Sample('capture_bytes_total', 'counter', "Bytes written to the serial capture journal", labels, port.journal.bytes)
+        for board in self.boards:
+            labels = {'board': board.name}
+            trigger = board.trigger
+            yield Sample('trigger_fired_total', 'counter', "Periodic trigger firings", labels, trigger.fired)
+            yield Sample('trigger_missed_total', 'counter', "Periodic trigger boundaries skipped", labels, trigger.missed)
+            yield Sample('trigger_errors_total', 'counter', "Errors in the periodic trigger loop", labels, trigger.errors)
+            yield Sample('trigger_idle', 'gauge', "1 while the trigger polls a stopped board", labels, int(trigger.idle_period is not None))
+            if board.status.word is not None:
+                yield Sample('status_word', 'gauge', "Last status word of the board", labels, board.status.word)
+            yield Sample('status_alarms_total', 'counter', "Status alarms (edges)", labels, board.status.alarms)
+            yield Sample('status_alarms_suppressed_total', 'counter', "Status changes not notified (rate limit)", labels, board.status.suppressed)
+            for writer in (board.data_writer, board.log_writer):
+                labels = {'file': writer.prefix + writer.ext}
+                yield Sample('writer_lines_total', 'counter', "Lines committed", labels, writer.lines_written)
+                yield Sample('writer_bytes_total', 'counter', "Bytes committed", labels, writer.bytes_written)
+                yield Sample('writer_commits_total', 'counter', "Commits (write + flush)", labels, writer.commits)
+                yield Sample('writer_pending_lines', 'gauge', "Lines buffered, not yet committed", labels, writer.stats()['pending'])
+        if self.compressor is not None:
+            stats = self.compressor.stats()
+            yield Sample('compressed_files_total', 'counter', "Daily files compressed", {}, stats['compressed'])
+            yield Sample('compression_failures_total', 'counter', "Daily files left uncompressed", {}, stats['failed'])
+
+    # [Metrics] line in the command log of every board: its port, its trigger and its files
+    def log_metrics(self, registry):
+        for board in self.boards:
+            files = {board.data_writer.prefix + board.data_writer.ext, board.log_writer.prefix + board.log_writer.ext}
+            selected = lambda labels: (labels.get('port') == board.port.name or labels.get('board') == board.name
+                                       or labels.get('file') in files)
+            board.log("[Metrics] " + registry.snapshot(selected))
+
+    def stop(self):
+        self._metrics_stop.set()
+        metrics.REGISTRY.remove_collector(self.collect_metrics)
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        for board in self.boards:
+            board.stop()
+        for port in self.ports.values():
+            port.close()
+        for board in self.boards:
+            board.close()
+        if self.compressor is not None:
+            self.compressor.stop()
@@ -0,0 +1,234 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# End-to-end benchmark of the acquisition stack (Digitech_Bril_Com) against the virtual board.
+# Measures:
+#   - data lines/s sustained by reader + writers before lines are lost or fall behind
+#   - command -> ACK latency (p50/p99) while periodic getdata bursts are in flight
+#   - jitter and drift of the periodic getdata trigger
+#   - bytes written per second to the output files
+# and prints a JSON report (also written to --output), so that revisions can be compared:
+#   python benchmark_acquisition.py --output bench_report.json
+# The output files go to a temporary folder, removed at the end. Needs a pseudo-terminal (Linux / macOS).
+
+DEFAULT_RATES = [50, 100, 200, 500, 1000, 2000]
+SUSTAINED_RATIO = 0.99          # fraction of generated lines that must be written in time
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Bench:
+
+    def __init__(self, trigger_period, seed=1):
+        self.tmpdir = tempfile.TemporaryDirectory(prefix='tetraball_bench_')
+        self.tmp = self.tmpdir.name
+        # the acquisition module creates its default output folder at import time, a relative path
+        # outside Windows: import it from the scratch folder so that it ends up there
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        try:
+            import Digitech_Bril_Com as acq
+        finally:
+            os.chdir(cwd)
+        from acquisition_engine import AcquisitionEngine
+        from board_simulator import PtyBoardSimulator, VirtualBoard
+        import serial
+
+        self.acq = acq
+        self.trigger_period = trigger_period
+        self.board = VirtualBoard(board_id=acq.BOARD_ID, seed=seed, buffer_size=10 ** 6)
+        self.sim = PtyBoardSimulator([self.board], line_rate=1.0, seed=seed)
+        self.sim.frame_log = []
+        self.sim.start()
+        self.ser = serial.Serial(self.sim.port, acq.BAUD_RATE, timeout=1)
+        self.engine = AcquisitionEngine(acq.format_command, self.tmp, acq.OUTPUT_FILE, acq.CTRL_LOG_FILE, acq.BAUD_RATE,
+                                        acq.DATA_COMMIT_POLICY, acq.LOG_COMMIT_POLICY)
+        self.engine.configure([(self.sim.port, acq.BOARD_ID, trigger_period)], serial_ports={self.sim.port: self.ser})
+        self.session = self.engine.boards[0]
+        # the benchmark switches the virtual board on and off behind the trigger's back
+        self.session.trigger.idle_backoff = False
+        self.log_lines = []
+        self.log_event = threading.Condition()
+        self._hook_log_writer()
+
+    # Record when each command log line is handed to the writer
+    def _hook_log_writer(self):
+        writer = self.session.log_writer
+        original = writer.write_line
+        bench = self
+
+        def write_line(text, when=None):
+            with bench.log_event:
+                bench.log_lines.append((time.perf_counter(), text))
+                bench.log_event.notify_all()
+            return original(text, when)
+
+        writer.write_line = write_line
+
+    def start(self):
+        self.engine.start(trigger_delay=0)
+
+    def send(self, cmd):
+        self.session.send(cmd)
+
+    def received_data_lines(self):
+        writer = self.session.data_writer
+        return writer.lines_written + len(writer._pending)
+
+    def written_bytes(self):
+        return self.session.data_writer.bytes_written + self.session.log_writer.bytes_written
+
+    # Feed increasing line rates; a rate is sustained if the lines generated during the step
+    # are written within one trigger period (+1 s) after the board stops producing them
+    def throughput(self, rates, duration):
+        steps = []
+        for rate in rates:
+            self.sim.line_rate = rate
+            g0, r0, b0 = self.board.lines_generated, self.received_data_lines(), self.written_bytes()
+            t0 = time.perf_counter()
+            self.board.set_acquiring(True)
+            time.sleep(duration)
+            self.board.set_acquiring(False)
+            time.sleep(self.trigger_period + 1.0)
+            self.session.data_writer.commit()
+            elapsed = time.perf_counter() - t0
+            generated = self.board.lines_generated - g0
+            received = self.received_data_lines() - r0
+            ratio = received / generated if generated else 1.0
+            steps.append({
+                'target_lines_per_s': rate,
+                'generated': generated,
+                'received': received,
+                'ratio': round(ratio, 4),
+                'received_lines_per_s': round(received / duration, 1),
+                'bytes_written_per_s': round((self.written_bytes() - b0) / elapsed, 1),
+                'sustained': ratio >= SUSTAINED_RATIO,
+            })
+            if ratio < SUSTAINED_RATIO / 2:
+                break
+        sustained = [s['received_lines_per_s'] for s in steps if s['sustained']]
+        return {'steps': steps, 'max_sustained_lines_per_s': max(sustained) if sustained else 0.0}
+
+    # getstatus -> '>Status' round trips while data bursts are flowing
+    def latency(self, rate, samples, timeout=2.0):
+        self.sim.line_rate = rate
+        self.board.set_acquiring(True)
+        latencies, lost = [], 0
+        for _ in range(samples):
+            with self.log_event:
+                seen = len(self.log_lines)
+            t0 = time.perf_counter()
+            self.send('getstatus')
+            ack = None
+            with self.log_event:
+                while ack is None and time.perf_counter() - t0 < timeout:
+                    for t, text in self.log_lines[seen:]:
+                        if '>Status' in text:
+                            ack = t
+                            break
+                    seen = len(self.log_lines)
+                    if ack is None:
+                        self.log_event.wait(0.05)
+            if ack is None:
+                lost += 1
+            else:
+                latencies.append((ack - t0) * 1000)
+            time.sleep(0.05)
+        self.board.set_acquiring(False)
+        return {
+            'line_rate': rate,
+            'samples': samples,
+            'lost': lost,
+            'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+            'max_ms': round(max(latencies), 3) if latencies else None,
+        }
+
+    # Intervals between getdata frames seen by the board
+    def trigger(self):
+        times = [t for t, board, op in self.sim.frame_log if op == 'b']
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        if not intervals:
+            return {'cycles': 0}
+        jitter = [abs(i - self.trigger_period) * 1000 for i in intervals]
+        drift = (times[-1] - times[0]) - len(intervals) * self.trigger_period
+        return {
+            'period_s': self.trigger_period,
+            'cycles': len(intervals),
+            'mean_interval_s': round(sum(intervals) / len(intervals), 6),
+            'jitter_p50_ms': round(percentile(jitter, 50), 3),
+            'jitter_p99_ms': round(percentile(jitter, 99), 3),
+            'drift_per_cycle_ms': round(drift / len(intervals) * 1000, 3),
+            'scheduler': self.session.trigger.stats(),
+        }
+
+    def close(self):
+        self.engine.stop()
+        self.sim.stop()
+        self.tmpdir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acquisition throughput / latency benchmark")
+    parser.add_argument('--rates', type=int, nargs='+', default=DEFAULT_RATES, help="data line rates to try (lines/s)")
+    parser.add_argument('--duration', type=float, default=3.0, help="seconds per throughput step")
+    parser.add_argument('--trigger-period', type=float, default=1.0, help="getdata period used during the run (s)")
+    parser.add_argument('--latency-rate', type=int, default=200, help="data line rate during the latency test")
+    parser.add_argument('--latency-samples', type=int, default=50)
+    parser.add_argument('--output', help="JSON report file (default: only printed)")
+    args = parser.parse_args()
+
+    from serial_reader import measure_throughput
+
+    bench = Bench(args.trigger_period)
+    report = {
+        'revision': git_revision(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': vars(args),
+    }
+    try:
+        # the acquisition prints every received line: keep the console readable
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            bench.start()
+            time.sleep(0.5)
+            report['throughput'] = bench.throughput(args.rates, args.duration)
+            report['latency'] = bench.latency(args.latency_rate, args.latency_samples)
+            report['trigger'] = bench.trigger()
+            report['framing'] = measure_throughput(50000)
+    finally:
+        bench.close()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import datetime
+import glob
+import os
+import re
+import struct
+import time
+
+from output_writers import DailyFileWriter, COMMIT_BATCHED
+from data_parser import N_CHANNELS
+
+# Compact binary store for getData records, written next to the text received_data files.
+# Every chunk file starts with a fixed HEADER_SIZE bytes header (board ID, DAC thresholds in
+# effect, record layout) followed by fixed width little-endian records:
+#   int64 timestamp (board wall clock, seconds since 1970) | 48 x uint32 counts | uint8 status | 7 pad
+# so a chunk can be opened with numpy.memmap without any parsing.
+# A new chunk is started on every day change, at every restart and whenever the metadata
+# (board ID or DAC thresholds) changes, so the header always describes all records in the chunk.
+# Chunk names: <prefix>_DD_MM_YYYY_NNN.bin
+
+MAGIC = b'TBREC\x00\x00\x01'
+FORMAT_VERSION = 1
+HEADER_SIZE = 256
+HEADER_STRUCT = struct.Struct('<8sHHHHh8Hq')    # magic, version, header size, record size, channels, board ID, 8 DAC thr (mV), created
+RECORD_STRUCT = struct.Struct(f'<q{N_CHANNELS}IB7x')
+RECORD_SIZE = RECORD_STRUCT.size
+
+DAC_GROUPS = 'abcdefgh'
+DAC_UNKNOWN = 0xFFFF                            # threshold not known (e.g. set before the process started)
+
+CHUNK_NAME_RE = re.compile(r'_(\d{2})_(\d{2})_(\d{4})_(\d{3})\.bin$')
+
+
+# numpy dtype matching RECORD_STRUCT (numpy is only needed to read the store)
+def record_dtype():
+    import numpy as np
+    return np.dtype({
+        'names': ['timestamp', 'counts', 'status'],
+        'formats': ['<i8', ('<u4', (N_CHANNELS,)), 'u1'],
+        'offsets': [0, 8, 8 + 4 * N_CHANNELS],
+        'itemsize': RECORD_SIZE,
+    })
+
+
+def pack_header(board_id, thresholds):
+    dac = [thresholds.get(g, DAC_UNKNOWN) for g in DAC_GROUPS]
+    header = HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, HEADER_SIZE, RECORD_SIZE, N_CHANNELS,
+                                board_id, *dac, int(time.time()))
+    return header.ljust(HEADER_SIZE, b'\x00')
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_STRUCT.size or raw[:8] != MAGIC:
+        raise ValueError(f"{path}: not a TetraBall record file")
+    fields = HEADER_STRUCT.unpack_from(raw)
+    dac = fields[6:14]
+    return {
+        'version': fields[1],
+        'header_size': fields[2],
+        'record_size': fields[3],
+        'n_channels': fields[4],
+        'board_id': fields[5],
+        'thresholds': {g: mv for g, mv in zip(DAC_GROUPS, dac) if mv != DAC_UNKNOWN},
+        'created': fields[14],
+    }
+
+
+class BinaryRecordWriter(DailyFileWriter):
+
+    def __init__(self, directory, prefix='received_data', board_id=0, thresholds=None, policy=COMMIT_BATCHED):
+        self.board_id = board_id
+        self.thresholds = dict(thresholds or {})
+        self._chunk = 0
+        super().__init__(directory, prefix, policy, ext='.bin')
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{self.prefix}_{day.strftime('%d_%m_%Y')}_{self._chunk:03d}{self.ext}")
+
+    def write_record(self, record, when=None):
+        self.write_bytes(RECORD_STRUCT.pack(record.timestamp, *record.counts, record.status), when)
+
+    # Update board ID and/or DAC thresholds ({'a': 1300, ...} in mV); starts a new chunk
+    def set_metadata(self, board_id=None, thresholds=None):
+        with self._lock:
+            if board_id is not None:
+                self.board_id = board_id
+            if thresholds:
+                self.thresholds.update(thresholds)
+            if self._day is None:
+                return
+            if not self._pending and self._handle.tell() <= HEADER_SIZE:
+                # nothing recorded with the old metadata yet: rewrite the header in place
+                self._handle.close()
+                self._handle = open(self._path, 'wb')
+                self._handle.write(pack_header(self.board_id, self.thresholds))
+            else:
+                self._rollover(self._day)
+
+    def _rollover(self, day):
+        # never append to an existing chunk: its header may describe another configuration
+        self._chunk = 0
+        while os.path.exists(self.path_for(day)):
+            self._chunk += 1
+        super()._rollover(day)
+
+    def _open(self, path):
+        handle = open(path, 'ab')
+        handle.write(pack_header(self.board_id, self.thresholds))
+        return handle
+
+
+# Open one chunk as a read-only memmap of records (a trailing partial record is ignored)
+def open_chunk(path):
+    import numpy as np
+    header = read_header(path)
+    if header['record_size'] != RECORD_SIZE or header['n_channels'] != N_CHANNELS:
+        raise ValueError(f"{path}: unsupported record layout")
+    n = (os.path.getsize(path) - header['header_size']) // RECORD_SIZE
+    if n <= 0:
+        return header, np.empty(0, dtype=record_dtype())
+    return header, np.memmap(path, dtype=record_dtype(), mode='r', offset=header['header_size'], shape=(n,))
+
+
+# Chunk files in directory, sorted by day and chunk number, optionally limited to [start_day, end_day]
+def find_chunks(directory, prefix='received_data', start_day=None, end_day=None):
+    chunks = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}_*.bin")):
+        m = CHUNK_NAME_RE.search(path)
+        if not m:
+            continue
+        day = datetime.date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        chunks.append((day, int(m.group(4)), path))
+    return [path for day, chunk, path in sorted(chunks)]
+
+
+# Load all records between start_day and end_day.
+# With concatenate=False a list of (header, memmap) per chunk is returned without copying.
+def load_records(directory, prefix='received_data', start_day=None, end_day=None, concatenate=True):
+    import numpy as np
+    chunks = [open_chunk(path) for path in find_chunks(directory, prefix, start_day, end_day)]
+    if not concatenate:
+        return chunks
+    if not chunks:
+        return np.empty(0, dtype=record_dtype())
+    return np.concatenate([records for header, records in chunks])
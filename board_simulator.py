@@ -0,0 +1,289 @@
+import argparse
+import datetime
+import math
+import os
+import random
+import threading
+import time
+
+import protocol
+from protocol import BOARD_ID_OFFSET, BOARD_MAGIC_ID, CHANNELS_GROUPS, STATUS_ACQUISITION_ON
+
+# Virtual TetraBall digital board on a pseudo-terminal (Linux / macOS).
+# The simulator speaks the real framing: '\n' + [ID + 33] + opcode 'a'..'r' + payload + '\n',
+# (opcodes, IDs and status bits from protocol.py), answers with '>' prefixed ACK lines, buffers one 48-channel count line per second while the
+# acquisition is on and returns threshold dependent count rates after setdac.
+# Several boards can share one pty, like boards sharing the RS485 bus.
+#
+#   python board_simulator.py --boards 0 1 --rate 500 --latency 0.005
+# prints the device path to use as SERIAL_PORT.
+
+N_CHANNELS = 48
+BUFFER_SHORT_SIZE = 23              # seconds kept by the board between two getData requests
+
+RESET_BANNER = ["==================", "USART Initialized!"]
+
+
+# Poisson sample without numpy (normal approximation for large means)
+def poisson(mean, rng):
+    if mean <= 0:
+        return 0
+    if mean > 50:
+        return max(0, int(round(rng.gauss(mean, math.sqrt(mean)))))
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+class VirtualBoard:
+
+    # signal_rate: counts/s of the signal plateau; noise_rate: counts/s at the noise edge
+    # signal_mv / noise_mv: thresholds (mV) where signal and noise fall off
+    def __init__(self, board_id=0, signal_rate=200.0, noise_rate=5000.0, signal_mv=600, noise_mv=150, seed=None,
+                 buffer_size=BUFFER_SHORT_SIZE):
+        self.board_id = board_id
+        self.buffer_size = buffer_size
+        self.signal_rate = signal_rate
+        self.noise_rate = noise_rate
+        self.signal_mv = signal_mv
+        self.noise_mv = noise_mv
+        self.rng = random.Random(seed)
+        self.thresholds = {g: 300 for g in CHANNELS_GROUPS}
+        self.overv, self.undv, self.overt, self.undt = 16500, 10500, 4550, -550
+        self.status = 0
+        self.acquiring = False
+        self.buffer = []
+        self.clock_offset = datetime.timedelta(0)
+        self.lock = threading.Lock()
+        self.lines_generated = 0
+        self.lines_sent = 0
+        self.lines_overflowed = 0
+        # per channel gain spread, so that channels of a group are not identical
+        self.gain = [self.rng.uniform(0.8, 1.2) for _ in range(N_CHANNELS)]
+
+    def addressed(self, id_byte):
+        return id_byte in (self.board_id + BOARD_ID_OFFSET, BOARD_MAGIC_ID + BOARD_ID_OFFSET)
+
+    def now(self):
+        return datetime.datetime.now() + self.clock_offset
+
+    # Expected counts/s of a channel at threshold mv: noise tail + signal S-curve
+    def rate(self, channel, mv):
+        noise = self.noise_rate * math.exp(-(mv - self.noise_mv) / 25.0) if mv > self.noise_mv else self.noise_rate
+        signal = self.signal_rate * 0.5 * math.erfc((mv - self.signal_mv * self.gain[channel]) / (math.sqrt(2) * 60.0))
+        return noise + signal
+
+    # One second of acquisition (called by the simulator clock)
+    def tick(self, when=None):
+        with self.lock:
+            if not self.acquiring:
+                return
+            when = when or self.now()
+            counts = [poisson(self.rate(ch, self.thresholds[CHANNELS_GROUPS[ch // 6]]), self.rng) for ch in range(N_CHANNELS)]
+            line = when.strftime("%d%m%y") + "\t" + when.strftime("%H%M%S") + "\t" + "\t".join(map(str, counts)) + f"\t{self.status}"
+            self.buffer.append(line)
+            self.lines_generated += 1
+            if len(self.buffer) > self.buffer_size:
+                # buffer full before a request: the board empties it and starts again
+                self.lines_overflowed += len(self.buffer)
+                self.buffer = []
+
+    def set_acquiring(self, on):
+        self.acquiring = on
+        self.status = (self.status | STATUS_ACQUISITION_ON) if on else (self.status & ~STATUS_ACQUISITION_ON)
+
+    # Handle one command (name from protocol.COMMANDS, raw payload bytes); returns the response lines
+    def handle(self, cmd, payload=b''):
+        with self.lock:
+            try:
+                return self._handle(cmd, protocol.decode_payload(cmd, payload))
+            except (ValueError, IndexError, KeyError):
+                return [">Invalid payload"]
+
+    # value: the payload decoded by protocol.decode_payload
+    def _handle(self, cmd, value):
+        if cmd == 'getstatus':
+            return [f">Status: {self.status}"]
+        if cmd == 'getdata':
+            if not self.acquiring and not self.buffer:
+                return [protocol.DATA_DEACTIVATED_REPLY]
+            lines, self.buffer = self.buffer, []
+            self.lines_sent += len(lines)
+            return lines
+        if cmd == 'setdate':
+            now = self.now()
+            self.clock_offset += datetime.datetime.combine(value, now.time()) - now
+            return [">ACK set Date"]
+        if cmd == 'settime':
+            now = self.now()
+            target = now.replace(hour=value.hour, minute=value.minute, second=value.second)
+            self.clock_offset += target - now
+            return [">ACK set Time"]
+        if cmd == 'getdatetime':
+            return [">DateTime: " + self.now().strftime("%d/%m/%Y %H:%M:%S")]
+        if cmd == 'getdac':
+            return [">DAC thr [mV]: " + " ".join(f"{g}={self.thresholds[g]}" for g in CHANNELS_GROUPS)]
+        if cmd == 'setdac':
+            group, mv = value
+            if group not in self.thresholds:
+                return [">Invalid DAC channel"]
+            self.thresholds[group] = mv
+            return [">ACK set DAC"]
+        if cmd == 'gettemp':
+            return [f">Temp probe: {self.rng.uniform(30, 32):.2f} C\tVin: {self.rng.uniform(11.9, 12.1):.2f} V\tTemp uC: {self.rng.uniform(24, 26):.2f} C"]
+        if cmd == 'reset':
+            self.buffer = []
+            return [">ACK reset"] + RESET_BANNER
+        if cmd == 'setid':
+            self.board_id = value
+            return [f">ACK set ID {self.board_id}"]
+        if cmd == 'getid':
+            return [f">Board ID: {self.board_id}"]
+        if cmd == 'setoverv':
+            self.overv = value
+            return [">ACK set OverV"]
+        if cmd == 'setundv':
+            self.undv = value
+            return [">ACK set UnderV"]
+        if cmd == 'setovert':
+            self.overt = value
+            return [">ACK set OverT"]
+        if cmd == 'setundt':
+            self.undt = value
+            return [">ACK set UnderT"]
+        if cmd == 'getconf':
+            return [f">Conf: OverV={self.overv} mV UnderV={self.undv} mV OverT={self.overt / 100:.2f} C UnderT={self.undt / 100:.2f} C"]
+        if cmd == 'start':
+            self.set_acquiring(True)
+            return [">ACK start acquisition"]
+        if cmd == 'stop':
+            self.set_acquiring(False)
+            return [">ACK stop acquisition"]
+        return [">Unknown command"]
+
+
+class PtyBoardSimulator:
+
+    # line_rate: data lines produced per second of real time (1 = real board, >1 = compressed time)
+    # latency:   delay (s) before a command is answered
+    # drop_probability: probability of dropping each outgoing byte
+    # banner_probability: probability per second of a spontaneous reset banner in the stream
+    def __init__(self, boards=None, line_rate=1.0, latency=0.0, drop_probability=0.0, banner_probability=0.0, seed=None):
+        import pty
+        import tty
+        self.boards = boards or [VirtualBoard(seed=seed)]
+        self.line_rate = line_rate
+        self.latency = latency
+        self.drop_probability = drop_probability
+        self.banner_probability = banner_probability
+        self.rng = random.Random(seed)
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self.frames_received = 0
+        self.bytes_sent = 0
+        self.frame_log = None           # set to a list to record (monotonic time, board ID, opcode) per frame
+
+    def start(self):
+        threading.Thread(target=self._read_loop, name="sim-read", daemon=True).start()
+        threading.Thread(target=self._clock_loop, name="sim-clock", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def send_lines(self, lines):
+        data = "".join(line + "\n" for line in lines).encode('ascii')
+        if self.drop_probability:
+            data = bytes(b for b in data if self.rng.random() >= self.drop_probability)
+        with self._write_lock:
+            try:
+                os.write(self.master, data)
+            except OSError:
+                return
+        self.bytes_sent += len(data)
+
+    def _read_loop(self):
+        pending = bytearray()
+        while not self._stop.is_set():
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                break
+            if not chunk:
+                break
+            pending += chunk
+            *frames, rest = pending.split(b'\n')
+            pending = bytearray(rest)
+            for frame in frames:
+                if len(frame) >= 2:
+                    self._dispatch(frame)
+
+    def _dispatch(self, frame):
+        self.frames_received += 1
+        id_byte, cmd, payload = frame[0], protocol.COMMANDS.get(frame[1]), bytes(frame[2:])
+        if self.frame_log is not None:
+            self.frame_log.append((time.monotonic(), id_byte - BOARD_ID_OFFSET, chr(frame[1])))
+        for board in self.boards:
+            if board.addressed(id_byte):
+                if self.latency:
+                    time.sleep(self.latency)
+                self.send_lines(board.handle(cmd, payload) if cmd else [">Unknown command"])
+
+    def _clock_loop(self):
+        next_tick = time.monotonic()
+        board_second = datetime.timedelta(seconds=1)
+        while not self._stop.is_set():
+            # line_rate may be changed while running
+            period = 1.0 / self.line_rate
+            next_tick = max(next_tick + period, time.monotonic() - 1.0)
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            for board in self.boards:
+                # in compressed time the board clock advances one second per line
+                if self.line_rate != 1.0:
+                    board.clock_offset += board_second - datetime.timedelta(seconds=period)
+                board.tick()
+            if self.banner_probability and self.rng.random() < self.banner_probability * period:
+                self.send_lines(RESET_BANNER)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual TetraBall board on a pseudo-terminal")
+    parser.add_argument('--boards', type=int, nargs='+', default=[0], help="board IDs on the bus")
+    parser.add_argument('--rate', type=float, default=200.0, help="signal plateau rate (counts/s per channel)")
+    parser.add_argument('--noise', type=float, default=5000.0, help="noise rate at the noise edge (counts/s)")
+    parser.add_argument('--line-rate', type=float, default=1.0, help="data lines per second (time compression)")
+    parser.add_argument('--latency', type=float, default=0.0, help="command response delay (s)")
+    parser.add_argument('--drop', type=float, default=0.0, help="probability of dropping each sent byte")
+    parser.add_argument('--banners', type=float, default=0.0, help="spontaneous reset banners per second")
+    parser.add_argument('--acquiring', action='store_true', help="start with the acquisition on")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    boards = [VirtualBoard(board_id=b, signal_rate=args.rate, noise_rate=args.noise, seed=args.seed) for b in args.boards]
+    for board in boards:
+        board.set_acquiring(args.acquiring)
+    sim = PtyBoardSimulator(boards, line_rate=args.line_rate, latency=args.latency,
+                            drop_probability=args.drop, banner_probability=args.banners, seed=args.seed).start()
+    print(f"Simulating boards {args.boards} on {sim.port} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == '__main__':
+    main()
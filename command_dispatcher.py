@@ -0,0 +1,173 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+# Single writer for one serial port.
+# Every producer (command prompt, GUI, periodic trigger, scans) submits frames here instead of
+# writing to the port. Frames are taken from a priority queue (interactive commands go before the
+# periodic getdata), written one at a time and each one is matched with the board response before
+# the next frame is written, so ACKs and data bursts of different commands never interleave.
+# submit() returns a concurrent.futures.Future resolved with the response lines:
+#   - commands: the first '>' line (ACK / reply); no answer in time -> retried, then TimeoutError
+#   - getdata:  the data lines, ended by BUS_QUIET of silence or by '>Data req with Count Deactivated!';
+#               no answer means the board buffer was empty (empty list, never retried)
+# Queue wait (submit -> first write) and response time (write -> complete) go to histograms.
+
+PRIORITY_STOP = -1
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_PERIODIC = 2
+
+BUS_QUIET = 0.05                # s of silence that ends a getdata burst
+COMMAND_TIMEOUT = 0.5           # s to wait for the response to a frame
+COMMAND_RETRIES = 2             # extra attempts after a timeout
+GETDATA_OPCODE = 'b'
+NO_RETRY_OPCODES = 'bij'        # getdata, reset and setid are never repeated
+
+
+class Command:
+
+    def __init__(self, board, frame, priority, timeout, retries):
+        self.board = board
+        self.frame = frame
+        self.opcode = chr(frame[2]) if len(frame) > 2 else ''
+        self.priority = priority
+        self.timeout = timeout
+        self.retries = 0 if self.opcode in NO_RETRY_OPCODES else retries
+        self.future = Future()
+        self.lines = []
+        self.complete = False
+        self.last_rx = None
+        self.attempts = 0
+        self.submitted = time.monotonic()
+
+    # Called for every line received while this command owns the port
+    def add_line(self, line, now):
+        if line.startswith('>'):
+            if self.opcode != GETDATA_OPCODE or not self.lines:
+                self.lines.append(line)
+                self.complete = True
+                self.last_rx = now
+        elif self.opcode == GETDATA_OPCODE:
+            self.lines.append(line)
+            self.last_rx = now
+
+
+class CommandDispatcher:
+
+    # port: object with .ser (serial port) and .current (board the incoming lines are routed to)
+    def __init__(self, port, timeout=COMMAND_TIMEOUT, retries=COMMAND_RETRIES):
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._active = None
+        self._thread = None
+        self.sent = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.queue_wait = metrics.REGISTRY.histogram(
+            'command_queue_wait_seconds', "Time a frame waits for the port", port=port.name)
+        self.response_time = {
+            kind: metrics.REGISTRY.histogram('command_response_seconds', "Frame write to complete response",
+                                             port=port.name, kind=kind)
+            for kind in ('command', 'getdata')}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"dispatch-{self.port.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, board, frame, priority=PRIORITY_INTERACTIVE, timeout=None, retries=None):
+        command = Command(board, frame, priority, self.timeout if timeout is None else timeout,
+                          self.retries if retries is None else retries)
+        self._queue.put((priority, next(self._seq), command))
+        return command.future
+
+    # Fed by the port reader with every received line
+    def on_line(self, line):
+        with self._cond:
+            if self._active is not None:
+                self._active.add_line(line, time.monotonic())
+                self._cond.notify_all()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stop(self):
+        self._queue.put((PRIORITY_STOP, next(self._seq), None))
+        if self._thread is not None:
+            self._thread.join(timeout=2 * self.timeout)
+
+    def _run(self):
+        while True:
+            _, _, command = self._queue.get()
+            if command is None:
+                break
+            if command.future.set_running_or_notify_cancel():
+                self._execute(command)
+        # cancel whatever was still waiting
+        while True:
+            try:
+                _, _, command = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if command is not None:
+                command.future.cancel()
+
+    def _execute(self, command):
+        for attempt in range(command.retries + 1):
+            command.attempts = attempt + 1
+            if attempt:
+                self.retried += 1
+            else:
+                self.queue_wait.observe(time.monotonic() - command.submitted)
+            with self._cond:
+                command.lines, command.complete, command.last_rx = [], False, None
+                self._active = command
+                self.port.current = command.board
+            try:
+                self.port.ser.write(command.frame)
+            except Exception as e:
+                self._release()
+                command.future.set_exception(e)
+                return
+            self.sent += 1
+            written = time.monotonic()
+            answered = self._wait(command)
+            self._release()
+            if answered:
+                self.response_time['getdata' if command.opcode == GETDATA_OPCODE else 'command'].observe(time.monotonic() - written)
+            if answered or command.opcode == GETDATA_OPCODE:
+                command.future.set_result(command.lines)
+                return
+        self.timeouts += 1
+        command.future.set_exception(TimeoutError(
+            f"No response from board {command.board.board_id} to '{command.opcode}' after {command.attempts} attempts"))
+
+    # True when the response is complete, False on timeout
+    def _wait(self, command):
+        deadline = time.monotonic() + command.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if command.complete:
+                    return True
+                if command.last_rx is not None and now - command.last_rx >= BUS_QUIET:
+                    return bool(command.lines)
+                if command.last_rx is None and now >= deadline:
+                    return False
+                self._cond.wait(BUS_QUIET if command.last_rx is not None else deadline - now)
+
+    def _release(self):
+        with self._cond:
+            self._active = None
+
+    def stats(self):
+        return {'sent': self.sent, 'retried': self.retried, 'timeouts': self.timeouts, 'pending': self.pending()}
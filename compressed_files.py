@@ -0,0 +1,174 @@
+import bz2
+import datetime
+import glob
+import gzip
+import hashlib
+import lzma
+import os
+import queue
+import threading
+
+# Compressed daily files.
+# Once a writer has rolled over to a new day, the closed received_data / command_log file is
+# compressed in a background thread (Compressor): the compressed copy is written to a temporary
+# file, read back and compared (SHA-256 and size) with the original, and only then renamed into
+# place and the original removed. Companion files (.idx, .r1m, .r1h, .bin) are left as they are.
+# Readers open files through open_file() / resolve() / glob_files(), which stream .gz, .xz and
+# .bz2 files transparently (seek works on the uncompressed offsets, so the time index still applies).
+# xz preset 1 compresses the data files about as well as gzip -6 while using less CPU; gzip
+# decompresses faster, bz2 is smaller but slow to read back.
+
+CODECS = {'.gz': gzip, '.xz': lzma, '.bz2': bz2}
+DEFAULT_CODEC = '.xz'
+DEFAULT_LEVEL = 1
+CHUNK_SIZE = 1 << 20
+TMP_EXT = '.tmp'
+DAILY_NAME = '_[0-9][0-9]_[0-9][0-9]_[0-9][0-9][0-9][0-9].txt'
+
+
+def compression_ext(path):
+    ext = os.path.splitext(path)[1]
+    return ext if ext in CODECS else ''
+
+
+# received_data_18_10_2026.txt.xz -> received_data_18_10_2026.txt
+def strip_compression(path):
+    ext = compression_ext(path)
+    return path[:-len(ext)] if ext else path
+
+
+# open() that decompresses .gz / .xz / .bz2 files on the fly ('r' opens them in text mode)
+def open_file(path, mode='rb', **kwargs):
+    ext = compression_ext(path)
+    if not ext:
+        return open(path, mode, **kwargs)
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    return CODECS[ext].open(path, mode, **kwargs)
+
+
+# Existing file for path: itself, else its compressed copy; None if there is neither
+def resolve(path):
+    if os.path.exists(path):
+        return path
+    for ext in CODECS:
+        if os.path.exists(path + ext):
+            return path + ext
+    return None
+
+
+# glob() that also finds the compressed copies; while a file is being compressed the original wins
+def glob_files(pattern):
+    found = {}
+    for ext in [''] + list(CODECS):
+        for path in glob.glob(pattern + ext):
+            found.setdefault(strip_compression(path), path)
+    return [found[path] for path in sorted(found)]
+
+
+def _open_for_writing(path, ext, level):
+    if ext == '.xz':
+        return lzma.open(path, 'wb', preset=level)
+    return CODECS[ext].open(path, 'wb', compresslevel=level)
+
+
+def _digest(handle):
+    digest, size = hashlib.sha256(), 0
+    for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+# Compress path into path + ext, verify the copy and remove the original.
+# Returns (original size, compressed size); raises ValueError when the copy does not match.
+def compress_file(path, ext=DEFAULT_CODEC, level=DEFAULT_LEVEL):
+    target = path + ext
+    tmp = target + TMP_EXT
+    stat = os.stat(path)
+    digest, size = hashlib.sha256(), 0
+    with open(path, 'rb') as source, _open_for_writing(tmp, ext, level) as compressed:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+            compressed.write(chunk)
+    with open(tmp, 'rb') as written:
+        os.fsync(written.fileno())
+    with CODECS[ext].open(tmp, 'rb') as check:
+        copy_digest, copy_size = _digest(check)
+    current = os.stat(path)
+    if (copy_digest, copy_size) != (digest.hexdigest(), size) or (current.st_size, current.st_mtime) != (stat.st_size, stat.st_mtime):
+        os.remove(tmp)
+        raise ValueError(f"{path}: compressed copy does not match the original (or the file changed)")
+    # keep the times of the original (readers compare them with their companion files)
+    os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(tmp, target)
+    os.remove(path)
+    return size, os.path.getsize(target)
+
+
+# Background compression of closed daily files
+class Compressor:
+
+    def __init__(self, ext=DEFAULT_CODEC, level=DEFAULT_LEVEL):
+        if ext not in CODECS:
+            raise ValueError(f"Unknown compression {ext} ({', '.join(CODECS)})")
+        self.ext = ext
+        self.level = level
+        self._queue = queue.Queue()
+        self._thread = None
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.failed = 0
+        self._stopping = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="compressor", daemon=True)
+        self._thread.start()
+        return self
+
+    # Queue a closed file (called by the writers when they roll over to a new day)
+    def submit(self, path):
+        self._queue.put(path)
+
+    # Queue the daily files of the given prefixes older than today, left uncompressed by a
+    # previous run; stale temporary files of an interrupted compression are removed
+    def sweep(self, directory, prefixes, today=None):
+        today = (today or datetime.date.today()).strftime('%d_%m_%Y')
+        for path in glob.glob(os.path.join(directory, '*' + TMP_EXT)):
+            if compression_ext(path[:-len(TMP_EXT)]):
+                os.remove(path)
+        for prefix in prefixes:
+            for path in sorted(glob.glob(os.path.join(glob.escape(directory), glob.escape(prefix) + DAILY_NAME))):
+                if not path.endswith(today + '.txt'):
+                    self.submit(path)
+
+    # Finish the file being compressed, leave the rest for the next sweep
+    def stop(self):
+        self._stopping = True
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None or self._stopping:
+                break
+            if not os.path.exists(path):
+                continue
+            try:
+                size, compressed = compress_file(path, self.ext, self.level)
+            except (OSError, ValueError) as e:
+                # e.g. the file is still open elsewhere on Windows: retried at the next start
+                self.failed += 1
+                print(f"[Warning] Compression of {path} failed: {e}")
+                continue
+            self.compressed += 1
+            self.bytes_in += size
+            self.bytes_out += compressed
+
+    def stats(self):
+        return {'compressed': self.compressed, 'failed': self.failed, 'pending': self._queue.qsize(),
+                'ratio': round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None}
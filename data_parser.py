@@ -0,0 +1,177 @@
+import datetime
+from collections import namedtuple
+
+from compressed_files import open_file
+
+# Parsing of getData lines.
+# The board sends one line per second: DDMMYY \t HHMMSS \t CH1 \t ... \t CH48 \t STATUS
+# and received_data_*.txt prepends the PC reception time ("dd/mm/YYYY HH:MM:SS") as first field.
+# Timestamps are the board wall clock expressed as seconds since 1970-01-01 (no timezone).
+# Files may be compressed (.gz / .xz / .bz2, see compressed_files.py): they are read as streams.
+
+N_CHANNELS = 48
+BOARD_FIELDS = N_CHANNELS + 3           # board date, board time, 48 counts, status
+FILE_FIELDS = BOARD_FIELDS + 1          # PC timestamp + board fields
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+DataRecord = namedtuple('DataRecord', ['timestamp', 'counts', 'status'])
+
+
+# DDMMYY, HHMMSS -> seconds since epoch of the board wall clock
+def board_timestamp(date_str, time_str):
+    if len(date_str) != 6 or len(time_str) != 6:
+        raise ValueError(f"bad board date/time: {date_str} {time_str}")
+    day = datetime.date(2000 + int(date_str[4:6]), int(date_str[2:4]), int(date_str[0:2]))
+    tod = datetime.time(int(time_str[0:2]), int(time_str[2:4]), int(time_str[4:6]))
+    return (day.toordinal() - EPOCH_ORDINAL) * 86400 + tod.hour * 3600 + tod.minute * 60 + tod.second
+
+
+def timestamp_to_datetime(timestamp):
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=int(timestamp))
+
+
+# Parse one data line (as sent by the board or as stored in received_data).
+# Returns a DataRecord, or None when the line is not a complete data line.
+def parse_data_line(line):
+    fields = line.strip().split('\t')
+    if len(fields) == FILE_FIELDS:
+        fields = fields[1:]
+    elif len(fields) != BOARD_FIELDS:
+        return None
+    try:
+        timestamp = board_timestamp(fields[0], fields[1])
+        counts = [int(c) for c in fields[2:2 + N_CHANNELS]]
+        status = int(fields[-1])
+        if status > 255 or min(counts) < 0:
+            raise ValueError("value out of range")
+    except ValueError:
+        return None
+    return DataRecord(timestamp, counts, status)
+
+
+# ---------------------------------------------------------------------------------------------
+# Offline parsing of received_data_*.txt / command_log_*.txt files
+# ---------------------------------------------------------------------------------------------
+
+ParseIssue = namedtuple('ParseIssue', ['line_no', 'reason', 'text'])
+DataArrays = namedtuple('DataArrays', ['timestamps', 'counts', 'status'])
+LogEntry = namedtuple('LogEntry', ['time', 'text'])
+
+PC_TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+
+# Reason why a line is not a data line (None when it is valid)
+def check_data_line(line):
+    fields = line.strip().split('\t')
+    if len(fields) not in (BOARD_FIELDS, FILE_FIELDS):
+        return f"{len(fields)} fields"
+    return None if parse_data_line(line) is not None else "invalid value"
+
+
+# Streaming path: yield a DataRecord per valid line. Skipped lines are appended to issues.
+def iter_records(path, issues=None):
+    with open_file(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line_no, line in enumerate(f, 1):
+            record = parse_data_line(line)
+            if record is not None:
+                yield record
+            elif issues is not None and line.strip():
+                issues.append(ParseIssue(line_no, check_data_line(line), line.strip()))
+
+
+# Command log entries: PC time + reply/command text
+def iter_log_entries(path, issues=None):
+    with open_file(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            stamp, sep, text = line.partition('\t')
+            try:
+                when = datetime.datetime.strptime(stamp, PC_TIME_FORMAT)
+            except ValueError:
+                if issues is not None:
+                    issues.append(ParseIssue(line_no, "bad timestamp", line))
+                continue
+            yield LogEntry(when, text.strip())
+
+
+# Bulk path: parse a whole data file into numpy arrays without per-field Python objects.
+# Returns DataArrays(timestamps (N,) int64, counts (48, N) uint32, status (N,) uint8) in file order.
+# Lines with a wrong field count, empty fields, non numeric characters or impossible
+# dates/times are skipped and reported in issues; only those lines are handled in Python.
+def load_data_file(path, issues=None):
+    with open_file(path, 'rb') as f:
+        data = f.read()
+    return parse_data_bytes(data, issues)
+
+
+def parse_data_bytes(data, issues=None):
+    import numpy as np
+    buf = np.frombuffer(data, dtype=np.uint8)
+    nl = np.flatnonzero(buf == 10)
+    starts = np.concatenate(([0], nl + 1))
+    ends = np.concatenate((nl, [len(buf)]))
+    if len(ends) and starts[-1] == ends[-1]:
+        starts, ends = starts[:-1], ends[:-1]
+    n_lines = len(starts)
+
+    # per line counts from the positions of tabs, non allowed characters and digit runs
+    def per_line(positions):
+        return np.searchsorted(positions, ends) - np.searchsorted(positions, starts)
+
+    is_digit = (buf >= 48) & (buf <= 57)
+    allowed = is_digit | (buf == 9) | (buf == 10) | (buf == 13) | (buf == 32) | (buf == 47) | (buf == 58)
+    n_tabs = per_line(np.flatnonzero(buf == 9))
+    n_bad = per_line(np.flatnonzero(~allowed))
+    n_runs = per_line(np.flatnonzero(is_digit & ~np.concatenate(([False], is_digit[:-1]))))
+
+    # received_data lines: PC time (6 numbers) + 51 board fields; raw board lines: 51 fields
+    file_lines = (n_tabs == FILE_FIELDS - 1) & (n_bad == 0) & (n_runs == BOARD_FIELDS + 6)
+    board_lines = (n_tabs == BOARD_FIELDS - 1) & (n_bad == 0) & (n_runs == BOARD_FIELDS)
+
+    parts = []
+    for mask, skip in ((file_lines, 6), (board_lines, 0)):
+        if not mask.any():
+            continue
+        keep = np.repeat(mask, np.diff(np.concatenate((starts, [len(buf)]))))
+        text = buf[keep]
+        text[(text == 47) | (text == 58)] = 32              # '/' and ':' of the PC time become separators
+        values = np.fromstring(text.tobytes(), dtype=np.int64, sep=' ')
+        values = values.reshape(-1, BOARD_FIELDS + skip)[:, skip:]
+        parts.append((np.flatnonzero(mask), values))
+
+    if parts:
+        order = np.concatenate([idx for idx, values in parts])
+        values = np.concatenate([values for idx, values in parts])
+        sort = np.argsort(order, kind='stable')
+        order, values = order[sort], values[sort]
+    else:
+        order = np.empty(0, dtype=np.int64)
+        values = np.empty((0, BOARD_FIELDS), dtype=np.int64)
+
+    # board date/time fields: DDMMYY, HHMMSS (6 digits each, leading zeros may be missing)
+    date, tod = values[:, 0], values[:, 1]
+    day, month, year = date // 10000, (date // 100) % 100, 2000 + date % 100
+    hour, minute, second = tod // 10000, (tod // 100) % 100, tod % 100
+    valid = ((day >= 1) & (day <= 31) & (month >= 1) & (month <= 12)
+             & (hour < 24) & (minute < 60) & (second < 60) & (values[:, -1] < 256))
+    month_start = (year - 1970) * 12 + np.clip(month, 1, 12) - 1
+    days = np.asarray(month_start, dtype='datetime64[M]').astype('datetime64[D]').astype(np.int64) + day - 1
+    # reject days past the end of the month (e.g. 310225)
+    next_month = np.asarray(month_start + 1, dtype='datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    valid &= days < next_month
+    timestamps = days * 86400 + hour * 3600 + minute * 60 + second
+
+    if issues is not None:
+        rejected = np.ones(n_lines, dtype=bool)
+        rejected[order[valid]] = False
+        blank = (ends - starts) == per_line(np.flatnonzero((buf == 32) | (buf == 13)))
+        for i in np.flatnonzero(rejected & ~blank):
+            line = data[starts[i]:ends[i]].decode('utf-8', errors='replace')
+            issues.append(ParseIssue(int(i) + 1, check_data_line(line) or "invalid date/time", line.strip()))
+
+    return DataArrays(timestamps[valid],
+                      values[valid, 2:2 + N_CHANNELS].T.astype(np.uint32),
+                      values[valid, -1].astype(np.uint8))
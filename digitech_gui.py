@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk
 import datetime
+import math
+
+import protocol
 
 HELP_CMD_MSG = """
     USER INPUT   \t     OPCODE      \t      Description                     \t      Arguments
@@ -26,59 +29,33 @@ HELP_CMD_MSG = """
     help         \t     (--local)   \t      Print this help message         \t      
 """
 
+# Rate monitor: redrawn every MONITOR_REFRESH_MS from the board's in-memory ring (rate_ring.py)
+MONITOR_REFRESH_MS = 1000
+MONITOR_POINTS = 300            # decimated points per trace
+MONITOR_WINDOWS = [("10 min", 600), ("1 h", 3600), ("6 h", 6 * 3600), ("24 h", 24 * 3600)]
+HEAT_SECONDS = 60               # heat strip: mean rate of the last minute
+GROUP_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
+ALARM_REFRESH_MS = 1000
+ALARM_ROWS = 6                  # latest status events listed
+
 def send(cmd, arg1, arg2, serial_port, format_command, DAC_CHANNELS_ID, BOARD__MAGIC_ID, CTRL_FILE=None):
     try:
-        if cmd in {'getstatus','getdata','getdatetime','getdac','gettemp','reset','getid','getconf','start','stop'}:
-            formatted = format_command(cmd, 0)
-        elif cmd == 'settime':
-            payload = datetime.datetime.now().strftime("%H%M%S").encode("ascii")
-            formatted = format_command(cmd, payload)
-        elif cmd == 'setdate':
-            payload = datetime.datetime.now().strftime("%d%m%Y").encode("ascii")
-            formatted = format_command(cmd, payload)
-        elif cmd == 'setdac':
-            if not arg1 or not arg2: return
-            payload = DAC_CHANNELS_ID.get(arg1.lower())
-            if payload is None: return
-            try: thr_v = float(arg2)
-            except: return
-            thr_n = int(thr_v * 1000)
-            thr_str = f"{thr_n//1000}{(thr_n%1000)//100}{(thr_n%100)//10}{thr_n%10}"
-            payload += thr_str.encode("ascii")
-            formatted = format_command(cmd, payload)
-            if CTRL_FILE is not None:
+        if cmd not in protocol.OPCODES: return
+        if cmd == 'setdac' and (not arg1 or arg1.lower() not in DAC_CHANNELS_ID): return
+        # invalid or out of range arguments are ignored, like before
+        try: payload = protocol.payload_from_args(cmd, [a for a in (arg1, arg2) if a])
+        except ValueError: return
+        formatted = format_command(cmd, payload)
+        if cmd == 'setdac' and CTRL_FILE is not None:
+            cur_time = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+            entry = f"{cur_time}\t Set DAC: CHN = {arg1}, THR = {float(arg2)}V"
+            # CTRL_FILE is either a log writer (write_line) or a plain file path
+            if hasattr(CTRL_FILE, 'write_line'):
+                CTRL_FILE.write_line(entry)
+            else:
                 with open(CTRL_FILE, 'a') as ctrl_file:
-                    cur_time = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-                    ctrl_file.write(f"{cur_time}\t Set DAC: CHN = {arg1}, THR = {thr_v}V\n")
+                    ctrl_file.write(entry + "\n")
                     ctrl_file.flush()
-        elif cmd == 'setid':
-            if not arg1: return
-            try: num = int(arg1)
-            except: return
-            if num < 62 or num == BOARD__MAGIC_ID:
-                payload = chr(num+33).encode('ASCII')
-                formatted = format_command(cmd, payload)
-            else: return
-        elif cmd in {'setoverv','setundv'}:
-            if not arg1: return
-            try: val = float(arg1)
-            except: return
-            thr_n = int(val * 1000)
-            thr_str = f"{thr_n//10000}{(thr_n%10000)//1000}{(thr_n%1000)//100}{(thr_n%100)//10}{thr_n%10}"
-            payload = thr_str.encode("ascii")
-            formatted = format_command(cmd, payload)
-        elif cmd in {'setovert','setundt'}:
-            if not arg1: return
-            try: val = float(arg1)
-            except: return
-            thr_n = int(val * 100)
-            thr_sign = '-' if thr_n < 0 else '+'
-            thr_n = abs(thr_n)
-            thr_str = f"{thr_sign}{thr_n//1000}{(thr_n%1000)//100}{(thr_n%100)//10}{thr_n%10}"
-            payload = thr_str.encode("ascii")
-            formatted = format_command(cmd, payload)
-        else:
-            return
         if formatted: serial_port.write(formatted)
     except: pass
 
@@ -199,7 +176,133 @@ def show_help(root):
     ttk.Button(help_win, text="Close", command=close_help).pack(pady=5)
     help_win.protocol("WM_DELETE_WINDOW", close_help)
 
-def start_gui(serial_port, format_command, DAC_CHANNELS_ID, BOARD__MAGIC_ID, CTRL_FILE):
+# Live rates of one board: mean rate of each DAC group over the chosen window (log scale) and a
+# heat strip of the 48 channels. Canvas items are created once and only moved / recoloured, and
+# the data come from the ring buffer only, so a redraw costs the same after an hour or a month.
+class RateMonitor(ttk.LabelFrame):
+
+    WIDTH, HEIGHT, STRIP = 480, 220, 36
+    MARGIN = 40
+    LOG_MIN, LOG_MAX = -1, 5        # counts/s, decades
+
+    def __init__(self, master, rates):
+        super().__init__(master, text="Rate Monitor", padding=10)
+        self.rates = rates
+        windows = [name for name, seconds in MONITOR_WINDOWS if seconds <= rates.capacity] or [MONITOR_WINDOWS[0][0]]
+        self.window = tk.StringVar(value=windows[min(1, len(windows) - 1)])
+        ttk.Label(self, text="Window:").grid(row=0, column=0, sticky='e')
+        ttk.OptionMenu(self, self.window, self.window.get(), *windows).grid(row=0, column=1, sticky='w')
+        self.info = ttk.Label(self, text="waiting for data...")
+        self.info.grid(row=0, column=2, sticky='e')
+        self.grid_columnconfigure(2, weight=1)
+        self.plot = tk.Canvas(self, width=self.WIDTH, height=self.HEIGHT, bg='white', highlightthickness=0)
+        self.plot.grid(row=1, column=0, columnspan=3, pady=(5, 0))
+        self.strip = tk.Canvas(self, width=self.WIDTH, height=self.STRIP, bg='white', highlightthickness=0)
+        self.strip.grid(row=2, column=0, columnspan=3, pady=(5, 0))
+        self.draw_axes()
+        self.refresh()
+
+    def draw_axes(self):
+        m = self.MARGIN
+        self.plot.create_rectangle(m, 10, self.WIDTH - 10, self.HEIGHT - 20)
+        for decade in range(self.LOG_MIN, self.LOG_MAX + 1):
+            self.plot.create_text(m - 4, self.y(10 ** decade), text=f"1e{decade}", anchor='e', font=('TkDefaultFont', 7))
+        for g, grp in enumerate(protocol.CHANNELS_GROUPS):
+            self.plot.create_text(m + 8 + g * 20, 18, text=grp, fill=GROUP_COLORS[g], font=('TkDefaultFont', 8, 'bold'))
+        self.start_label = self.plot.create_text(m, self.HEIGHT - 10, text="", anchor='w', font=('TkDefaultFont', 7))
+        self.end_label = self.plot.create_text(self.WIDTH - 10, self.HEIGHT - 10, text="", anchor='e', font=('TkDefaultFont', 7))
+        self.lines = [self.plot.create_line(0, 0, 0, 0, fill=color, width=2, state='hidden') for color in GROUP_COLORS]
+        cell = (self.WIDTH - m - 10) / self.rates.counts.shape[1]
+        self.cells = [self.strip.create_rectangle(m + ch * cell, 2, m + (ch + 1) * cell, self.STRIP - 14, outline='')
+                      for ch in range(self.rates.counts.shape[1])]
+        for g, grp in enumerate(protocol.CHANNELS_GROUPS):
+            self.strip.create_text(m + (g * 6 + 3) * cell, self.STRIP - 6, text=grp, font=('TkDefaultFont', 7))
+        self.strip.create_text(m - 4, (self.STRIP - 12) / 2, text=f"{HEAT_SECONDS}s", anchor='e', font=('TkDefaultFont', 7))
+
+    def y(self, rate):
+        log = min(max(math.log10(max(rate, 10 ** self.LOG_MIN)), self.LOG_MIN), self.LOG_MAX)
+        return self.HEIGHT - 20 - (log - self.LOG_MIN) / (self.LOG_MAX - self.LOG_MIN) * (self.HEIGHT - 30)
+
+    # blue (low) .. red (high) on the log scale
+    def color(self, rate):
+        f = (math.log10(max(rate, 10 ** self.LOG_MIN)) - self.LOG_MIN) / (self.LOG_MAX - self.LOG_MIN)
+        f = min(max(f, 0.0), 1.0)
+        return f"#{int(255 * f):02x}{int(255 * (1 - abs(2 * f - 1))):02x}{int(255 * (1 - f)):02x}"
+
+    def refresh(self):
+        try:
+            self.redraw()
+        finally:
+            self.after(MONITOR_REFRESH_MS, self.refresh)
+
+    def redraw(self):
+        seconds = dict(MONITOR_WINDOWS)[self.window.get()]
+        timestamps, rates = self.rates.decimated(seconds, MONITOR_POINTS)
+        if not len(timestamps):
+            return
+        m, end = self.MARGIN, int(timestamps[-1])
+        x = lambda t: m + (1 - (end - t) / seconds) * (self.WIDTH - 10 - m)
+        groups = rates.reshape(len(rates), len(protocol.CHANNELS_GROUPS), -1).mean(axis=2)
+        for g, line in enumerate(self.lines):
+            coords = [c for t, rate in zip(timestamps, groups[:, g]) for c in (x(t), self.y(rate))]
+            if len(coords) == 2:
+                coords = coords * 2
+            self.plot.coords(line, *coords)
+            self.plot.itemconfig(line, state='normal')
+        last = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=end)
+        self.plot.itemconfig(self.start_label, text=f"-{self.window.get()}")
+        self.plot.itemconfig(self.end_label, text=last.strftime("%d/%m %H:%M:%S"))
+        recent = self.rates.recent_rates(HEAT_SECONDS)
+        for cell, rate in zip(self.cells, recent):
+            self.strip.itemconfig(cell, fill=self.color(rate))
+        self.info.config(text=f"last {last:%H:%M:%S}, total {recent.sum():.0f} cps, {self.rates.size} s buffered")
+
+# Status word of one board: one indicator per bit (red: alarm state, green: acquisition on) and
+# the latest status events, read from the board's StatusMonitor
+class AlarmPanel(ttk.LabelFrame):
+
+    def __init__(self, master, status):
+        super().__init__(master, text="Board Status", padding=10)
+        self.status = status
+        self.shown = None
+        self.indicators = {}
+        for col, (bit, name) in enumerate(protocol.STATUS_BITS.items()):
+            label = tk.Label(self, text=name, relief='groove', padx=6, pady=2, bg='#d9d9d9')
+            label.grid(row=0, column=col, sticky='ew', padx=2)
+            self.grid_columnconfigure(col, weight=1)
+            self.indicators[bit] = label
+        self.events = tk.Listbox(self, height=ALARM_ROWS, font=('TkFixedFont', 9), activestyle='none')
+        self.events.grid(row=1, column=0, columnspan=len(self.indicators), sticky='ew', pady=(6, 0))
+        self.refresh()
+
+    def refresh(self):
+        try:
+            self.redraw()
+        finally:
+            self.after(ALARM_REFRESH_MS, self.refresh)
+
+    def redraw(self):
+        word = self.status.word
+        for bit, label in self.indicators.items():
+            if word is None:
+                color = '#d9d9d9'
+            elif bit == protocol.STATUS_ACQUISITION_ON:
+                color = '#7fd17f' if word & bit else ('#d9d9d9' if self.status.stop_expected else '#ff6b6b')
+            else:
+                color = '#ff6b6b' if word & bit else '#7fd17f'
+            label.config(bg=color)
+        events = self.status.recent(ALARM_ROWS)
+        key = (self.status.edges, word)
+        if key == self.shown:
+            return
+        self.shown = key
+        self.events.delete(0, 'end')
+        for i, event in enumerate(events):
+            self.events.insert('end', f"{event.time:%d/%m %H:%M:%S}  {event.text}")
+            self.events.itemconfig(i, fg='#c00000' if event.level == 'alarm' else 'black')
+
+
+def start_gui(serial_port, format_command, DAC_CHANNELS_ID, BOARD__MAGIC_ID, CTRL_FILE, rates=None, status=None):
     root = tk.Tk()
     root.title('TB - Cmd Interface')
     root.resizable(width=False, height=False)
@@ -305,6 +408,12 @@ def start_gui(serial_port, format_command, DAC_CHANNELS_ID, BOARD__MAGIC_ID, CTR
     help_frame.grid_columnconfigure(0, weight=1)
     help_frame.grid_columnconfigure(1, weight=1)
     ttk.Button(help_frame, text="Print Command Help", command=lambda: show_help(root)).grid(row=0, column=0, columnspan=2, pady=2)
+    # Live rates (rates: the board's RateRing, None when the monitor is disabled)
+    if rates is not None:
+        RateMonitor(root, rates).grid(row=1, column=2, rowspan=5, sticky='nsew', padx=(5, 10), pady=5)
+    # Status word and alarms (status: the board's StatusMonitor)
+    if status is not None:
+        AlarmPanel(root, status).grid(row=6, column=0, columnspan=3, sticky='ew', padx=10, pady=(0, 10))
     root.mainloop()
 
 if __name__ == "__main__":
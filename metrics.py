@@ -0,0 +1,183 @@
+import bisect
+import http.server
+import threading
+from collections import namedtuple
+
+# Runtime metrics of the acquisition process.
+# Counters and gauges are not updated on the hot path: the components already count what they do
+# (lines read, frames sent, commits, ...) and a collector registered by the engine reads those
+# counters only when the metrics are exported. Latencies go to Histograms, whose observe() is a
+# bisect on a dozen bucket bounds and two additions under a lock (about a microsecond).
+# Exported as Prometheus text (serve(), GET /metrics on localhost) and as a compact snapshot line
+# for the command log (snapshot()).
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'tetraball_'
+
+# kind: 'counter' or 'gauge'; labels: dict
+Sample = namedtuple('Sample', ['name', 'kind', 'help', 'labels', 'value'])
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{str(value)}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    # Upper bound of the bucket holding the q-th percentile (None when empty)
+    def percentile(self, q):
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        rank, seen = q / 100 * count, 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def exposition(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{self.name}_bucket{format_labels(dict(self.labels, le=le))} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels)} {total!r}")
+        lines.append(f"{self.name}_count{format_labels(self.labels)} {count}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._collectors = []
+
+    # Histogram for name and labels, created on first use (same name and labels: same histogram)
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        key = (PREFIX + name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(key[0], help, labels, buckets)
+            return histogram
+
+    # collector(): iterable of Sample, called at every export
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def samples(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            for sample in collector():
+                yield sample._replace(name=PREFIX + sample.name)
+
+    def histograms(self):
+        with self._lock:
+            return list(self._histograms.values())
+
+    # Prometheus text exposition format 0.0.4
+    def exposition(self):
+        lines, described = [], set()
+        for sample in sorted(self.samples(), key=lambda s: s.name):
+            if sample.name not in described:
+                described.add(sample.name)
+                lines.append(f"# HELP {sample.name} {sample.help}")
+                lines.append(f"# TYPE {sample.name} {sample.kind}")
+            lines.append(f"{sample.name}{format_labels(sample.labels)} {float(sample.value)!r}")
+        for histogram in sorted(self.histograms(), key=lambda h: h.name):
+            if histogram.name not in described:
+                described.add(histogram.name)
+                lines.append(f"# HELP {histogram.name} {histogram.help}")
+                lines.append(f"# TYPE {histogram.name} histogram")
+            lines.extend(histogram.exposition())
+        return "\n".join(lines) + "\n"
+
+    # One line: counters / gauges as name=value, histograms as name=p50/p99 (bucket bounds, ms);
+    # labels other than port and board are shown as name[value]. selected(labels): only the
+    # metrics it accepts (all when None)
+    def snapshot(self, selected=None):
+        selected = selected or (lambda labels: True)
+
+        def key(name, labels):
+            extra = [str(value) for label, value in sorted(labels.items()) if label not in ('port', 'board')]
+            return name[len(PREFIX):] + (f"[{','.join(extra)}]" if extra else "")
+        parts = [f"{key(s.name, s.labels)}={s.value:g}" for s in self.samples() if selected(s.labels)]
+        for histogram in self.histograms():
+            if selected(histogram.labels) and histogram.count:
+                p50, p99 = histogram.percentile(50), histogram.percentile(99)
+                parts.append(f"{key(histogram.name, histogram.labels)}={p50 * 1000:g}/{p99 * 1000:g}ms")
+        return " ".join(parts)
+
+
+REGISTRY = Registry()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve GET /metrics in a background thread; returns the server (shutdown() to stop it)
+def serve(port, host='127.0.0.1', registry=REGISTRY):
+    handler = type('MetricsHandler', (_Handler,), {'registry': registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# Calls write(registry) every period seconds until stop (threading.Event) is set
+def log_snapshots(period, write, stop, registry=REGISTRY):
+    def run():
+        while not stop.wait(period):
+            try:
+                write(registry)
+            except Exception as e:
+                print(f"[Metrics] snapshot failed: {e}")
+    threading.Thread(target=run, name="metrics-log", daemon=True).start()
+
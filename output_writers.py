@@ -0,0 +1,163 @@
+import datetime
+import os
+import threading
+import time
+
+import metrics
+
+# Persistent output writers for the daily received_data / command_log files.
+# Each sink keeps a single open handle and reopens only when the calendar day changes.
+# Lines are buffered in memory and committed (written + flushed, optionally fsync'ed)
+# according to a CommitPolicy, so durability can be traded against throughput explicitly.
+# Commit durations go to the writer_commit_seconds histogram.
+# on_rollover(path) is called with the previous day's file once it is closed (e.g. to compress it).
+
+LINE_END = os.linesep.encode('ascii')   # same line endings the text mode files had
+ENCODING = 'utf-8'
+
+
+class CommitPolicy:
+    # every_lines: commit when this many lines are pending (1 = commit on every line)
+    # every_ms:    commit pending lines at least this often (None = only on line count)
+    # fsync:       force the data to disk on every commit, not only to the OS cache
+    def __init__(self, every_lines=1, every_ms=None, fsync=False):
+        if every_lines < 1:
+            raise ValueError("every_lines must be >= 1")
+        if every_ms is not None and every_ms <= 0:
+            raise ValueError("every_ms must be > 0")
+        self.every_lines = every_lines
+        self.every_ms = every_ms
+        self.fsync = fsync
+
+    def __repr__(self):
+        return f"CommitPolicy(every_lines={self.every_lines}, every_ms={self.every_ms}, fsync={self.fsync})"
+
+
+# Ready made policies
+COMMIT_EVERY_LINE = CommitPolicy(every_lines=1)
+COMMIT_DURABLE = CommitPolicy(every_lines=1, fsync=True)
+COMMIT_BATCHED = CommitPolicy(every_lines=100, every_ms=2000)
+
+
+class DailyFileWriter:
+
+    def __init__(self, directory, prefix, policy=COMMIT_EVERY_LINE, ext='.txt', on_rollover=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.ext = ext
+        self.policy = policy
+        self.on_rollover = on_rollover
+        self._lock = threading.Lock()
+        self._handle = None
+        self._day = None
+        self._path = None
+        self._pending = []
+        self._offset = 0
+        self._last_commit = time.monotonic()
+        self._timer = None
+        self._closed = False
+        self.lines_written = 0
+        self.bytes_written = 0
+        self.commits = 0
+        self.commit_time = metrics.REGISTRY.histogram('writer_commit_seconds', "Write + flush of pending lines",
+                                                      file=prefix + ext)
+        if policy.every_ms is not None:
+            self._start_timer()
+
+    # Path of the file for a given day, e.g. received_data_18_05_2025.txt
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{self.prefix}_{day.strftime('%d_%m_%Y')}{self.ext}")
+
+    @property
+    def path(self):
+        with self._lock:
+            return self._path if self._path is not None else self.path_for(datetime.date.today())
+
+    # Both write methods return the byte offset of the data in the current file
+    def write_line(self, text, when=None):
+        return self.write_bytes(text.encode(ENCODING) + LINE_END, when)
+
+    def write_bytes(self, data, when=None):
+        day = when.date() if when is not None else datetime.date.today()
+        with self._lock:
+            if day != self._day:
+                self._rollover(day)
+            offset = self._offset
+            self._offset += len(data)
+            self._pending.append(data)
+            if len(self._pending) >= self.policy.every_lines:
+                self._commit()
+            return offset
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self._closed = True
+        if self._timer is not None:
+            self._timer.join(1)
+        with self._lock:
+            self._commit()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    def stats(self):
+        return {
+            'path': self._path,
+            'lines': self.lines_written,
+            'bytes': self.bytes_written,
+            'commits': self.commits,
+            'pending': len(self._pending),
+        }
+
+    # must be called with the lock held
+    def _commit(self):
+        if not self._pending:
+            return
+        t0 = time.perf_counter()
+        data = b''.join(self._pending)
+        self._handle.write(data)
+        self._handle.flush()
+        if self.policy.fsync:
+            os.fsync(self._handle.fileno())
+        self.commit_time.observe(time.perf_counter() - t0)
+        self.lines_written += len(self._pending)
+        self.bytes_written += len(data)
+        self.commits += 1
+        self._pending.clear()
+        self._last_commit = time.monotonic()
+
+    # must be called with the lock held
+    def _rollover(self, day):
+        if self._handle is not None:
+            # pending lines belong to the previous day
+            self._commit()
+            self._handle.close()
+            if self.on_rollover is not None and day != self._day:
+                self.on_rollover(self._path)
+        os.makedirs(self.directory, exist_ok=True)
+        self._day = day
+        self._path = self.path_for(day)
+        self._handle = self._open(self._path)
+        self._offset = self._handle.tell()
+
+    # Hook for subclasses that need to prepare a freshly opened file (e.g. write a header)
+    def _open(self, path):
+        return open(path, 'ab')
+
+    # Background commit for the time based policy
+    def _start_timer(self):
+        interval = self.policy.every_ms / 1000
+
+        def run():
+            while not self._closed:
+                time.sleep(min(interval, 0.5))
+                if time.monotonic() - self._last_commit >= interval:
+                    with self._lock:
+                        if self._handle is not None:
+                            self._commit()
+
+        self._timer = threading.Thread(target=run, name=f"commit-{self.prefix}", daemon=True)
+        self._timer.start()
@@ -0,0 +1,168 @@
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# On-demand profiling of the running acquisition (commands "profile" and "memtrace" at the prompt).
+# SamplingProfiler: a background thread takes the stack of every other thread each INTERVAL seconds
+# (sys._current_frames), so the reader, router, trigger, writer and GUI threads are all covered and
+# nothing has to be restarted under a profiler. Samples are wall clock: a thread blocked on the
+# serial port or on a queue shows up in the function it is waiting in.
+# MemoryTracer: tracemalloc, compared with the snapshot taken at start to show what grew.
+# Reports are written next to the logs as profile_DD_MM_YYYY_HHMMSS.txt (+ .folded, one line per
+# stack "thread;outer;...;inner count", for flamegraph.pl / speedscope) and memtrace_DD_MM_YYYY_HHMMSS.txt.
+
+DEFAULT_INTERVAL = 0.01         # s between samples
+DEFAULT_FRAMES = 10             # frames kept per allocation traceback
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 30
+
+
+def report_path(directory, kind, ext='.txt'):
+    return os.path.join(directory, f"{kind}_{datetime.datetime.now().strftime('%d_%m_%Y_%H%M%S')}{ext}")
+
+
+def frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset()
+
+    def _reset(self):
+        self.stacks = collections.Counter()         # (thread name, stack outer -> inner) -> samples
+        self.lines = collections.Counter()          # innermost "file:function:line" -> samples
+        self.samples = 0
+        self.started = time.time()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return False
+        self.interval = interval or self.interval
+        with self._lock:
+            self._reset()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    self.lines[f"{frame_name(frame.f_code)}:{frame.f_lineno}"] += 1
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_name(frame.f_code))
+                        frame = frame.f_back
+                    self.stacks[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+                self.samples += 1
+            del frames
+
+    def report(self):
+        with self._lock:
+            stacks, lines, samples = dict(self.stacks), dict(self.lines), self.samples
+        elapsed = time.time() - self.started
+        threads = collections.Counter()
+        inclusive = collections.Counter()
+        for (thread, stack), n in stacks.items():
+            threads[thread] += n
+            for name in set(stack):
+                inclusive[name] += n
+        # percentages are of all the thread samples (a thread always busy in one line: 100% / threads)
+        total = max(sum(threads.values()), 1)
+        out = [f"Sampling profile: {samples} samples of {len(threads)} threads every {self.interval * 1000:g} ms over {elapsed:.1f} s",
+               "", "Samples per thread:"]
+        out += [f"    {n:8d}  {thread}" for thread, n in threads.most_common()]
+        out += ["", f"Top {TOP_FUNCTIONS} lines (innermost frame):"]
+        out += [f"    {n:8d}  {n / total:6.1%}  {line}" for line, n in collections.Counter(lines).most_common(TOP_FUNCTIONS)]
+        out += ["", f"Top {TOP_FUNCTIONS} functions (anywhere on the stack):"]
+        out += [f"    {n:8d}  {n / total:6.1%}  {name}" for name, n in inclusive.most_common(TOP_FUNCTIONS)]
+        return "\n".join(out) + "\n"
+
+    def folded(self):
+        with self._lock:
+            stacks = dict(self.stacks)
+        return [f"{thread.replace(' ', '_')};{';'.join(stack)} {n}\n" for (thread, stack), n in sorted(stacks.items())]
+
+    # Write the report and the folded stacks; returns the report path
+    def dump(self, directory):
+        path = report_path(directory, 'profile')
+        with open(path, 'w') as f:
+            f.write(self.report())
+        with open(os.path.splitext(path)[0] + '.folded', 'w') as f:
+            f.writelines(self.folded())
+        return path
+
+
+class MemoryTracer:
+
+    def __init__(self):
+        self.baseline = None
+        self.started = None
+
+    @property
+    def running(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=DEFAULT_FRAMES):
+        if self.running:
+            return False
+        tracemalloc.start(frames)
+        self.baseline = self._snapshot()
+        self.started = time.time()
+        return True
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+    def report(self):
+        snapshot = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        out = [f"Memory trace: {time.time() - self.started:.1f} s, traced {current / 2**20:.2f} MiB now, {peak / 2**20:.2f} MiB peak",
+               "", f"Top {TOP_ALLOCATIONS} growths since start (by line):"]
+        out += [f"    {stat}" for stat in snapshot.compare_to(self.baseline, 'lineno')[:TOP_ALLOCATIONS]]
+        out += ["", "Largest allocation sites (by traceback):"]
+        for stat in snapshot.statistics('traceback')[:5]:
+            out.append(f"    {stat.count} blocks, {stat.size / 1024:.1f} KiB")
+            out += [f"        {line}" for line in stat.traceback.format()]
+        return "\n".join(out) + "\n"
+
+    def dump(self, directory):
+        path = report_path(directory, 'memtrace')
+        with open(path, 'w') as f:
+            f.write(self.report())
+        return path
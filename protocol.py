@@ -0,0 +1,225 @@
+import collections
+import datetime
+import functools
+
+# TetraBall board protocol, shared by the acquisition (Digitech_Bril_Com), its GUI and the threshold scan.
+# Frame: '\n' + [board ID + 33] + opcode ('a'..'r') + payload + '\n'
+# Frames without payload are built once per board ID at import; frames with a payload are cached,
+# so the periodic trigger and the scan loops reuse the same bytes objects.
+# Payload encoders validate their input and raise ValueError; decode_frame() inverts them.
+
+BOARD_ID_OFFSET = 33
+BOARD_MAGIC_ID = 67             # answered by any board, whatever its ID
+MAX_BOARD_ID = 63               # board IDs 0..63 (manual)
+CMD_TERMINATOR = b'\n'
+
+CHANNELS_GROUPS = 'abcdefgh'
+DAC_MAX_MV = 3000               # DAC reference voltage
+VOLTAGE_MAX_MV = 99999          # 5 digits, mV
+TEMPERATURE_MAX_CC = 9999       # sign + 4 digits, hundredths of degree
+
+OPCODES = {
+    'getstatus':   b'a',
+    'getdata':     b'b',
+    'setdate':     b'c',
+    'settime':     b'd',
+    'getdatetime': b'e',
+    'getdac':      b'f',
+    'setdac':      b'g',
+    'gettemp':     b'h',
+    'reset':       b'i',
+    'setid':       b'j',
+    'getid':       b'k',
+    'setoverv':    b'l',
+    'setundv':     b'm',
+    'setovert':    b'n',
+    'setundt':     b'o',
+    'getconf':     b'p',
+    'start':       b'q',
+    'stop':        b'r',
+}
+COMMANDS = {opcode[0]: cmd for cmd, opcode in OPCODES.items()}
+PAYLOAD_COMMANDS = {'setdate', 'settime', 'setdac', 'setid', 'setoverv', 'setundv', 'setovert', 'setundt'}
+
+# Command line usage of the commands taking arguments (values in V and degrees C)
+USAGE = {
+    'setdac':   "setdac a 1.3",
+    'setid':    "setid 23",
+    'setoverv': "setoverv 16.5",
+    'setundv':  "setundv 10.5",
+    'setovert': "setovert 50.5",
+    'setundt':  "setundt -5.5",
+}
+
+# Replies
+# Status word (last field of the data lines, '>Status: N' reply)
+STATUS_SD_ERROR = 1
+STATUS_UNDER_TEMP = 2
+STATUS_OVER_TEMP = 4
+STATUS_UNDER_VOLT = 8
+STATUS_OVER_VOLT = 16
+STATUS_SD_FILE_LIMIT = 32
+STATUS_ACQUISITION_ON = 64      # status word bit: counting is running
+STATUS_BITS = {
+    STATUS_SD_ERROR:        "SD error",
+    STATUS_UNDER_TEMP:      "under temperature",
+    STATUS_OVER_TEMP:       "over temperature",
+    STATUS_UNDER_VOLT:      "under voltage",
+    STATUS_OVER_VOLT:       "over voltage",
+    STATUS_SD_FILE_LIMIT:   "SD file limit",
+    STATUS_ACQUISITION_ON:  "acquisition on",
+}
+STATUS_FAULTS = STATUS_SD_ERROR | STATUS_UNDER_TEMP | STATUS_OVER_TEMP | STATUS_UNDER_VOLT | STATUS_OVER_VOLT | STATUS_SD_FILE_LIMIT
+DATA_DEACTIVATED_REPLY = ">Data req with Count Deactivated!"
+
+Frame = collections.namedtuple('Frame', ['board_id', 'command', 'value'])
+
+
+def valid_board_id(board_id):
+    return 0 <= board_id <= MAX_BOARD_ID or board_id == BOARD_MAGIC_ID
+
+
+def _check_board_id(board_id):
+    if not isinstance(board_id, int) or not valid_board_id(board_id):
+        raise ValueError(f"Invalid board ID {board_id} (0..{MAX_BOARD_ID} or {BOARD_MAGIC_ID})")
+
+
+def _build(board_id, opcode, payload=b''):
+    return CMD_TERMINATOR + bytes([board_id + BOARD_ID_OFFSET]) + opcode + payload + CMD_TERMINATOR
+
+
+FIXED_FRAMES = {
+    board_id: {cmd: _build(board_id, opcode) for cmd, opcode in OPCODES.items() if cmd not in PAYLOAD_COMMANDS}
+    for board_id in list(range(MAX_BOARD_ID + 1)) + [BOARD_MAGIC_ID]
+}
+
+
+# Frame of cmd (case insensitive) for board_id; payload is the encoded payload (bytes, '' or 0 for none)
+def frame(board_id, cmd, payload=b''):
+    if not payload:
+        cached = FIXED_FRAMES.get(board_id, {}).get(cmd)
+        if cached is not None:
+            return cached
+    return _frame(board_id, cmd.lower(), bytes(payload) if payload else b'')
+
+
+@functools.lru_cache(maxsize=4096)
+def _frame(board_id, cmd, payload):
+    _check_board_id(board_id)
+    opcode = OPCODES.get(cmd)
+    if opcode is None:
+        raise ValueError(f"Unknown command {cmd}")
+    if (cmd in PAYLOAD_COMMANDS) != bool(payload):
+        raise ValueError(f"{cmd}: payload {'missing' if cmd in PAYLOAD_COMMANDS else 'not expected'}")
+    if CMD_TERMINATOR in payload:
+        raise ValueError(f"{cmd}: payload contains the frame terminator")
+    return _build(board_id, opcode, payload)
+
+
+# ---- payload encoders ----
+
+def encode_date(when):
+    return when.strftime("%d%m%Y").encode('ascii')
+
+
+def encode_time(when):
+    return when.strftime("%H%M%S").encode('ascii')
+
+
+def encode_dac(group, mv):
+    group = str(group).lower()
+    if len(group) != 1 or group not in CHANNELS_GROUPS:
+        raise ValueError(f"Invalid DAC channel {group} (a..h)")
+    if not 0 <= mv <= DAC_MAX_MV:
+        raise ValueError(f"DAC threshold {mv} mV out of range (0..{DAC_MAX_MV} mV)")
+    return f"{group}{int(mv):04d}".encode('ascii')
+
+
+# setid: 0..63, or the magic ID as the baseline allowed
+def encode_board_id(new_id):
+    _check_board_id(new_id)
+    return bytes([new_id + BOARD_ID_OFFSET])
+
+
+# setoverv / setundv: mV on 5 digits
+def encode_voltage(mv):
+    if not 0 <= mv <= VOLTAGE_MAX_MV:
+        raise ValueError(f"Voltage threshold {mv} mV out of range (0..{VOLTAGE_MAX_MV} mV)")
+    return f"{int(mv):05d}".encode('ascii')
+
+
+# setovert / setundt: sign + hundredths of degree on 4 digits
+def encode_temperature(centidegrees):
+    if abs(centidegrees) > TEMPERATURE_MAX_CC:
+        raise ValueError(f"Temperature threshold {centidegrees / 100} C out of range (+-{TEMPERATURE_MAX_CC / 100} C)")
+    return f"{'-' if centidegrees < 0 else '+'}{abs(int(centidegrees)):04d}".encode('ascii')
+
+
+# Payload of cmd from the user arguments (strings; thresholds in V and degrees C)
+def payload_from_args(cmd, args, now=None):
+    cmd = cmd.lower()
+    if cmd not in PAYLOAD_COMMANDS:
+        return b''
+    if cmd in ('setdate', 'settime'):
+        now = now or datetime.datetime.now()
+        return encode_date(now) if cmd == 'setdate' else encode_time(now)
+    if not args or (cmd == 'setdac' and len(args) < 2):
+        raise ValueError("missing argument")
+    if cmd == 'setdac':
+        return encode_dac(args[0], round(float(args[1]) * 1000))
+    if cmd == 'setid':
+        return encode_board_id(int(args[0]))
+    if cmd in ('setoverv', 'setundv'):
+        return encode_voltage(round(float(args[0]) * 1000))
+    return encode_temperature(round(float(args[0]) * 100))
+
+
+# ---- decoder ----
+
+def decode_payload(cmd, payload):
+    text = payload.decode('ascii')
+    if cmd == 'setdate':
+        return datetime.datetime.strptime(text, "%d%m%Y").date()
+    if cmd == 'settime':
+        return datetime.datetime.strptime(text, "%H%M%S").time()
+    if cmd == 'setdac':
+        return text[0], int(text[1:])
+    if cmd == 'setid':
+        return payload[0] - BOARD_ID_OFFSET
+    if cmd in ('setoverv', 'setundv', 'setovert', 'setundt'):
+        return int(text)
+    return None
+
+
+# Frame (with or without terminators) -> Frame(board_id, command, decoded payload)
+def decode_frame(data):
+    data = bytes(data).strip(CMD_TERMINATOR)
+    if len(data) < 2:
+        raise ValueError(f"Frame too short: {data!r}")
+    cmd = COMMANDS.get(data[1])
+    if cmd is None:
+        raise ValueError(f"Unknown opcode {chr(data[1])!r}")
+    return Frame(data[0] - BOARD_ID_OFFSET, cmd, decode_payload(cmd, data[2:]))
+
+
+# '>Status: N' -> N (None for any other line)
+def status_from_reply(line):
+    if not line.startswith('>Status:'):
+        return None
+    try:
+        return int(line[8:])
+    except ValueError:
+        return None
+
+
+# 'SD error, acquisition on' (names of the bits set), 'none' for 0
+def describe_status(word):
+    return ", ".join(name for bit, name in STATUS_BITS.items() if word & bit) or "none"
+
+
+# Status word of a data line (last field), None if it is not a data line
+def status_from_data_line(line):
+    try:
+        return int(line.rsplit('\t', 1)[1])
+    except (IndexError, ValueError):
+        return None
@@ -0,0 +1,63 @@
+import threading
+
+from data_parser import N_CHANNELS
+
+# In-memory ring buffer of the latest data records of one board, for the live rate monitor.
+# Fixed size numpy arrays (one row per data line, i.e. per second of board time): appending
+# overwrites the oldest row, so memory and redraw cost do not grow with the uptime.
+# Filled by the acquisition (BoardSession.handle_line) from the port routing thread and read by the
+# GUI, which never has to go back to the serial port or to the files to redraw.
+# numpy is only needed when the monitor is enabled.
+
+DEFAULT_HOURS = 6
+
+
+class RateRing:
+
+    def __init__(self, seconds=DEFAULT_HOURS * 3600, channels=N_CHANNELS):
+        import numpy as np
+        self.np = np
+        self.capacity = int(seconds)
+        self.timestamps = np.zeros(self.capacity, dtype=np.int64)
+        self.counts = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.status = np.zeros(self.capacity, dtype=np.uint8)
+        self.head = 0                   # next row to write
+        self.size = 0
+        self.appended = 0               # records seen since the start
+        self.lock = threading.Lock()
+
+    # record: data_parser.DataRecord
+    def append(self, record):
+        with self.lock:
+            self.timestamps[self.head] = record.timestamp
+            self.counts[self.head] = record.counts
+            self.status[self.head] = record.status
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.appended += 1
+
+    # Copies of the last `rows` rows (all when None), oldest first
+    def latest(self, rows=None):
+        np = self.np
+        with self.lock:
+            n = self.size if rows is None else min(rows, self.size)
+            index = (self.head - n + np.arange(n)) % self.capacity
+            return self.timestamps[index], self.counts[index], self.status[index]
+
+    # Mean rate (counts/s) of every channel over the last `seconds` rows, in at most `points` bins:
+    # (bin end timestamps (k,), rates (k, channels)); the work depends on the window, not the uptime
+    def decimated(self, seconds, points):
+        np = self.np
+        timestamps, counts, _ = self.latest(seconds)
+        width = max(1, -(-min(seconds, self.capacity) // points))
+        k = len(timestamps) // width
+        if k == 0:
+            return timestamps[:0], counts[:0]
+        first = len(timestamps) - k * width
+        rates = counts[first:].reshape(k, width, -1).mean(axis=1)
+        return timestamps[first + width - 1::width], rates
+
+    # Mean rate of every channel over the last `seconds` rows (None when empty)
+    def recent_rates(self, seconds):
+        _, counts, _ = self.latest(seconds)
+        return counts.mean(axis=0) if len(counts) else None
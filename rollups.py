@@ -0,0 +1,229 @@
+import datetime
+import os
+import struct
+import sys
+import threading
+from collections import namedtuple
+
+from data_parser import parse_data_bytes, N_CHANNELS
+from time_index import to_timestamp
+from compressed_files import open_file, resolve, glob_files, strip_compression
+
+# Minute and hour roll-ups of the daily received_data files.
+# received_data_DD_MM_YYYY.r1m / .r1h hold one fixed size entry per window of board time:
+#   int64 window start (seconds since 1970) | uint32 records | uint8 OR of the status words | 3 pad
+#   | 48 x uint64 sum | 48 x uint32 min | 48 x uint32 max | 48 x float64 sum of squares
+# Mean and variance are derived from the sums, so entries can be merged: a window split over two
+# files (midnight, restart) is simply written twice and merged by the readers.
+# The acquisition updates them while the data lines are appended (RollupWriter); rebuild_rollups()
+# recomputes them from an existing data file, and query_rollups() reads the roll-ups.
+# The window being filled is only written when the next one starts, so a crash loses the open
+# windows: when a roll-up file is older than its data file, the query counts the records of the data
+# file and, if they differ, uses roll-ups recomputed from it (and rewrites the file once the day is over).
+
+RESOLUTIONS = {60: '.r1m', 3600: '.r1h'}        # window (s) -> file extension
+ENTRY_STRUCT = struct.Struct(f'<qIB3x{N_CHANNELS}Q{N_CHANNELS}I{N_CHANNELS}I{N_CHANNELS}d')
+
+Rollup = namedtuple('Rollup', ['start', 'records', 'status', 'sum', 'mean', 'min', 'max', 'variance', 'channels'])
+
+
+def rollup_path_for(data_path, resolution):
+    return os.path.splitext(strip_compression(data_path))[0] + RESOLUTIONS[resolution]
+
+
+# numpy dtype matching ENTRY_STRUCT (numpy is only needed to rebuild and read the roll-ups)
+def entry_dtype():
+    import numpy as np
+    return np.dtype([('start', '<i8'), ('records', '<u4'), ('status', 'u1'), ('pad', 'u1', (3,)),
+                     ('sum', '<u8', (N_CHANNELS,)), ('min', '<u4', (N_CHANNELS,)), ('max', '<u4', (N_CHANNELS,)),
+                     ('sumsq', '<f8', (N_CHANNELS,))])
+
+
+# Running aggregate of one window
+class _Window:
+
+    def __init__(self, start, record):
+        counts = record.counts
+        self.start = start
+        self.records = 1
+        self.status = record.status
+        self.sum = list(counts)
+        self.min = list(counts)
+        self.max = list(counts)
+        self.sumsq = [float(c) * c for c in counts]
+
+    def add(self, record):
+        self.records += 1
+        self.status |= record.status
+        for ch, c in enumerate(record.counts):
+            self.sum[ch] += c
+            self.sumsq[ch] += float(c) * c
+            if c < self.min[ch]:
+                self.min[ch] = c
+            elif c > self.max[ch]:
+                self.max[ch] = c
+
+    def pack(self):
+        return ENTRY_STRUCT.pack(self.start, self.records, self.status, *self.sum, *self.min, *self.max, *self.sumsq)
+
+
+# Incremental roll-ups used by the acquisition writer: call observe() for every data line with the
+# data file path and the parsed record. A window is written when a record of a later window
+# arrives, the data file changes or the writer is closed.
+class RollupWriter:
+
+    def __init__(self, resolutions=tuple(RESOLUTIONS)):
+        self._lock = threading.Lock()
+        self.resolutions = resolutions
+        self._path = None
+        self._windows = {}
+
+    def observe(self, data_path, record):
+        with self._lock:
+            if data_path != self._path:
+                self._flush_all()
+                self._path = data_path
+            for resolution in self.resolutions:
+                start = record.timestamp - record.timestamp % resolution
+                window = self._windows.get(resolution)
+                if window is not None and window.start == start:
+                    window.add(record)
+                    continue
+                if window is not None:
+                    self._flush(resolution, window)
+                self._windows[resolution] = _Window(start, record)
+
+    def close(self):
+        with self._lock:
+            self._flush_all()
+            self._path = None
+
+    def _flush_all(self):
+        for resolution, window in self._windows.items():
+            self._flush(resolution, window)
+        self._windows = {}
+
+    def _flush(self, resolution, window):
+        with open(rollup_path_for(self._path, resolution), 'ab') as f:
+            f.write(window.pack())
+
+
+# Entries (numpy structured array, entry_dtype) of the records of arrays (data_parser.DataArrays)
+def aggregate(timestamps, counts, status, resolution):
+    import numpy as np
+    entries = np.zeros(0, dtype=entry_dtype())
+    if not len(timestamps):
+        return entries
+    windows = timestamps - timestamps % resolution
+    order = np.argsort(windows, kind='stable')
+    windows, counts, status = windows[order], counts[:, order], status[order]
+    starts, first = np.unique(windows, return_index=True)
+    entries = np.zeros(len(starts), dtype=entry_dtype())
+    entries['start'] = starts
+    entries['records'] = np.diff(np.append(first, len(windows)))
+    entries['status'] = np.bitwise_or.reduceat(status, first)
+    entries['sum'] = np.add.reduceat(counts.astype(np.uint64), first, axis=1).T
+    entries['min'] = np.minimum.reduceat(counts, first, axis=1).T
+    entries['max'] = np.maximum.reduceat(counts, first, axis=1).T
+    entries['sumsq'] = np.add.reduceat(counts.astype(np.float64) ** 2, first, axis=1).T
+    return entries
+
+
+# Merge the entries of the same window (sorted by start)
+def merge(entries):
+    import numpy as np
+    if not len(entries):
+        return entries
+    entries = entries[np.argsort(entries['start'], kind='stable')]
+    starts, first = np.unique(entries['start'], return_index=True)
+    if len(starts) == len(entries):
+        return entries
+    merged = np.zeros(len(starts), dtype=entry_dtype())
+    merged['start'] = starts
+    merged['records'] = np.add.reduceat(entries['records'], first)
+    merged['status'] = np.bitwise_or.reduceat(entries['status'], first)
+    for field, ufunc in (('sum', np.add), ('min', np.minimum), ('max', np.maximum), ('sumsq', np.add)):
+        merged[field] = ufunc.reduceat(entries[field], first, axis=0)
+    return merged
+
+
+# Rebuild the roll-ups of an existing data file in one pass
+def rebuild_rollups(data_path, resolutions=tuple(RESOLUTIONS)):
+    with open_file(data_path, 'rb') as f:
+        arrays = parse_data_bytes(f.read())
+    written = 0
+    for resolution in resolutions:
+        entries = aggregate(arrays.timestamps, arrays.counts, arrays.status, resolution)
+        with open(rollup_path_for(data_path, resolution), 'wb') as f:
+            f.write(entries.tobytes())
+        written += len(entries)
+    return written
+
+
+def rebuild_all(directory, prefix='received_data'):
+    total = 0
+    for data_path in glob_files(os.path.join(directory, f"{prefix}_*.txt")):
+        total += rebuild_rollups(data_path)
+    return total
+
+
+def load_rollups(data_path, resolution):
+    import numpy as np
+    path = rollup_path_for(data_path, resolution)
+    # a trailing partial entry (interrupted write) is ignored
+    return np.fromfile(path, dtype=entry_dtype(), count=os.path.getsize(path) // ENTRY_STRUCT.size)
+
+
+# Entries of one data file at the given resolution, repaired when the roll-up file misses records
+# (roll-up older than the data file and record counts differ). The file of the current day is still
+# being written by the acquisition: it is recomputed in memory only.
+def checked_rollups(data_path, resolution):
+    path = rollup_path_for(data_path, resolution)
+    entries = None
+    if os.path.exists(path):
+        entries = load_rollups(data_path, resolution)
+        if os.path.getmtime(path) >= os.path.getmtime(data_path):
+            return entries
+    with open_file(data_path, 'rb') as f:
+        arrays = parse_data_bytes(f.read())
+    if entries is not None and int(entries['records'].sum()) == len(arrays.timestamps):
+        return entries
+    fresh = aggregate(arrays.timestamps, arrays.counts, arrays.status, resolution)
+    today = datetime.date.today().strftime('%d_%m_%Y') + '.txt'
+    if data_path != strip_compression(data_path) or not data_path.endswith(today):
+        with open(path, 'wb') as f:
+            f.write(fresh.tobytes())
+    return fresh
+
+
+# Windows starting between start and stop (datetimes, board time) at the given resolution (s), for
+# the given 1-based channels; the roll-up files are read (see checked_rollups for the repairs).
+# Returns Rollup(start (K,), records (K,), status (K,), sum/mean/min/max/variance [len(channels), K], channels).
+def query_rollups(directory, start, stop, resolution=3600, channels=None, prefix='received_data'):
+    import numpy as np
+    channels = list(channels) if channels else list(range(1, N_CHANNELS + 1))
+    t0, t1 = to_timestamp(start), to_timestamp(stop)
+    parts = []
+    day = start.date()
+    while day <= stop.date() + datetime.timedelta(days=1):
+        data_path = resolve(os.path.join(directory, f"{prefix}_{day.strftime('%d_%m_%Y')}.txt"))
+        day += datetime.timedelta(days=1)
+        if data_path is None:
+            continue
+        parts.append(checked_rollups(data_path, resolution))
+    entries = merge(np.concatenate(parts)) if parts else np.zeros(0, dtype=entry_dtype())
+    entries = entries[(entries['start'] >= t0 - t0 % resolution) & (entries['start'] <= t1)]
+    rows = [c - 1 for c in channels]
+    records = entries['records'].astype(np.float64)
+    sums = entries['sum'][:, rows].T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / records
+        variance = np.maximum(entries['sumsq'][:, rows].T / records - mean ** 2, 0.0)
+    return Rollup(entries['start'], entries['records'], entries['status'], sums, mean,
+                  entries['min'][:, rows].T, entries['max'][:, rows].T, variance, channels)
+
+
+if __name__ == '__main__':
+    # python rollups.py <directory>   -> rebuild the minute/hour roll-ups of all received_data files
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    print(f"{rebuild_all(directory)} roll-up entries written in {directory}")
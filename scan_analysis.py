@@ -0,0 +1,258 @@
+import argparse
+import concurrent.futures
+import glob
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import protocol
+from compressed_files import open_file
+
+# Analysis of the threshold scans written by scan_threshold.py (thrscan_*.csv), all 48 channels at once.
+# A scan is reduced to the mean rate (counts/s) of every channel at every threshold of the scan grid,
+# rates (48, n) over thresholds (n,) mV; plain, adaptive and interleaved scans all reduce to this
+# shape (each channel follows the THR_x column of its group, older files the THRESHOLD column).
+# On the smoothed log rate, for every channel:
+#   - slope:        -d ln(rate) / d mV (np.gradient, so adaptive grids are fine)
+#   - plateau:      the longest flat stretch (slope below PLATEAU_SLOPE, at least MIN_PLATEAU_RATE
+#                   counts/s), the higher one on a tie, and its mean rate. Counters saturated by the
+#                   noise at low thresholds are flat too: start the scan close to the noise edge.
+#   - knee:         start of the plateau: the noise is over
+#   - noise edge:   steepest fall of the noise below the knee
+# The setdac recommendation of a group is the highest knee of its 6 channels plus SETPOINT_MARGIN,
+# kept inside the plateau of every channel of the group.
+# Files that cannot be analysed (empty, header only, unreadable) are reported and skipped, the exit
+# status is then 1.
+#   python scan_analysis.py thrscan_*.csv [--jobs N] [--combine] [--output results.csv]
+
+N_CHANNELS = 48
+GROUP_SIZE = 6
+GROUPS = protocol.CHANNELS_GROUPS
+COUNTS_COLUMNS = slice(2, 2 + N_CHANNELS)
+
+SMOOTH_POINTS = 3               # moving average of the log rate (thresholds)
+RATE_FLOOR = 0.1                # counts/s added before the log, empty tails stay finite
+PLATEAU_SLOPE = 0.005           # 1/mV: |d ln(rate)/d mV| below this is flat (0.5% per mV)
+MIN_PLATEAU_RATE = 1.0          # counts/s; flat tails above the signal edge are not a plateau
+SETPOINT_MARGIN = 20            # mV above the knee
+
+ScanCurves = namedtuple('ScanCurves', ['thresholds', 'rates', 'rows'])
+ScanResult = namedtuple('ScanResult', ['path', 'thresholds', 'rates', 'slope', 'noise_edge', 'knee',
+                                       'plateau_start', 'plateau_end', 'plateau_rate', 'setpoints'])
+
+
+# Rows of one scan file: counts (rows, 48) and threshold of every channel (rows, 48) in mV.
+# ValueError for a file that is not a scan or has no rows (a scan stopped before its first step).
+def read_scan_file(path):
+    with open_file(path, 'r') as scan_file:
+        header = scan_file.readline().rstrip("\n").split("\t")
+        lines = [line for line in scan_file if line.strip()]
+    if header == [""]:
+        raise ValueError("empty file")
+    if "THR_A" in header:
+        columns = [header.index("THR_" + grp.upper()) for grp in GROUPS]
+    elif "THRESHOLD" in header:
+        columns = [header.index("THRESHOLD")] * len(GROUPS)
+    else:
+        raise ValueError("not a scan file (no threshold column)")
+    if not lines:
+        raise ValueError("no data rows")
+    usecols = list(range(COUNTS_COLUMNS.start, COUNTS_COLUMNS.stop)) + columns
+    table = np.loadtxt(lines, delimiter="\t", usecols=usecols, ndmin=2)
+    counts = table[:, :N_CHANNELS]
+    thresholds = np.rint(np.repeat(table[:, N_CHANNELS:] * 1000, GROUP_SIZE, axis=1)).astype(np.int64)
+    return counts, thresholds
+
+
+# One or many scan files of the same board -> ScanCurves(thresholds (n,), rates (48, n), rows (48, n)).
+# A threshold measured in several files is averaged over all of its rows; thresholds a channel
+# never saw have rate NaN.
+# With a skipped list the files that cannot be read are added there as (path, reason) instead of
+# raising, as long as one file is left.
+def load_scans(paths, skipped=None):
+    if isinstance(paths, str):
+        paths = [paths]
+    parts = []
+    for path in paths:
+        try:
+            parts.append(read_scan_file(path))
+        except Exception as ex:
+            if skipped is None:
+                raise
+            skipped.append((path, describe_error(ex)))
+    if not parts:
+        raise ValueError("no readable scan file")
+    counts = np.concatenate([part[0] for part in parts])
+    thresholds = np.concatenate([part[1] for part in parts])
+    grid = np.unique(thresholds)
+    index = np.searchsorted(grid, thresholds)
+    channel = np.broadcast_to(np.arange(N_CHANNELS), index.shape)
+    sums = np.zeros((N_CHANNELS, len(grid)))
+    rows = np.zeros((N_CHANNELS, len(grid)), dtype=np.int64)
+    np.add.at(sums, (channel, index), counts)
+    np.add.at(rows, (channel, index), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rates = sums / rows
+    return ScanCurves(grid, rates, rows)
+
+
+# Moving average along the thresholds, NaNs (missing points) ignored
+def smooth(values, points=SMOOTH_POINTS):
+    if points <= 1:
+        return values
+    valid = ~np.isnan(values)
+    pad = points // 2
+
+    # window sums of all the rows at once (cumulative sums, zero padded at both ends)
+    def window_sum(a):
+        c = np.cumsum(np.pad(a, ((0, 0), (pad + 1, points - pad - 1))), axis=1)
+        return c[:, points:] - c[:, :-points]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, window_sum(np.where(valid, values, 0.0)) / window_sum(valid.astype(float)), np.nan)
+
+
+# Index of the first True of every row, -1 when there is none
+def first_true(mask):
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+
+# Index of the last True of every row, -1 when there is none
+def last_true(mask):
+    return np.where(mask.any(axis=1), mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1), -1)
+
+
+# Value of thresholds at indexes, NaN where the index is -1
+def take(thresholds, indexes):
+    return np.where(indexes >= 0, thresholds[np.maximum(indexes, 0)], np.nan)
+
+
+def analyse(curves, path=None):
+    thresholds, rates = curves.thresholds, curves.rates
+    n = len(thresholds)
+    steps = np.arange(n)
+    log_rate = smooth(np.log(rates + RATE_FLOOR))
+    if n > 1:
+        slope = -np.gradient(log_rate, thresholds, axis=1)
+    else:
+        slope = np.full_like(log_rate, np.nan)
+    flat = (np.abs(slope) < PLATEAU_SLOPE) & (rates >= MIN_PLATEAU_RATE)
+
+    # flat runs are numbered by the count of steep points before them; keep the longest of each channel
+    runs = np.cumsum(~flat, axis=1)
+    lengths = np.zeros((N_CHANNELS, n + 1), dtype=np.int64)
+    np.add.at(lengths, (np.broadcast_to(np.arange(N_CHANNELS)[:, None], runs.shape), runs), flat)
+    longest = n - lengths[:, ::-1].argmax(axis=1)
+    plateau = flat & (runs == longest[:, None])
+    knee, plateau_end = first_true(plateau), last_true(plateau)
+    plateau_rate = np.where(knee >= 0, np.where(plateau, rates, 0.0).sum(axis=1) / np.maximum(plateau.sum(axis=1), 1), np.nan)
+    # noise edge: steepest fall below the knee (unknown when the scan starts on the plateau)
+    below_knee = np.where(steps[None, :] < knee[:, None], np.nan_to_num(slope, nan=-np.inf), -np.inf)
+    noise_edge = np.where(np.isfinite(below_knee.max(axis=1)) & (below_knee.max(axis=1) > PLATEAU_SLOPE),
+                          below_knee.argmax(axis=1), -1)
+
+    knee_mv, end_mv = take(thresholds, knee), take(thresholds, plateau_end)
+    return ScanResult(path, thresholds, rates, slope, take(thresholds, noise_edge), knee_mv,
+                      knee_mv, end_mv, plateau_rate, recommend(knee_mv, end_mv))
+
+
+# Setdac value (mV) of every group: highest knee + margin, within the plateau of all its channels;
+# None when a channel of the group has no plateau
+def recommend(knee_mv, end_mv, margin=SETPOINT_MARGIN):
+    setpoints = {}
+    for g, grp in enumerate(GROUPS):
+        knees = knee_mv[g * GROUP_SIZE:(g + 1) * GROUP_SIZE]
+        ends = end_mv[g * GROUP_SIZE:(g + 1) * GROUP_SIZE]
+        if np.isnan(knees).any():
+            setpoints[grp] = None
+            continue
+        setpoint = min(knees.max() + margin, ends.min())
+        setpoints[grp] = int(min(max(setpoint, 0), protocol.DAC_MAX_MV))
+    return setpoints
+
+
+# Command lines for the Digitech_Bril_Com prompt (thresholds in V)
+def setdac_commands(setpoints):
+    return [f"setdac {grp} {mv / 1000:.3f}" for grp, mv in setpoints.items() if mv is not None]
+
+
+def describe_error(ex):
+    return str(ex) or type(ex).__name__
+
+
+def analyse_file(path):
+    return analyse(load_scans(path), path)
+
+
+# analyse_file for the batch: (result, None), or (None, reason) when the file cannot be analysed,
+# so that one empty or broken file does not stop the others
+def try_analyse_file(path):
+    try:
+        return analyse_file(path), None
+    except Exception as ex:
+        return None, describe_error(ex)
+
+
+# Analyse many files, one scan per file, in a process pool (jobs None: one process per CPU)
+# -> (results, skipped), skipped: (path, reason) of the files that could not be analysed
+def analyse_files(paths, jobs=None):
+    if jobs == 1 or len(paths) < 2:
+        outcomes = [try_analyse_file(path) for path in paths]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            outcomes = list(pool.map(try_analyse_file, paths, chunksize=max(1, len(paths) // (4 * (jobs or os.cpu_count() or 1)))))
+    results = [result for result, _ in outcomes if result is not None]
+    skipped = [(path, reason) for path, (result, reason) in zip(paths, outcomes) if result is None]
+    return results, skipped
+
+
+def result_rows(result):
+    fmt = lambda v: "" if np.isnan(v) else f"{v:g}"
+    for ch in range(N_CHANNELS):
+        yield (f"{result.path}\tCH_{ch + 1:02d}\t{GROUPS[ch // GROUP_SIZE]}\t{fmt(result.noise_edge[ch])}\t{fmt(result.knee[ch])}"
+               f"\t{fmt(result.plateau_start[ch])}\t{fmt(result.plateau_end[ch])}\t{fmt(result.plateau_rate[ch])}\n")
+
+
+def write_results(results, output_path):
+    with open(output_path, "w") as output:
+        output.write("FILE\tCHANNEL\tGROUP\tNOISE_EDGE\tKNEE\tPLATEAU_START\tPLATEAU_END\tPLATEAU_RATE\n")
+        for result in results:
+            output.writelines(result_rows(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="S-curve analysis of threshold scans and setdac recommendation")
+    parser.add_argument('files', nargs='+', help="scan files (wildcards allowed)")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--combine', action='store_true', help="merge all the files into one scan (same board)")
+    parser.add_argument('--output', help="per channel results (tab separated)")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.files for path in (glob.glob(pattern) or [pattern])})
+    skipped = []
+    if args.combine:
+        try:
+            curves = load_scans(paths, skipped)
+            results = [analyse(curves, f"{len(paths) - len(skipped)} files")]
+        except ValueError:
+            results = []
+    else:
+        results, skipped = analyse_files(paths, args.jobs)
+    for path, reason in skipped:
+        print(f"{path}: skipped, {reason}", file=sys.stderr)
+    for result in results:
+        print(f"{result.path}: {len(result.thresholds)} thresholds")
+        for command in setdac_commands(result.setpoints) or ["no plateau found"]:
+            print("    " + command)
+        missing = [grp for grp, mv in result.setpoints.items() if mv is None]
+        if missing and len(missing) < len(GROUPS):
+            print(f"    no plateau for group(s) {', '.join(missing)}")
+    if args.output:
+        write_results(results, args.output)
+        print(f"Results written to {args.output}")
+    return 1 if skipped else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,11 +7,19 @@ import serial
 import serial.tools.list_ports
 
 import os
+import sys
 
 import threading
+import queue
 
 import time
 import datetime
+import math
+import collections
+import contextlib
+
+import protocol
+from compressed_files import open_file
 
 DEFAULT_OUTPUT_PATH = "C:\\Users\\TetraBall!\\OneDrive\\scan_thr_tetraball"
 # DEFAULT_OUTPUT_PATH = "."
@@ -21,55 +29,653 @@ DEBUG = True
 SERIAL_PORT = ''
 BAUD_RATE = 115200
 
-BOARD_ID_OFFSET = 33
-BOARD_MAGIC_ID = 67
 BOARD_DEFAULT_ID = 0
 
-CHANNELS_GROUPS = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
-
-CMD_TERMINATOR = bytes.fromhex('0a')
-
-def format_command(board=BOARD_MAGIC_ID, cmd=None, payload=None):
-    SLAVE_ID = bytes.fromhex(hex(board + BOARD_ID_OFFSET)[2:])
-    #
-    commands_map = {
-        'getstatus'  : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("a")]) + CMD_TERMINATOR,
-        'getdata'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("b")]) + CMD_TERMINATOR,
-        'setdate'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("c")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'settime'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("d")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'getdatetime': lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("e")]) + CMD_TERMINATOR,
-        'getdac'     : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("f")]) + CMD_TERMINATOR,
-        'setdac'     : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("g")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'gettemp'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("h")]) + CMD_TERMINATOR,
-        'reset'      : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("i")]) + CMD_TERMINATOR,
-        'setid'      : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("j")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'getid'      : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("k")]) + CMD_TERMINATOR,
-        'setoverv'   : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("l")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'setundv'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("m")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'setovert'   : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("n")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'setundt'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("o")]) + bytes(p, "ascii") + CMD_TERMINATOR,
-        'getconf'    : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("p")]) + CMD_TERMINATOR,
-        'start'      : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("q")]) + CMD_TERMINATOR,
-        'stop'       : lambda p:    CMD_TERMINATOR + SLAVE_ID + bytes([ord("r")]) + CMD_TERMINATOR,
-    }
-    formatter = commands_map.get(cmd.lower())
-    if formatter:
-        return formatter(payload)
-    else:
-        return None
+CHANNELS_GROUPS = list(protocol.CHANNELS_GROUPS)
+N_CHANNELS = 48
+
+# Dwell time per threshold step.
+# Fixed mode counts FIXED_DWELL seconds. Adaptive mode keeps requesting data until every selected
+# channel has a Poisson relative error 1/sqrt(N) below the target (N = counts summed over the
+# step), or MAX_DWELL seconds have been counted. Channels that would not collect TAIL_COUNTS even
+# in MAX_DWELL (tail of the S-curve, dead channel) do not hold the step, so empty steps end after
+# MIN_DWELL instead of running to MAX_DWELL.
+FIXED_DWELL = 10                # s
+MIN_DWELL = 2                   # s counted before the first check in adaptive mode
+MAX_DWELL = 60                  # s
+TAIL_COUNTS = 100               # counts expected in MAX_DWELL below which a channel is on the tail
+TARGET_REL_ERROR = 0.01
+MAX_POLL = 20                   # s between two getData in adaptive mode (the board keeps 23 s of data)
+
+# The scan advances as soon as the expected answer arrives; these timeouts are only safety nets
+RESPONSE_TIMEOUT = 0.5          # s to wait for an ACK or the first line of a getData burst
+BURST_GAP = 0.1                 # s of silence that ends a getData burst
+STARTUP_TIMEOUT = 5             # s for the board to answer after the port is opened
+RESET_TIMEOUT = 10              # s to wait for the reset banner
+RESET_BANNER = "USART Initialized!"
+POLL_MS = 200                   # UI refresh period while a scan runs
+
+# Threshold steps.
+# Uniform: min..max every `step` mV. Adaptive: a coarse pass of about COARSE_POINTS thresholds,
+# then a step is inserted in the middle of the neighbouring pair whose group rates differ most
+# (log scale, any channel group), until every pair differs by less than RESOLUTION, pairs are
+# `step` mV apart or STEP_BUDGET steps have been measured.
+COARSE_POINTS = 8
+RESOLUTION = 0.1                # max |ln(rate1 / rate2)| between neighbouring steps
+STEP_BUDGET = 40
+RATE_FLOOR = 0.1                # cps added to the rates so that empty tails do not dominate
+# Interleaved: every step gives each channel group a different threshold of the min..max grid
+# (cyclic Latin square, neighbouring groups INTERLEAVE_STRIDE of the range apart), so the 8 groups
+# walk the whole range in the same number of board configurations and, at every threshold of a
+# group, the other groups sit elsewhere on their curves. Comparing with a plain scan (all groups
+# at the same threshold) measures the group to group crosstalk: see crosstalk().
+# This alone does not save configurations (one threshold per group per configuration, as in a plain
+# scan): combined with adaptive steps it does, since each group is then refined on its own curve
+# and the knees of the 8 groups are resolved in the same steps (see InterleavedAdaptiveSteps).
+INTERLEAVE_STRIDE = 1 / len(protocol.CHANNELS_GROUPS)
+
+# "1-6,13,40-48" -> 0-based channel indexes
+def parse_channels(text):
+    channels = set()
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= N_CHANNELS:
+            raise ValueError(f"Invalid channel range {part} (1..{N_CHANNELS})")
+        channels.update(range(first - 1, last))
+    if not channels:
+        raise ValueError("No channel selected")
+    return sorted(channels)
+
+
+# Worst Poisson relative error 1/sqrt(N) among the selected channels
+def relative_error(sums, channels):
+    worst = min(sums[ch] for ch in channels)
+    return 1 / worst ** 0.5 if worst > 0 else float('inf')
+
+
+class DwellPolicy:
+
+    # target_error None: fixed dwell of max_dwell seconds
+    def __init__(self, target_error=None, max_dwell=FIXED_DWELL, min_dwell=MIN_DWELL, channels=None):
+        self.target_error = target_error
+        self.max_dwell = max_dwell
+        self.min_dwell = min(min_dwell, max_dwell)
+        self.channels = channels or list(range(N_CHANNELS))
+
+    @property
+    def adaptive(self):
+        return self.target_error is not None
+
+    # Counts of the selected channels that can still reach the target within max_dwell
+    def counting(self, dwell, sums):
+        return [sums[ch] for ch in self.channels if sums[ch] * self.max_dwell >= TAIL_COUNTS * dwell]
+
+    # Seconds to wait before the next getData, given `dwell` seconds counted so far
+    def next_wait(self, dwell, sums):
+        if not self.adaptive:
+            return self.max_dwell
+        if dwell == 0:
+            return self.min_dwell
+        worst = min(self.counting(dwell, sums), default=0)
+        needed = 1 / self.target_error ** 2
+        # time to reach the target at the rate measured so far
+        estimate = dwell * (needed / worst - 1) if worst > 0 else 1
+        return max(1, min(estimate, self.max_dwell - dwell, MAX_POLL))
+
+    # elapsed guards against a board that sends no data at all
+    def done(self, dwell, sums, elapsed):
+        if not self.adaptive:
+            return True
+        if dwell >= self.max_dwell or elapsed >= 2 * self.max_dwell:
+            return True
+        return dwell >= self.min_dwell and min(self.counting(dwell, sums), default=float('inf')) >= 1 / self.target_error ** 2
+
+
+# THRESHOLD is the threshold of group a (of all groups in a plain scan), THR_A..THR_H the threshold of each group
+def scan_header():
+    return ("DATE\tTIME\t" + "".join("CH_"+str(ch+1).rjust(2, "0")+"\t" for ch in range(N_CHANNELS)) + "THRESHOLD\t"
+            + "".join("THR_"+grp.upper()+"\t" for grp in CHANNELS_GROUPS) + "DWELL\tREL_ERROR\n")
+
+
+# Step of a steps object -> threshold (mV) of every channel group: plain scans give one value for
+# all the groups, interleaved scans a tuple with one value per group
+def group_thresholds(mv):
+    return tuple(mv) if isinstance(mv, tuple) else (mv,) * len(CHANNELS_GROUPS)
+
+
+def format_step(mv):
+    thresholds = group_thresholds(mv)
+    if len(set(thresholds)) == 1:
+        return f"{thresholds[0]} mV"
+    return " ".join(f"{grp}={thr}" for grp, thr in zip(CHANNELS_GROUPS, thresholds)) + " mV"
+
+
+# Data lines answering a getData already sent: the burst ends at a '>' line or after BURST_GAP
+# of silence; first_timeout is the safety net when the board has nothing to send
+def read_data_lines(serial_port, first_timeout=RESPONSE_TIMEOUT):
+    lines = []
+    while True:
+        line = read_line(serial_port, BURST_GAP if lines else first_timeout)
+        if not line or line[0] == ">":
+            return lines
+        if DEBUG: print(">"+line)
+        lines.append(line)
+
+
+# Mean counts per second of every channel group over the rows of a step
+def group_rates(rows):
+    rates = []
+    for g in range(len(CHANNELS_GROUPS)):
+        total = sum(int(parts[ch+2]) for parts in rows for ch in range(g * 6, g * 6 + 6))
+        rates.append(total / (6 * len(rows)) if rows else 0.0)
+    return rates
+
+
+# Largest log ratio between two lists of rates
+def log_change(rates_a, rates_b):
+    return max(abs(math.log((ra + RATE_FLOOR) / (rb + RATE_FLOOR))) for ra, rb in zip(rates_a, rates_b))
+
+
+# Pairs of neighbouring thresholds at least two steps apart
+def refinable_pairs(measured, step):
+    return [(a, b) for a, b in zip(measured, measured[1:]) if b - a >= 2 * step]
+
+
+class UniformSteps:
+
+    def __init__(self, min_mv, max_mv, step):
+        self.pending = list(range(min_mv, max_mv + 1, step))
+        self.total = len(self.pending)
+
+    def next(self):
+        return self.pending.pop(0) if self.pending else None
+
+    def add(self, mv, rates):
+        pass
+
+
+class AdaptiveSteps:
+
+    # thresholds stay on the min_mv + k*step grid
+    def __init__(self, min_mv, max_mv, step, budget=STEP_BUDGET, resolution=RESOLUTION):
+        self.min_mv = min_mv
+        self.step = step
+        self.budget = budget
+        self.resolution = resolution
+        self.rates = {}
+        n = (max_mv - min_mv) // step
+        coarse = max(1, n // COARSE_POINTS)
+        self.pending = list(range(min_mv, max_mv + 1, coarse * step))
+        if self.pending[-1] != min_mv + n * step:
+            self.pending.append(min_mv + n * step)
+        self.total = min(budget, n + 1)         # upper bound, refinement may stop earlier
+
+    def next(self):
+        if len(self.rates) >= self.budget:
+            return None
+        if self.pending:
+            return self.pending.pop(0)
+        return self.refine()
+
+    def add(self, mv, rates):
+        self.rates[mv] = rates
+
+    # Difference between two steps: largest log ratio of the group rates
+    def change(self, a, b):
+        return log_change(self.rates[a], self.rates[b])
+
+    def refine(self):
+        measured = sorted(self.rates)
+        best, best_change = None, self.resolution
+        for a, b in refinable_pairs(measured, self.step):
+            change = self.change(a, b)
+            if change > best_change:
+                best, best_change = (a, b), change
+        if best is None:
+            return None
+        a, b = best
+        return a + (b - a) // (2 * self.step) * self.step
+
+
+class InterleavedSteps:
+
+    def __init__(self, min_mv, max_mv, step, stride=INTERLEAVE_STRIDE):
+        self.values = list(range(min_mv, max_mv + 1, step))
+        n = len(self.values)
+        self.shift = max(1, round(n * stride))
+        self.pending = [tuple(self.values[(k + g * self.shift) % n] for g in range(len(CHANNELS_GROUPS)))
+                        for k in range(n)]
+        self.total = n
+
+    def next(self):
+        return self.pending.pop(0) if self.pending else None
+
+    def add(self, mv, rates):
+        pass
+
+
+# Interleaved and adaptive: the coarse pass is the interleaved walk of the coarse grid, then every
+# step refines each group on its own curve (middle of its neighbouring pair whose rates differ most),
+# so the 8 knees are resolved in the same configurations instead of one after the other. A group
+# already resolved re-measures the middle of its widest gap. Same stop rules as AdaptiveSteps.
+class InterleavedAdaptiveSteps(AdaptiveSteps):
+
+    def __init__(self, min_mv, max_mv, step, budget=STEP_BUDGET, resolution=RESOLUTION, stride=INTERLEAVE_STRIDE):
+        super().__init__(min_mv, max_mv, step, budget, resolution)
+        coarse, groups = self.pending, len(CHANNELS_GROUPS)
+        shift = max(1, round(len(coarse) * stride))
+        self.pending = [tuple(coarse[(k + g * shift) % len(coarse)] for g in range(groups)) for k in range(len(coarse))]
+        self.group_rates = [{} for _ in range(groups)]      # per group: threshold -> rates (one per board)
+
+    # rates: group rates of every board, board after board
+    def add(self, mv, rates):
+        self.rates[mv] = rates
+        groups = len(CHANNELS_GROUPS)
+        for g, thr in enumerate(group_thresholds(mv)):
+            self.group_rates[g][thr] = rates[g::groups]
+
+    def refine(self):
+        choice, refining = [], False
+        for rates in self.group_rates:
+            measured = sorted(rates)
+            pairs = refinable_pairs(measured, self.step)
+            best, best_change = None, self.resolution
+            for a, b in pairs:
+                change = log_change(rates[a], rates[b])
+                if change > best_change:
+                    best, best_change = (a, b), change
+            refining = refining or best is not None
+            a, b = best or max(pairs, key=lambda pair: pair[1] - pair[0], default=(measured[0], measured[0]))
+            choice.append(a + (b - a) // (2 * self.step) * self.step)
+        return tuple(choice) if refining else None
+
+
+# One board of a scan: its output file, the rows written per threshold and the counts of the current step
+class BoardScan:
+
+    def __init__(self, board_id, output_file):
+        self.board_id = board_id
+        self.output_file = output_file
+        self.getdata_frame = protocol.frame(board_id, "getdata")
+        self.measured = {}
+        self.begin_step()
+
+    def begin_step(self):
+        self.rows, self.sums = [], [0] * N_CHANNELS
+        self.error = float('inf')
+        self.done = False
+
+    @property
+    def dwell(self):
+        return len(self.rows)
+
+    def add_lines(self, lines, channels):
+        for line in lines:
+            parts = line.split("\t")
+            if len(parts) < N_CHANNELS + 2:
+                continue
+            self.rows.append(parts)
+            for ch in range(N_CHANNELS):
+                self.sums[ch] += int(parts[ch+2])
+        self.error = relative_error(self.sums, channels)
+
+
+# Count one threshold step on every board of the port according to the dwell policy: the boards
+# count at the same time and are read one after the other (by board ID on a shared bus).
+# A set cancel event ends the step early with what has been counted so far.
+def acquire_step(serial_port, boards, policy, timer=None, cancel=None):
+    timer = timer or ScanTimer()
+    for board in boards:
+        board.begin_step()
+    started = time.monotonic()
+    while True:
+        active = [board for board in boards if not board.done]
+        with timer.phase('counting'):
+            cancelled = wait(min(policy.next_wait(board.dwell, board.sums) for board in active), cancel)
+        for board in active:
+            with timer.phase('readout'):
+                if DEBUG: print("<" + board.getdata_frame.decode('utf-8').strip())
+                serial_port.write( board.getdata_frame )
+                lines = read_data_lines(serial_port)
+            board.add_lines(lines, policy.channels)
+            if DEBUG and policy.adaptive: print(f"*Board {board.board_id}: dwell {board.dwell} s, relative error {board.error:.4f}")
+            board.done = cancelled or policy.done(board.dwell, board.sums, time.monotonic() - started)
+        if all(board.done for board in boards):
+            return
+
+
+# Sleep that a cancel event interrupts; True if cancelled
+def wait(seconds, cancel=None):
+    if cancel is None:
+        time.sleep(seconds)
+        return False
+    return cancel.wait(seconds)
+
+
+# Time spent in each phase of the scan; everything but 'counting' is dead time.
+# Updated by the scan thread and read by the GUI: other threads use snapshot().
+class ScanTimer:
+
+    def __init__(self):
+        self.totals = collections.defaultdict(float)
+        self.steps = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.totals[name] += time.perf_counter() - t0
+
+    # Copy of the phase totals
+    def snapshot(self):
+        with self._lock:
+            return dict(self.totals)
 
-def send_command(serial_port, formatted_command, retry=3, wait=0.1):
+    def report(self):
+        totals = self.snapshot()
+        total = sum(totals.values())
+        dead = total - totals.get('counting', 0.0)
+        phases = ", ".join(f"{name} {t:.1f} s" for name, t in sorted(totals.items()))
+        per_step = dead / self.steps if self.steps else 0.0
+        return (f"{self.steps} steps in {total:.1f} s, dead time {dead:.1f} s "
+                f"({100 * dead / total if total else 0:.1f}%, {per_step:.2f} s/step)\n{phases}")
+
+
+def read_line(serial_port, timeout):
+    serial_port.timeout = timeout
+    return serial_port.readline().decode('utf-8', errors='ignore').strip()
+
+
+# Send a frame and wait for its '>' ACK (timeout is only a safety net)
+def send_command(serial_port, formatted_command, retry=3, timeout=RESPONSE_TIMEOUT):
     for attempt in range(retry):
         if DEBUG: print("<" + formatted_command.decode('utf-8').strip())
         serial_port.write(formatted_command)
-        time.sleep(wait)
-        response = serial_port.readline().decode('utf-8').strip()
-        if DEBUG: print(response)
-        if response and response[0] == ">":
-            return True #break
-    else:
-        return False
-    
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            response = read_line(serial_port, remaining)
+            if DEBUG and response: print(response)
+            if response and response[0] == ">":
+                return True
+    return False
+
+
+# Lines until the reset banner (or the timeout)
+def wait_for_banner(serial_port, timeout=RESET_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        line = read_line(serial_port, deadline - time.monotonic())
+        if DEBUG and line: print(line)
+        if line == RESET_BANNER:
+            return True
+    return False
+
+
+# Wait for the board, set its date and time and reset it
+def prepare_board(serial_port, board_id, timer=None):
+    timer = timer or ScanTimer()
+    with timer.phase('startup'):
+        serial_port.reset_input_buffer()
+        # the board may still be booting after the port is opened
+        if not send_command(serial_port, protocol.frame(board_id, "getstatus"), retry=int(STARTUP_TIMEOUT / RESPONSE_TIMEOUT)):
+            raise RuntimeError("Communication error.")
+        # imposto data/ora e riavvio la scheda
+        if not send_command(serial_port, protocol.frame(board_id, "setdate", protocol.encode_date(datetime.datetime.now()))):
+            raise RuntimeError("Communication error.")
+        if not send_command(serial_port, protocol.frame(board_id, "settime", protocol.encode_time(datetime.datetime.now()))):
+            raise RuntimeError("Communication error.")
+        if not send_command(serial_port, protocol.frame(board_id, "reset")):
+            raise RuntimeError("Communication error.")
+        wait_for_banner(serial_port)
+        serial_port.reset_input_buffer()
+        serial_port.reset_output_buffer()
+
+
+# Scan the thresholds given by steps on the boards of one serial port (BoardScan list) and write
+# the CSV rows to their output files. With several boards the adaptive steps follow the groups
+# of all of them.
+# on_step(mv, {board ID: group rates}) is called after every step; when cancel is set the current
+# step is cut short, its rows are kept and the boards are stopped.
+def run_scan(serial_port, boards, steps, policy, timer=None, cancel=None, on_step=None):
+    timer = timer or ScanTimer()
+    for board in boards:
+        board.output_file.write(scan_header())
+        board.output_file.flush()
+    try:
+        while cancel is None or not cancel.is_set():    # ciclo sulle soglie
+            mv = steps.next()
+            if mv is None:
+                break
+            thresholds = group_thresholds(mv)
+            with timer.phase('setup'):
+                for board in boards:
+                    for grp, thr in zip(CHANNELS_GROUPS, thresholds):    # ciclo sui dac (frames cached by protocol)
+                        if not send_command(serial_port, protocol.frame(board.board_id, "setdac", protocol.encode_dac(grp, thr))):
+                            raise RuntimeError(f"Communication error (board {board.board_id}).")
+                    #Avvio Conteggio
+                    if not send_command(serial_port, protocol.frame(board.board_id, "start")):
+                        raise RuntimeError(f"Communication error (board {board.board_id}).")
+                    # pulisco eventuali dati vecchi
+                    if DEBUG: print("*Cleaning buffer...")
+                    serial_port.write( board.getdata_frame )
+                    read_data_lines(serial_port)
+
+            # acquisisco i dati per la taratura
+            if DEBUG: print("*Waiting for data acquisition...")
+            acquire_step(serial_port, boards, policy, timer, cancel)
+            rates = {board.board_id: group_rates(board.rows) for board in boards}
+            steps.add(mv, [rate for board in boards for rate in rates[board.board_id]])
+            with timer.phase('writing'):
+                for board in boards:
+                    # data e ora, cps dei 48 canali, soglia (gruppo a e di ogni gruppo), tempo di misura e errore relativo dello step
+                    columns = "\t".join("%.3f" % (thr/1000) for thr in (thresholds[0],) + thresholds)
+                    board.measured[mv] = ["\t".join(parts[:N_CHANNELS+2]) + "\t" + columns
+                                          + "\t" + str(board.dwell) + "\t" + str("%.4f" % board.error) + "\n" for parts in board.rows]
+                    board.output_file.writelines(board.measured[mv])
+                    board.output_file.flush()
+
+            #fermo conteggio
+            with timer.phase('stop'):
+                for board in boards:
+                    if not send_command(serial_port, protocol.frame(board.board_id, "stop")):
+                        raise RuntimeError(f"Communication error (board {board.board_id}).")
+            timer.steps += 1
+            if DEBUG: print(f"*Step {format_step(mv)} done")
+            if on_step is not None:
+                on_step(mv, rates)
+    finally:
+        if isinstance(steps, AdaptiveSteps):
+            # steps were measured out of order: rewrite the files sorted by threshold, also when
+            # the scan failed (the other tools expect sorted thresholds)
+            for board in boards:
+                board.output_file.seek(0)
+                board.output_file.truncate()
+                board.output_file.write(scan_header())
+                for mv in sorted(board.measured):
+                    board.output_file.writelines(board.measured[mv])
+                board.output_file.flush()
+    return timer
+
+
+# "COM6:0,1; COM7:3" -> [('COM6', 0), ('COM6', 1), ('COM7', 3)]
+def parse_targets(text):
+    targets = []
+    for item in text.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        port, sep, ids = item.rpartition(':')
+        if not sep or not port:
+            raise ValueError(f"Invalid target {item}. Example: COM6:0,1; COM7:3")
+        for board_id in ids.split(','):
+            board_id = int(board_id)
+            if not protocol.valid_board_id(board_id):
+                raise ValueError(f"Invalid board ID {board_id}")
+            targets.append((port.strip(), board_id))
+    return targets
+
+
+# Scan file -> per channel group {threshold mV: (counts summed over the 6 channels and the rows, rows)}
+# Files written before the per-group columns existed use THRESHOLD for every group
+def read_scan(path):
+    curves = [{} for _ in CHANNELS_GROUPS]
+    with open_file(path, 'r') as scan_file:
+        header = scan_file.readline().rstrip("\n").split("\t")
+        columns = [header.index("THR_"+grp.upper()) if "THR_"+grp.upper() in header else header.index("THRESHOLD")
+                   for grp in CHANNELS_GROUPS]
+        for line in scan_file:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < len(header):
+                continue
+            for g, column in enumerate(columns):
+                mv = round(float(parts[column]) * 1000)
+                counts, rows = curves[g].get(mv, (0, 0))
+                curves[g][mv] = (counts + sum(int(parts[ch+2]) for ch in range(g * 6, g * 6 + 6)), rows + 1)
+    return curves
+
+
+# Group to group crosstalk: for every group, mean log ratio of its rate in the interleaved scan to
+# its rate in the plain scan at the same own threshold, with its Poisson error and the number of
+# thresholds compared. Without crosstalk the ratio is 1 (log 0) within the error.
+def crosstalk(plain_path, interleaved_path):
+    result = {}
+    for grp, plain, mixed in zip(CHANNELS_GROUPS, read_scan(plain_path), read_scan(interleaved_path)):
+        common = [mv for mv in sorted(set(plain) & set(mixed)) if plain[mv][0] > 0 and mixed[mv][0] > 0]
+        if not common:
+            result[grp] = (None, None, 0)
+            continue
+        logs = [math.log((mixed[mv][0] / mixed[mv][1]) / (plain[mv][0] / plain[mv][1])) for mv in common]
+        variance = sum(1 / plain[mv][0] + 1 / mixed[mv][0] for mv in common)
+        result[grp] = (sum(logs) / len(logs), variance ** 0.5 / len(logs), len(common))
+    return result
+
+
+def print_crosstalk(plain_path, interleaved_path):
+    print("GROUP\tRATE CHANGE\tERROR\tTHRESHOLDS")
+    for grp, (log_ratio, error, n) in crosstalk(plain_path, interleaved_path).items():
+        if log_ratio is None:
+            print(f"{grp}\t-\t-\t0")
+        else:
+            print(f"{grp}\t{100 * math.expm1(log_ratio):+.2f}%\t{100 * error:.2f}%\t{n}")
+
+
+# Runs the scan of the boards of one serial port in a background thread (one worker per port,
+# so several ports are scanned in parallel). Events, put on the `events` queue:
+#   ('step', worker, mv, {board ID: group rates}, steps done, steps total, elapsed s)
+#   ('done' | 'cancelled', worker, timer report)
+#   ('error', worker, message)
+class ScanWorker:
+
+    # targets: list of (board ID, output path) on this port
+    def __init__(self, port, targets, steps, policy, events=None, cancel=None):
+        self.port = port
+        self.targets = targets
+        self.steps = steps
+        self.policy = policy
+        self.events = events if events is not None else queue.Queue()
+        self.cancel = cancel or threading.Event()
+        self.timer = ScanTimer()
+        self.status = 'running'
+        self.last_mv = None
+        self.thread = threading.Thread(target=self.run, name=f"scan-{port}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        started = time.monotonic()
+
+        def on_step(mv, rates):
+            self.last_mv = mv
+            self.events.put(('step', self, mv, rates, self.timer.steps, self.steps.total, time.monotonic() - started))
+
+        try:
+            with serial.Serial(self.port, BAUD_RATE, timeout=RESPONSE_TIMEOUT) as serial_port, contextlib.ExitStack() as files:
+                # the files are created only once every board has answered, so that a board that
+                # does not answer leaves no empty CSV behind
+                for board_id, path in self.targets:
+                    prepare_board(serial_port, board_id, self.timer)
+                boards = [BoardScan(board_id, files.enter_context(open(path, "w"))) for board_id, path in self.targets]
+                run_scan(serial_port, boards, self.steps, self.policy, self.timer, self.cancel, on_step)
+            if DEBUG: print("*End.")
+            if DEBUG: print(self.timer.report())
+            self.status = 'cancelled' if self.cancel.is_set() else 'done'
+            self.events.put((self.status, self, self.timer.report()))
+        except serial.SerialException as ex:
+            self.fail("Connection error.")
+        except FileNotFoundError as ex:
+            self.fail("File not found.")
+        except Exception as ex:
+            self.fail(str(ex))
+
+    def fail(self, message):
+        self.status = 'error: ' + message
+        self.events.put(('error', self, message))
+
+    def summary(self):
+        lines = [f"{self.port}: {self.status}, {self.timer.steps}/{self.steps.total} steps"
+                 + (f", last {format_step(self.last_mv)}" if self.last_mv is not None else "")]
+        for board_id, path in self.targets:
+            lines.append(f"    board {board_id}: {path}")
+        lines.append("    " + self.timer.report().replace("\n", "\n    "))
+        return "\n".join(lines)
+
+
+# S-curves (log rate vs threshold) of the channel groups, updated one step at a time:
+# each group is one canvas line whose points are replaced, nothing else is redrawn
+class SCurvePlot(tk.Canvas):
+
+    COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
+    LOG_MIN, LOG_MAX = -1, 5        # cps axis, decades
+    MARGIN = 40
+
+    def __init__(self, master, width=520, height=240):
+        super().__init__(master, width=width, height=height, bg='white', highlightthickness=0)
+        self.width, self.height = width, height
+        self.reset(0, 1)
+
+    def reset(self, min_mv, max_mv):
+        self.delete('all')
+        self.min_mv, self.max_mv = min_mv, max(max_mv, min_mv + 1)
+        self.points = [{} for _ in CHANNELS_GROUPS]
+        m = self.MARGIN
+        self.create_rectangle(m, 10, self.width - 10, self.height - m + 10)
+        for decade in range(self.LOG_MIN, self.LOG_MAX + 1):
+            y = self.y(10 ** decade)
+            self.create_text(m - 4, y, text=f"1e{decade}", anchor=tk.E, font='sans 7')
+        self.create_text(m, self.height - m + 22, text=f"{self.min_mv} mV", anchor=tk.W, font='sans 7')
+        self.create_text(self.width - 10, self.height - m + 22, text=f"{self.max_mv} mV", anchor=tk.E, font='sans 7')
+        self.lines = [self.create_line(0, 0, 0, 0, fill=color, width=2, state=tk.HIDDEN) for color in self.COLORS]
+        for g, grp in enumerate(CHANNELS_GROUPS):
+            self.create_text(m + 8 + g * 24, 20, text=grp, fill=self.COLORS[g], font='sans 8 bold')
+
+    def x(self, mv):
+        return self.MARGIN + (mv - self.min_mv) / (self.max_mv - self.min_mv) * (self.width - 10 - self.MARGIN)
+
+    def y(self, rate):
+        log = min(max(math.log10(max(rate, 10 ** self.LOG_MIN)), self.LOG_MIN), self.LOG_MAX)
+        return self.height - self.MARGIN + 10 - (log - self.LOG_MIN) / (self.LOG_MAX - self.LOG_MIN) * (self.height - self.MARGIN)
+
+    def add(self, mv, rates):
+        for g, (thr, rate) in enumerate(zip(group_thresholds(mv), rates)):
+            self.points[g][thr] = rate
+            coords = [c for p in sorted(self.points[g]) for c in (self.x(p), self.y(self.points[g][p]))]
+            if len(coords) == 2:
+                coords = coords * 2
+            self.coords(self.lines[g], *coords)
+            self.itemconfig(self.lines[g], state=tk.NORMAL)
+
 
 class MainWindow(tk.Tk):
     
@@ -118,9 +724,65 @@ class MainWindow(tk.Tk):
         self.spbThresholdMax.delete(0, tk.END)
         self.spbThresholdMax.insert(0, 525)
 
+        # Dwell controls: fixed FIXED_DWELL s per step, or adaptive up to the target relative error
+        self.varAdaptive = tk.BooleanVar(value=False)
+        self.chkAdaptive = tk.Checkbutton(master=self, text='Adaptive dwell', variable=self.varAdaptive, font='sans 10')
+        self.chkAdaptive.grid(row=3, column=0, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.lblTargetError = tk.Label(master=self, text='Target error (%):', font='sans 10')
+        self.lblTargetError.grid(row=3, column=1, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.spbTargetError = tk.Spinbox(master=self, from_=0.1, to=50, increment=0.1, width=5, font="sans 10")
+        self.spbTargetError.grid(row=3, column=2, padx=(2, 5), pady=(5, 0), sticky=tk.W)
+        self.spbTargetError.delete(0, tk.END)
+        self.spbTargetError.insert(0, TARGET_REL_ERROR * 100)
+        self.lblMaxDwell = tk.Label(master=self, text='Max dwell (s):', font='sans 10')
+        self.lblMaxDwell.grid(row=3, column=3, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.spbMaxDwell = tk.Spinbox(master=self, from_=2, to=3600, width=5, font="sans 10")
+        self.spbMaxDwell.grid(row=3, column=4, padx=(2, 5), pady=(5, 0), sticky=tk.W)
+        self.spbMaxDwell.delete(0, tk.END)
+        self.spbMaxDwell.insert(0, MAX_DWELL)
+        self.lblChannels = tk.Label(master=self, text='Channels:', font='sans 10')
+        self.lblChannels.grid(row=4, column=0, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.txtChannels = tk.Entry(master=self, width=20, font='sans 10')
+        self.txtChannels.grid(row=4, column=1, columnspan=2, padx=2, pady=(5, 0), sticky=tk.W)
+        self.txtChannels.insert(0, f"1-{N_CHANNELS}")
+
+        # Step controls: uniform steps or coarse-to-fine refinement around the S-curve knee
+        self.varAdaptiveSteps = tk.BooleanVar(value=False)
+        self.chkAdaptiveSteps = tk.Checkbutton(master=self, text='Adaptive steps', variable=self.varAdaptiveSteps, font='sans 10')
+        self.chkAdaptiveSteps.grid(row=4, column=3, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.lblBudget = tk.Label(master=self, text='Step budget:', font='sans 10')
+        self.lblBudget.grid(row=4, column=4, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.spbBudget = tk.Spinbox(master=self, from_=2, to=1000, width=5, font="sans 10")
+        self.spbBudget.grid(row=4, column=5, padx=(2, 5), pady=(5, 0), sticky=tk.W)
+        self.spbBudget.delete(0, tk.END)
+        self.spbBudget.insert(0, STEP_BUDGET)
+
+        # Several boards / ports: "COM6:0,1; COM7:3" (empty: the port and board ID above)
+        self.lblTargets = tk.Label(master=self, text='Targets:', font='sans 10')
+        self.lblTargets.grid(row=5, column=0, padx=(5, 2), pady=(5, 0), sticky=tk.E)
+        self.txtTargets = tk.Entry(master=self, width=50, font='sans 10')
+        self.txtTargets.grid(row=5, column=1, columnspan=4, padx=2, pady=(5, 0), sticky=tk.W)
+        # Different threshold per channel group at every step (see InterleavedSteps, InterleavedAdaptiveSteps with Adaptive steps)
+        self.varInterleaved = tk.BooleanVar(value=False)
+        self.chkInterleaved = tk.Checkbutton(master=self, text='Interleaved groups', variable=self.varInterleaved, font='sans 10')
+        self.chkInterleaved.grid(row=5, column=5, padx=(2, 5), pady=(5, 0), sticky=tk.W)
+
         # Move Scan Threshold button down
         self.btnLoop = tk.Button(master=self, command=self.start_loop, text='Start Threshold Scan', font='sans 10')
-        self.btnLoop.grid(row=3, column=0, columnspan=6, padx=5, pady=5)
+        self.btnLoop.grid(row=6, column=0, columnspan=3, padx=5, pady=5, sticky=tk.E)
+        self.btnCancel = tk.Button(master=self, command=self.cancel_loop, text='Cancel', font='sans 10', state="disabled")
+        self.btnCancel.grid(row=6, column=3, columnspan=3, padx=5, pady=5, sticky=tk.W)
+
+        # Progress and live S-curves (of the first board)
+        self.prgScan = ttk.Progressbar(master=self, length=400, mode='determinate')
+        self.prgScan.grid(row=7, column=0, columnspan=4, padx=5, pady=(0, 5), sticky=tk.EW)
+        self.lblProgress = tk.Label(master=self, text='', font='sans 9', justify=tk.LEFT)
+        self.lblProgress.grid(row=7, column=4, columnspan=2, padx=5, pady=(0, 5), sticky=tk.W)
+        self.plot = SCurvePlot(self)
+        self.plot.grid(row=8, column=0, columnspan=6, padx=5, pady=(0, 5))
+        self.workers = []
+        self.events = queue.Queue()
+        self.summary_path = None
 
         # Threshold step control
         self.lblThresholdStep = tk.Label(master=self, text='Step (mV):', font='sans 10')
@@ -190,124 +852,116 @@ class MainWindow(tk.Tk):
             # 
             # with serial.Serial(self.cmbSerialPort.get(), BAUD_RATE, timeout=1) as serial_port, open(self.txtFile.get(), "w") as output_file:
 
+    def dwell_policy(self):
+        if not self.varAdaptive.get():
+            return DwellPolicy()
+        return DwellPolicy(target_error=float(self.spbTargetError.get()) / 100, max_dwell=int(self.spbMaxDwell.get()),
+                           channels=parse_channels(self.txtChannels.get()))
+
+    def set_controls(self, state):
+        for widget in (self.cmbSerialPort, self.btnReScan, self.spbBoardID, self.txtFile, self.btnFile, self.btnLoop, self.txtTargets):
+            widget.config(state=state)
+        self.btnCancel.config(state="normal" if state == "disabled" else "disabled")
+
+    def make_steps(self, min_threshold, max_threshold, step):
+        if self.varInterleaved.get() and self.varAdaptiveSteps.get():
+            return InterleavedAdaptiveSteps(min_threshold, max_threshold, step, int(self.spbBudget.get()))
+        if self.varInterleaved.get():
+            return InterleavedSteps(min_threshold, max_threshold, step)
+        if self.varAdaptiveSteps.get():
+            return AdaptiveSteps(min_threshold, max_threshold, step, int(self.spbBudget.get()))
+        return UniformSteps(min_threshold, max_threshold, step)
+
+    # The scan runs in one ScanWorker thread per serial port; the UI follows them through the event queue
     def start_loop(self):
         try:
-            self.cmbSerialPort.config(state="disabled")
-            self.btnReScan.config(state="disabled")
-            self.spbBoardID.config(state="disabled")
-            self.txtFile.config(state="disabled")
-            self.btnFile.config(state="disabled")
-            self.btnLoop.config(state="disabled")
-             
-            self.config(cursor="wait")
-            self.update()
-            
             min_threshold = int(self.spbThresholdMin.get())
             max_threshold = int(self.spbThresholdMax.get())
             step = int(self.spbThresholdStep.get())
+            policy = self.dwell_policy()
+            targets = parse_targets(self.txtTargets.get()) or [(self.cmbSerialPort.get(), int(self.spbBoardID.get()))]
 
             # Compose output filename: base + _DDMMYY_HHMMSS.csv in DEFAULT_OUTPUT_PATH
+            # (+ _bNN per board when several boards are scanned)
             base_filename = os.path.splitext(self.txtFile.get())[0]
             ext = os.path.splitext(self.txtFile.get())[1] or ".csv"
             timestamp = datetime.datetime.now().strftime("%d_%m_%Y_%Hh%Mm")
-            output_filename = f"{base_filename}_m{min_threshold}_M{max_threshold}_s{step}_{timestamp}{ext}"
-            full_output_path = os.path.join(DEFAULT_OUTPUT_PATH, output_filename)
-
-
-            with serial.Serial(self.cmbSerialPort.get(), BAUD_RATE, timeout=1) as serial_port, open(full_output_path, "w") as output_file:
-                time.sleep(2)
-                
-                # imposto data/ora e riavvio la scheda
-                if not send_command(serial_port, format_command(int(self.spbBoardID.get()), "setDate", datetime.datetime.now().strftime("%d%m%Y")), wait=1):
-                    raise RuntimeError("Communication error.")
-                time.sleep(1)
-                if not send_command(serial_port, format_command(int(self.spbBoardID.get()), "setTime", datetime.datetime.now().strftime("%H%M%S")), wait=1):
-                    raise RuntimeError("Communication error.'")
-                time.sleep(1)
-                if not send_command(serial_port, format_command(int(self.spbBoardID.get()), "reset")):
-                    raise RuntimeError("Communication error.")
-                time.sleep(5)
-                
-                
-                serial_port.reset_input_buffer()
-                serial_port.reset_output_buffer()
-                
-                # preparo il file
-                output_file.write("DATE\tTIME\t")
-                for ch in range(48):
-                    output_file.write("CH_"+str(ch+1).rjust(2, "0")+"\t")
-                output_file.write("THRESHOLD\n")
-                output_file.flush()
-                
-                for mv in range(min_threshold, max_threshold + 1, step):    # ciclo sulle soglie
-                    for grp in CHANNELS_GROUPS:    # ciclo sui dac
-                        if not send_command(serial_port, format_command(int(self.spbBoardID.get()), "setDAC", grp+str(mv).rjust(4, "0"))):
-                            raise RuntimeError("Communication error.")
-                    
-                    #Avvio Conteggio
-                    if not send_command(serial_port, format_command(int(self.spbBoardID.get()), "start")):
-                        raise RuntimeError("Communication error.")
-
-                    # pulisco eventuali dati vecchi
-                    if DEBUG: print("*Cleaning buffer...")
-                    serial_port.write( format_command(int(self.spbBoardID.get()), "getData") )
-                    time.sleep(1)
-                    while True:
-                        line = serial_port.readline().decode('utf-8', errors='ignore').strip()
-                        if not line:
-                            break
-                    #
-                    serial_port.reset_input_buffer()
-                    serial_port.reset_output_buffer()
-                    
-                    # acquisisco i dati per la taratura
-                    if DEBUG: print("*Waiting for data acquisition...")
-                    time.sleep(10)
-                    #
-                    if DEBUG: print("<" + format_command(int(self.spbBoardID.get()), "getData").decode('utf-8').strip())
-                    serial_port.write( format_command(int(self.spbBoardID.get()), "getData") )
-                    time.sleep(1)
-                    while True:
-                        line = serial_port.readline().decode('utf-8', errors='ignore').strip()
-                        if line and line[0] != ">":
-                            if DEBUG: print(">"+line)
-                            parts = line.split("\t")
-                            if parts:
-                                # scrivi data e ora nel file di output
-                                output_file.write(parts[0]+"\t"+parts[1]+"\t")
-                                # scrivi i valori di cps dei 48 canali
-                                for ch in range(48):
-                                    output_file.write(parts[ch+2]+"\t")
-                        else:
-                            break
-                        
-                        # scrivi il valore di soglia nell'ultima colonna
-                        output_file.write(str("%.3f" % (mv/1000))+"\n")
-                        output_file.flush()
-
-                    #fermo conteggio
-                    if not send_command(serial_port, format_command(int(self.spbBoardID.get()), "stop")):
-                        raise RuntimeError("Communication error.")
-                if DEBUG: print("*End.")
-                messagebox.showinfo(title=self.title(), message="Completed.")
-                
-        except serial.SerialException as ex:
-            messagebox.showerror(title=self.title(), message="Connection error.")
-        except FileNotFoundError as ex:
-            messagebox.showerror(title=self.title(), message="File not found.")
+            by_port = {}
+            for port, board_id in targets:
+                board_tag = f"_b{board_id:02d}" if len(targets) > 1 else ""
+                board_tag += "_il" if self.varInterleaved.get() else ""
+                output_filename = f"{base_filename}{board_tag}_m{min_threshold}_M{max_threshold}_s{step}_{timestamp}{ext}"
+                by_port.setdefault(port, []).append((board_id, os.path.join(DEFAULT_OUTPUT_PATH, output_filename)))
+            self.summary_path = os.path.join(DEFAULT_OUTPUT_PATH, f"{base_filename}_summary_{timestamp}.txt") if len(targets) > 1 else None
         except Exception as ex:
             messagebox.showerror(title=self.title(), message=str(ex))
-        finally:
-            self.cmbSerialPort.config(state="normal")
-            self.btnReScan.config(state="normal")
-            self.spbBoardID.config(state="normal")
-            self.txtFile.config(state="normal")
-            self.btnFile.config(state="normal")
-            self.btnLoop.config(state="normal")
-            #
-            self.config(cursor="")
-            self.update()
+            return
+
+        self.set_controls("disabled")
+        self.plot.reset(min_threshold, max_threshold)
+        self.events = queue.Queue()
+        cancel = threading.Event()
+        self.workers = [ScanWorker(port, boards, self.make_steps(min_threshold, max_threshold, step), policy, self.events, cancel)
+                        for port, boards in by_port.items()]
+        self.prgScan.config(maximum=sum(worker.steps.total for worker in self.workers), value=0)
+        self.lblProgress.config(text="Preparing boards...")
+        for worker in self.workers:
+            worker.start()
+        self.after(POLL_MS, self.poll_worker)
+
+    def cancel_loop(self):
+        if self.workers:
+            self.workers[0].cancel.set()
+            self.btnCancel.config(state="disabled")
+            self.lblProgress.config(text="Stopping...")
 
+    def poll_worker(self):
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == 'step':
+                _, worker, mv, rates, done, total, elapsed = event
+                if worker is self.workers[0]:
+                    self.plot.add(mv, rates[worker.targets[0][0]])
+            elif event[0] == 'error' and len(self.workers) == 1:
+                messagebox.showerror(title=self.title(), message=event[2])
+        self.show_progress()
+        if any(worker.status == 'running' for worker in self.workers):
+            self.after(POLL_MS, self.poll_worker)
+            return
+        self.set_controls("normal")
+        self.finish()
+
+    def show_progress(self):
+        self.prgScan.config(value=sum(worker.timer.steps for worker in self.workers))
+        lines = []
+        for worker in self.workers:
+            done, total = worker.timer.steps, worker.steps.total
+            elapsed = sum(worker.timer.snapshot().values())
+            eta = elapsed / done * max(total - done, 0) if done else None
+            state = f"ETA {int(eta // 60)}:{int(eta % 60):02d}" if eta is not None and worker.status == 'running' else worker.status
+            lines.append(f"{worker.port}: step {done}/{total}" + (f" ({format_step(worker.last_mv)})" if worker.last_mv is not None else "") + f", {state}")
+        self.lblProgress.config(text="\n".join(lines))
+
+    # Completion message, and the combined report when several boards were scanned
+    def finish(self):
+        summary = "\n".join(worker.summary() for worker in self.workers)
+        if DEBUG: print(summary)
+        if self.summary_path:
+            with open(self.summary_path, "w") as summary_file:
+                summary_file.write(summary + "\n")
+        if len(self.workers) == 1 and self.workers[0].status.startswith('error'):
+            return
+        cancelled = any(worker.status == 'cancelled' for worker in self.workers)
+        messagebox.showinfo(title=self.title(), message=("Cancelled, partial data kept.\n" if cancelled else "Completed.\n") + summary)
+
+# python scan_threshold.py                                   -> scan GUI
+# python scan_threshold.py --crosstalk PLAIN.csv INTERLEAVED.csv -> crosstalk of an interleaved scan
 if __name__ == "__main__":
-    window = MainWindow()
-    window.mainloop()
+    if len(sys.argv) == 4 and sys.argv[1] == "--crosstalk":
+        print_crosstalk(sys.argv[2], sys.argv[3])
+    else:
+        window = MainWindow()
+        window.mainloop()
@@ -0,0 +1,273 @@
+import argparse
+import contextlib
+import datetime
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+import serial
+
+import protocol
+from compressed_files import open_file
+
+# Raw serial capture and replay.
+# With capture enabled every chunk read from and written to a port is appended, as it is, to a
+# binary journal next to the logs (serial_capture_<port>_DD_MM_YYYY_HHMMSS.tbj, one per port and run):
+#   header (HEADER_SIZE bytes): magic | version | header size | baud rate | wall clock at start (s) | port name
+#   records: uint64 ns since start (monotonic) | uint8 direction (RX / TX) | uint32 length | bytes
+# so banners, partial ACKs and data lines keep the exact chunking and timing seen on the wire.
+# CapturingSerial wraps the real port, the reader and the dispatcher do not know about it.
+# ReplaySerial plays the RX side of a journal back as a serial port (1x, Nx or max speed) and
+# replay() runs it through the acquisition pipeline (SerialReader -> routing -> writers, index,
+# roll-ups) into another folder, with the original arrival times, so the output files can be
+# compared with the ones written in the field. The TX side is not sent anywhere: the replayed
+# lines go to the first board of the port (exact for one board per port).
+#   python serial_journal.py dump serial_capture_COM6_18_10_2026_101500.tbj
+#   python serial_journal.py replay serial_capture_COM6_18_10_2026_101500.tbj --output replay [--speed 10|max]
+
+MAGIC = b'TBSERJ\x00\x01'
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+HEADER_STRUCT = struct.Struct('<8sHHId32s')     # magic, version, header size, baud rate, wall clock at start, port
+RECORD_STRUCT = struct.Struct('<QBI')           # ns since start, direction, length
+RX = 0
+TX = 1
+FLUSH_INTERVAL = 1.0            # s; at most this much traffic is lost on a crash
+JOURNAL_EXT = '.tbj'
+
+
+def journal_path(directory, port_name, when=None):
+    port = re.sub(r'[^A-Za-z0-9]+', '_', port_name).strip('_')
+    stamp = (when or datetime.datetime.now()).strftime('%d_%m_%Y_%H%M%S')
+    return os.path.join(directory, f"serial_capture_{port}_{stamp}{JOURNAL_EXT}")
+
+
+class SerialJournal:
+
+    def __init__(self, path, port_name='', baud_rate=0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb', buffering=1 << 16)
+        self._t0 = time.monotonic_ns()
+        self._flushed = time.monotonic()
+        self.bytes = 0
+        self.chunks = 0
+        header = HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, HEADER_SIZE, baud_rate, time.time(),
+                                    port_name.encode('utf-8')[:32])
+        self._file.write(header.ljust(HEADER_SIZE, b'\x00'))
+
+    def record(self, direction, data):
+        if not data:
+            return
+        now = time.monotonic_ns()
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(RECORD_STRUCT.pack(now - self._t0, direction, len(data)))
+            self._file.write(data)
+            self.bytes += len(data)
+            self.chunks += 1
+            if now / 1e9 - self._flushed >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed = now / 1e9
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Serial port that copies every chunk read and written into a SerialJournal
+class CapturingSerial:
+
+    def __init__(self, ser, journal):
+        self.ser = ser
+        self.journal = journal
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.journal.record(RX, data)
+        return data
+
+    def write(self, data):
+        written = self.ser.write(data)
+        self.journal.record(TX, bytes(data))
+        return written
+
+    def close(self):
+        try:
+            self.ser.close()
+        finally:
+            self.journal.close()
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+
+def read_header(handle, path=''):
+    raw = handle.read(HEADER_SIZE)
+    if len(raw) < HEADER_STRUCT.size or raw[:8] != MAGIC:
+        raise ValueError(f"{path}: not a serial capture journal")
+    fields = HEADER_STRUCT.unpack_from(raw)
+    return {'version': fields[1], 'header_size': fields[2], 'baud_rate': fields[3], 'started': fields[4],
+            'port': fields[5].rstrip(b'\x00').decode('utf-8', errors='replace')}
+
+
+# (header, iterator of (seconds since start, direction, bytes)); a truncated last record is ignored
+def read_journal(path):
+    handle = open_file(path, 'rb')
+    header = read_header(handle, path)
+    handle.read(header['header_size'] - HEADER_SIZE)
+
+    def records():
+        with handle:
+            while True:
+                raw = handle.read(RECORD_STRUCT.size)
+                if len(raw) < RECORD_STRUCT.size:
+                    return
+                ns, direction, length = RECORD_STRUCT.unpack(raw)
+                data = handle.read(length)
+                if len(data) < length:
+                    return
+                yield ns / 1e9, direction, data
+    return header, records()
+
+
+# Serial port that plays back the RX chunks of a journal at their original pace divided by speed
+# (speed None: as fast as they are read). Writes are counted and dropped. clock() is the original
+# wall clock of the last chunk read, for SerialReader.
+class ReplaySerial:
+
+    def __init__(self, path, speed=1.0, timeout=1):
+        self.header, records = read_journal(path)
+        self.name = self.header['port']
+        self._records = ((t, data) for t, direction, data in records if direction == RX)
+        self.speed = speed
+        self.timeout = timeout
+        self.finished = threading.Event()
+        self._closed = threading.Event()
+        self._buffer = bytearray()
+        self._pending = next(self._records, None)
+        self._arrival = self.header['started']
+        self._t0 = None
+        self.chunks = 0
+        self.bytes = 0
+        self.written = 0
+        self.is_open = True
+
+    # monotonic time at which the chunk recorded at t is delivered (the first one right away)
+    def _due(self, t):
+        if not self.speed:
+            return 0
+        if self._t0 is None:
+            self._t0 = time.monotonic() - t / self.speed
+        return self._t0 + t / self.speed
+
+    def _take(self):
+        t, data = self._pending
+        self._buffer += data
+        self._arrival = self.header['started'] + t
+        self.chunks += 1
+        self.bytes += len(data)
+        self._pending = next(self._records, None)
+
+    # Move the next chunk into the buffer once it is due. One chunk at a time, so every line gets
+    # the arrival time of its own chunk even when the replay runs behind or at max speed.
+    def _release(self):
+        if not self._buffer and self._pending is not None and self._due(self._pending[0]) <= time.monotonic():
+            self._take()
+
+    def read(self, size=1):
+        if self._closed.is_set():
+            raise serial.SerialException("replay closed")
+        if not self._buffer:
+            self._release()
+        if not self._buffer:
+            wait = self.timeout if self._pending is None else min(self.timeout, self._due(self._pending[0]) - time.monotonic())
+            if self._closed.wait(max(wait, 0)):
+                raise serial.SerialException("replay closed")
+            self._release()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        if self._pending is None and not self._buffer:
+            self.finished.set()
+        return data
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self._buffer)
+
+    def write(self, data):
+        self.written += 1
+        return len(data)
+
+    def clock(self):
+        return self._arrival
+
+    def close(self):
+        self.is_open = False
+        self._closed.set()
+
+
+# Replay a journal through the acquisition pipeline into output_path; returns the replay statistics
+def replay(path, output_path, speed=1.0, board_id=0, quiet=False):
+    from acquisition_engine import AcquisitionEngine
+    os.makedirs(output_path, exist_ok=True)
+    ser = ReplaySerial(path, speed)
+    engine = AcquisitionEngine(lambda cmd, payload, board: protocol.frame(board, cmd, payload), output_path)
+    engine.configure([(ser.name, board_id, 0)], serial_ports={ser.name: ser})
+    port = engine.ports[ser.name]
+    port.reader.clock = ser.clock
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')) if quiet else contextlib.nullcontext():
+        # only the reader, the routing and the writers: no trigger, no time synchronization
+        port.start()
+        ser.finished.wait()
+        # end the stream: the reader queues None after the last line, routed is set once it is consumed
+        port.reader.stop(timeout=0)
+        ser.close()
+        port.routed.wait()
+        elapsed = time.perf_counter() - t0
+        engine.stop()
+    return {'chunks': ser.chunks, 'bytes': ser.bytes, 'lines': port.reader.lines_read, 'seconds': round(elapsed, 3),
+            'lines_per_s': round(port.reader.lines_read / elapsed, 1) if elapsed else None}
+
+
+# One line per record: time, direction, length and the bytes (escaped)
+def dump(path, output=sys.stdout):
+    header, records = read_journal(path)
+    started = datetime.datetime.fromtimestamp(header['started'])
+    output.write(f"# {header['port']} at {header['baud_rate']} baud, started {started:%d/%m/%Y %H:%M:%S}\n")
+    for t, direction, data in records:
+        output.write(f"{t:12.6f}  {'TX' if direction == TX else 'RX'}  {len(data):5d}  {data!r}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serial capture journals: listing and replay")
+    commands = parser.add_subparsers(dest='command', required=True)
+    dump_parser = commands.add_parser('dump', help="list the chunks of a journal")
+    dump_parser.add_argument('journal')
+    replay_parser = commands.add_parser('replay', help="replay a journal through the acquisition pipeline")
+    replay_parser.add_argument('journal')
+    replay_parser.add_argument('--output', required=True, help="folder for the replayed output files")
+    replay_parser.add_argument('--speed', default='1', help="time scale (1 = real time, 10 = ten times faster) or max")
+    replay_parser.add_argument('--board', type=int, default=0, help="board ID of the replayed lines")
+    replay_parser.add_argument('--quiet', action='store_true', help="do not echo the lines")
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        dump(args.journal)
+        return
+    speed = None if args.speed == 'max' else float(args.speed)
+    result = replay(args.journal, args.output, speed, args.board, args.quiet)
+    print(f"Replayed {result['chunks']} chunks ({result['bytes']} bytes, {result['lines']} lines) in "
+          f"{result['seconds']} s: {result['lines_per_s']} lines/s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
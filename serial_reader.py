@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+
+import serial
+
+# Bulk, event driven reader for the board serial stream.
+# A dedicated thread blocks on the port (up to the port timeout) until at least one byte
+# arrives, then drains everything already pending in a single read. Bytes are framed into
+# lines inside a reusable bytearray and every complete line is handed to a queue together
+# with its arrival time, so consumers never touch the port and writers never wait on reads.
+
+LINE_TERMINATOR = b'\n'
+READ_CHUNK_SIZE = 4096          # upper bound for a single drain of the input buffer
+RATE_WINDOW = 5.0               # seconds used for the live lines/s estimate
+
+
+class SerialReader:
+
+    # clock(): arrival time of the chunk just read (a replay gives the original times)
+    def __init__(self, ser, line_queue=None, chunk_size=READ_CHUNK_SIZE, clock=time.time):
+        self.ser = ser
+        self.clock = clock
+        self.lines = line_queue if line_queue is not None else queue.Queue()
+        self.chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._stop = threading.Event()
+        self._thread = None
+        # counters
+        self.lines_read = 0
+        self.bytes_read = 0
+        self._rate_t0 = time.monotonic()
+        self._rate_n0 = 0
+        self._rate = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="serial-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # block for the first byte, then drain whatever is already pending
+                chunk = self.ser.read(1)
+                if not chunk:
+                    continue
+                pending = self.ser.in_waiting
+                if pending:
+                    chunk += self.ser.read(min(pending, self.chunk_size))
+            except (serial.SerialException, OSError, TypeError) as e:
+                # port closed or unplugged: wake up consumers and exit
+                if not self._stop.is_set():
+                    print(f"[Reader] Serial read error: {e}")
+                break
+            self.feed(chunk, self.clock())
+        self.lines.put(None)
+
+    # Frame a chunk of bytes into lines. Incomplete tails stay in the buffer until the next chunk.
+    def feed(self, chunk, arrival=None):
+        if arrival is None:
+            arrival = time.time()
+        buf = self._buffer
+        buf += chunk
+        self.bytes_read += len(chunk)
+        start = 0
+        while True:
+            end = buf.find(LINE_TERMINATOR, start)
+            if end < 0:
+                break
+            line = buf[start:end].decode('utf-8', errors='ignore').strip()
+            start = end + 1
+            if line:
+                self.lines_read += 1
+                self.lines.put((arrival, line))
+        if start:
+            del buf[:start]
+
+    # Lines per second received over the last RATE_WINDOW seconds
+    def rate(self):
+        now = time.monotonic()
+        elapsed = now - self._rate_t0
+        if elapsed >= RATE_WINDOW:
+            self._rate = (self.lines_read - self._rate_n0) / elapsed
+            self._rate_t0 = now
+            self._rate_n0 = self.lines_read
+        return self._rate
+
+    def stats(self):
+        return {
+            'lines': self.lines_read,
+            'bytes': self.bytes_read,
+            'lines_per_s': round(self.rate(), 2),
+            'queued': self.lines.qsize(),
+        }
+
+
+# Synthetic getData line: board date, board time, 48 channel counts and status
+def synthetic_data_line(counts=1234, status=64):
+    return ("180525\t123456\t" + "\t".join([str(counts)] * 48) + f"\t{status}\n").encode('ascii')
+
+
+# Measure how many lines per second the framing path sustains when fed in bulk chunks
+def measure_throughput(n_lines=200000, chunk_size=READ_CHUNK_SIZE):
+    reader = SerialReader(ser=None)
+    payload = synthetic_data_line() * n_lines
+    t0 = time.perf_counter()
+    for i in range(0, len(payload), chunk_size):
+        reader.feed(payload[i:i + chunk_size])
+    elapsed = time.perf_counter() - t0
+    return {
+        'lines': reader.lines_read,
+        'seconds': round(elapsed, 4),
+        'lines_per_s': round(reader.lines_read / elapsed, 1),
+        'mbytes_per_s': round(len(payload) / elapsed / 1e6, 2),
+    }
+
+
+if __name__ == '__main__':
+    result = measure_throughput()
+    print(f"Framed {result['lines']} lines in {result['seconds']} s: "
+          f"{result['lines_per_s']} lines/s ({result['mbytes_per_s']} MB/s)")
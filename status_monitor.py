@@ -0,0 +1,118 @@
+import collections
+import datetime
+import threading
+import time
+
+import protocol
+
+# Status word of one board, decoded as the records stream in.
+# Every data line, '>Status: N' reply and '>Data req with Count Deactivated!' reply goes through
+# observe(); an unchanged word costs one comparison, only the bits that changed produce events.
+# Edges:
+#   - fault bit set (SD error, temperature, voltage, SD file limit): alarm; cleared: info
+#   - acquisition on -> off: alarm, unless a stop or reset was sent to the board (expect_stop)
+#   - acquisition off -> on: info
+# Since the periodic getdata returns either data lines or the deactivated reply, a fault or an
+# unexpected stop is seen at most one trigger period after it happens.
+# Notifications (command log + console, the GUI reads the events) are rate limited per bit: a bit
+# changing again within ALARM_HOLDOFF is only counted, and once the holdoff is over one summary
+# line gives the number of changes and the current state. All the edges are kept in events.
+
+ALARM_HOLDOFF = 300.0           # s between notifications of the same status bit
+EVENTS_KEPT = 200
+
+# level: 'alarm' or 'info'; source: 'data', 'getstatus' or 'getdata'
+StatusEvent = collections.namedtuple('StatusEvent', ['time', 'bit', 'name', 'set', 'level', 'source', 'word', 'text'])
+
+
+class StatusMonitor:
+
+    # notify(event): called for every event that passes the rate limit (level 'alarm' or 'info')
+    def __init__(self, notify=None, holdoff=ALARM_HOLDOFF):
+        self.notify = notify
+        self.holdoff = holdoff
+        self.word = None                # last status word seen, None before the first one
+        self.changed = None             # datetime of the last change of the word
+        self.stop_expected = False
+        self.events = collections.deque(maxlen=EVENTS_KEPT)
+        self.edges = 0
+        self.alarms = 0
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._notified = {}             # bit -> monotonic time of the last notification
+        self._pending = {}              # bit -> (changes not notified, last event)
+
+    # A stop or reset was sent: the acquisition going off is not an alarm
+    def expect_stop(self):
+        self.stop_expected = True
+
+    def observe(self, word, when=None, source='data'):
+        if word == self.word and not self._pending:
+            return
+        when = when or datetime.datetime.now()
+        if self._pending:
+            self._flush(time.monotonic())
+        previous = self.word
+        if word == previous:
+            return
+        self.word = word
+        self.changed = when
+        changed = word if previous is None else word ^ previous
+        for bit, name in protocol.STATUS_BITS.items():
+            if changed & bit:
+                self._edge(bit, name, bool(word & bit), when, source, word)
+
+    # '>Data req with Count Deactivated!': the acquisition is off, the other bits are unknown
+    def observe_stopped(self, when=None, source='getdata'):
+        self.observe((self.word or 0) & ~protocol.STATUS_ACQUISITION_ON, when, source)
+
+    def _is_alarm(self, bit, is_set):
+        if bit == protocol.STATUS_ACQUISITION_ON:
+            return not is_set and not self.stop_expected
+        return is_set
+
+    def _edge(self, bit, name, is_set, when, source, word):
+        if bit == protocol.STATUS_ACQUISITION_ON:
+            text = "acquisition on" if is_set else "acquisition stopped" + ("" if self.stop_expected else " unexpectedly")
+        else:
+            text = name if is_set else name + " cleared"
+        level = 'alarm' if self._is_alarm(bit, is_set) else 'info'
+        if bit == protocol.STATUS_ACQUISITION_ON and is_set:
+            self.stop_expected = False
+        event = StatusEvent(when, bit, name, is_set, level, source, word, text)
+        with self._lock:
+            self.events.append(event)
+            self.edges += 1
+            if level == 'alarm':
+                self.alarms += 1
+        now = time.monotonic()
+        last = self._notified.get(bit)
+        if last is not None and now - last < self.holdoff:
+            count, _ = self._pending.get(bit, (0, None))
+            self._pending[bit] = (count + 1, event)
+            self.suppressed += 1
+            return
+        self._notified[bit] = now
+        self._emit(event)
+
+    # Summary of the bits whose holdoff is over
+    def _flush(self, now):
+        for bit, (count, event) in list(self._pending.items()):
+            if now - self._notified[bit] >= self.holdoff:
+                del self._pending[bit]
+                self._notified[bit] = now
+                is_set = bool(self.word & bit)
+                self._emit(event._replace(text=f"{event.name}: {count} more change(s), now {'set' if is_set else 'clear'}",
+                                          set=is_set, level='alarm' if self._is_alarm(bit, is_set) else 'info'))
+
+    def _emit(self, event):
+        if self.notify is not None:
+            self.notify(event)
+
+    # Latest events, newest first
+    def recent(self, n=10):
+        with self._lock:
+            return list(self.events)[-n:][::-1]
+
+    def describe(self):
+        return "unknown" if self.word is None else f"{self.word} ({protocol.describe_status(self.word)})"
@@ -0,0 +1,79 @@
+import datetime
+import glob
+import os
+import time
+
+import pytest
+
+import protocol
+from acquisition_engine import AcquisitionEngine
+
+pytest.importorskip('pty')
+from board_simulator import PtyBoardSimulator, VirtualBoard     # noqa: E402
+
+
+def format_command(cmd, payload, board_id):
+    return protocol.frame(board_id, cmd, payload)
+
+
+def lines_of(directory, pattern):
+    (path,) = glob.glob(os.path.join(directory, pattern))
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_idle_polls_are_logged_once(tmp_path, capsys):
+    engine = AcquisitionEngine(format_command, str(tmp_path))
+    engine.configure([('COM9', 0, 20)], serial_ports={'COM9': object()})
+    board = engine.boards[0]
+    t0 = datetime.datetime(2026, 10, 18, 12, 0, 0).timestamp()
+    for n in range(5):
+        board.handle_line(t0 + 20 * n, protocol.DATA_DEACTIVATED_REPLY)
+    board.handle_line(t0 + 100, "181026\t120140\t" + "\t".join(["1"] * 48) + "\t64")
+    board.handle_line(t0 + 120, protocol.DATA_DEACTIVATED_REPLY)
+    board.handle_line(t0 + 140, protocol.DATA_DEACTIVATED_REPLY)
+    board.close()
+    capsys.readouterr()
+    log = [line for line in lines_of(str(tmp_path), "command_log_*.txt") if "Deactivated" in line]
+    assert [line.split('\t', 1)[1] for line in log] == [
+        protocol.DATA_DEACTIVATED_REPLY,
+        f"[Trigger] COM9#0: 4 more '{protocol.DATA_DEACTIVATED_REPLY}' replies while stopped",
+        protocol.DATA_DEACTIVATED_REPLY,
+        f"[Trigger] COM9#0: 1 more '{protocol.DATA_DEACTIVATED_REPLY}' replies while stopped",
+    ]
+    assert log[1].startswith("18/10/2026 12:01:40")
+    assert len(lines_of(str(tmp_path), "received_data_*.txt")) == 1
+
+
+def test_boards_on_shared_and_separate_ports(tmp_path, capsys):
+    boards = [VirtualBoard(0, seed=1), VirtualBoard(1, seed=2), VirtualBoard(2, seed=3)]
+    # the status word tells the boards apart in the data files
+    boards[1].status = protocol.STATUS_SD_ERROR
+    bus, single = PtyBoardSimulator(boards[:2], line_rate=20).start(), PtyBoardSimulator(boards[2:], line_rate=20).start()
+    engine = AcquisitionEngine(format_command, str(tmp_path))
+    engine.configure([(bus.port, 0, 0.5), (bus.port, 1, 0.5), (single.port, 2, 0.5)])
+    try:
+        engine.start(trigger_delay=0)
+        for board in engine.boards:
+            board.send('start').result(5)
+        time.sleep(2)
+        engine.board(1).send('stop').result(5)
+        time.sleep(1)
+    finally:
+        engine.stop()
+        bus.stop()
+        single.stop()
+    capsys.readouterr()
+
+    assert len(engine.ports) == 2
+    for board_id, status in ((0, '64'), (1, '65'), (2, '64')):
+        data = lines_of(str(tmp_path), f"received_data_b{board_id:02d}_*.txt")
+        assert len(data) >= 20
+        assert all(line.rsplit('\t', 1)[1] == status for line in data)
+        assert os.path.exists(glob.glob(os.path.join(str(tmp_path), f"received_data_b{board_id:02d}_*.r1m"))[0])
+    log = lines_of(str(tmp_path), "command_log_b01_*.txt")
+    assert any(line.endswith(">ACK stop acquisition") for line in log)
+    assert any("[Alarm]" in line and "SD error" in line for line in log)
+    # the stop was sent by this process: no alarm for it
+    assert not any("unexpectedly" in line for line in log)
+    assert not any(">ACK stop" in line for line in lines_of(str(tmp_path), "command_log_b00_*.txt"))
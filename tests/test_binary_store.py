@@ -0,0 +1,63 @@
+import datetime
+import os
+
+import binary_store
+from data_parser import DataRecord, N_CHANNELS
+
+DAY = datetime.datetime(2026, 10, 17, 12, 0, 0)
+
+
+def record(n, status=64):
+    return DataRecord(1_792_238_400 + n, [n * 100 + ch for ch in range(N_CHANNELS)], status)
+
+
+def test_records_round_trip(tmp_path):
+    writer = binary_store.BinaryRecordWriter(str(tmp_path), board_id=5, thresholds={'a': 1300})
+    for n in range(10):
+        writer.write_record(record(n, 64 | n % 2), DAY)
+    writer.close()
+    (path,) = binary_store.find_chunks(str(tmp_path))
+    header, records = binary_store.open_chunk(path)
+    assert (header['board_id'], header['thresholds']) == (5, {'a': 1300})
+    assert records['timestamp'].tolist() == [record(n).timestamp for n in range(10)]
+    assert records['counts'][3].tolist() == record(3).counts
+    assert records['status'].tolist() == [64 | n % 2 for n in range(10)]
+
+
+def test_metadata_change_starts_a_new_chunk(tmp_path):
+    writer = binary_store.BinaryRecordWriter(str(tmp_path), board_id=1)
+    writer.write_record(record(0), DAY)
+    # the first record is still pending: it stays in the chunk of the old thresholds
+    writer.set_metadata(thresholds={'b': 900})
+    writer.write_record(record(1), DAY)
+    writer.write_record(record(2), DAY + datetime.timedelta(days=1))
+    writer.close()
+    chunks = binary_store.load_records(str(tmp_path), concatenate=False)
+    assert [os.path.basename(path)[-18:] for path in binary_store.find_chunks(str(tmp_path))] == [
+        '17_10_2026_000.bin', '17_10_2026_001.bin', '18_10_2026_000.bin']
+    assert [header['thresholds'] for header, records in chunks] == [{}, {'b': 900}, {'b': 900}]
+    assert [len(records) for header, records in chunks] == [1, 1, 1]
+    assert len(binary_store.load_records(str(tmp_path), start_day=DAY.date(), end_day=DAY.date())) == 2
+
+
+def test_header_is_rewritten_before_the_first_record(tmp_path):
+    writer = binary_store.BinaryRecordWriter(str(tmp_path))
+    writer.write_record(record(0), DAY)
+    writer.close()
+    writer = binary_store.BinaryRecordWriter(str(tmp_path), board_id=2)
+    writer.write_record(record(1), DAY)
+    writer.commit()
+    writer.set_metadata(board_id=3)
+    writer.close()
+    # a restart never appends to an existing chunk
+    assert [header['board_id'] for header, records in binary_store.load_records(str(tmp_path), concatenate=False)] == [0, 2, 3]
+
+
+def test_partial_record_is_ignored(tmp_path):
+    writer = binary_store.BinaryRecordWriter(str(tmp_path))
+    writer.write_record(record(0), DAY)
+    writer.close()
+    (path,) = binary_store.find_chunks(str(tmp_path))
+    with open(path, 'ab') as f:
+        f.write(b'\x01' * 10)
+    assert len(binary_store.open_chunk(path)[1]) == 1
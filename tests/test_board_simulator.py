@@ -0,0 +1,69 @@
+import datetime
+import os
+import select
+import time
+
+import pytest
+
+import protocol
+from board_simulator import VirtualBoard, PtyBoardSimulator
+
+
+def command(board, cmd, *args):
+    return board.handle(cmd, protocol.payload_from_args(cmd, list(args)))
+
+
+def test_acquisition_buffer_and_status():
+    board = VirtualBoard(3, seed=1)
+    assert command(board, 'getdata') == [protocol.DATA_DEACTIVATED_REPLY]
+    command(board, 'start')
+    assert command(board, 'getstatus') == [f">Status: {protocol.STATUS_ACQUISITION_ON}"]
+    for second in range(3):
+        board.tick(datetime.datetime(2026, 10, 18, 12, 0, second))
+    lines = command(board, 'getdata')
+    assert len(lines) == 3 and protocol.status_from_data_line(lines[-1]) == protocol.STATUS_ACQUISITION_ON
+    assert lines[0].startswith("181026\t120000\t")
+    command(board, 'stop')
+    assert command(board, 'getdata') == [protocol.DATA_DEACTIVATED_REPLY]
+
+
+def test_buffer_overflow_drops_the_buffer():
+    board = VirtualBoard(seed=1, buffer_size=5)
+    board.set_acquiring(True)
+    for _ in range(6):
+        board.tick()
+    assert board.lines_overflowed == 6 and board.buffer == []
+
+
+def test_setters_use_the_protocol_encoding():
+    board = VirtualBoard(1, seed=1)
+    assert command(board, 'setdac', 'c', '0.85') == [">ACK set DAC"] and board.thresholds['c'] == 850
+    command(board, 'setovert', '45.5')
+    command(board, 'setundv', '10')
+    assert (board.overt, board.undv) == (4550, 10000)
+    assert command(board, 'setid', '9') == [">ACK set ID 9"] and board.board_id == 9
+    assert board.handle('setdac', b'z0100') == [">Invalid DAC channel"]
+    assert board.handle('setid', b'') == [">Invalid payload"]
+
+
+def test_magic_id_addresses_every_board():
+    board = VirtualBoard(4)
+    assert board.addressed(4 + protocol.BOARD_ID_OFFSET)
+    assert board.addressed(protocol.BOARD_MAGIC_ID + protocol.BOARD_ID_OFFSET)
+    assert not board.addressed(5 + protocol.BOARD_ID_OFFSET)
+
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason="needs a pseudo-terminal")
+def test_boards_share_the_pty():
+    sim = PtyBoardSimulator([VirtualBoard(0, seed=1), VirtualBoard(1, seed=2)]).start()
+    try:
+        fd = os.open(sim.port, os.O_RDWR | os.O_NOCTTY)
+        os.write(fd, protocol.frame(1, 'getid') + protocol.frame(protocol.BOARD_MAGIC_ID, 'getstatus'))
+        received, deadline = b'', time.monotonic() + 5
+        while received.count(b'\n') < 3 and time.monotonic() < deadline:
+            if select.select([fd], [], [], 0.1)[0]:
+                received += os.read(fd, 4096)
+        os.close(fd)
+    finally:
+        sim.stop()
+    assert received.decode().split('\n')[:3] == [">Board ID: 1", ">Status: 0", ">Status: 0"]
@@ -0,0 +1,94 @@
+import threading
+import time
+import types
+
+import pytest
+
+import protocol
+from command_dispatcher import CommandDispatcher, PRIORITY_INTERACTIVE, PRIORITY_PERIODIC
+
+BOARD = types.SimpleNamespace(board_id=1)
+DATA = ["181026\t120000\t1\t64", "181026\t120001\t2\t64"]
+
+
+# Port whose board answers every written frame with replies[command name] (a list of lines)
+class FakePort:
+
+    def __init__(self, replies):
+        self.name = 'fake'
+        self.current = None
+        self.ser = self
+        self.replies = replies
+        self.written = []
+        self.dispatcher = CommandDispatcher(self, timeout=0.05, retries=2).start()
+
+    def write(self, frame):
+        cmd = protocol.decode_frame(frame).command
+        self.written.append(cmd)
+        reply = self.replies.get(cmd, [])
+        for line in reply() if callable(reply) else reply:
+            self.dispatcher.on_line(line)
+        return len(frame)
+
+    def send(self, cmd, priority=PRIORITY_INTERACTIVE):
+        return self.dispatcher.submit(BOARD, protocol.frame(1, cmd), priority)
+
+
+@pytest.fixture
+def port():
+    port = FakePort({'getstatus': [">Status: 64"], 'getdata': DATA + ["stray >"],
+                     'start': ["181026\t120002\t3\t64", ">ACK start acquisition"]})
+    yield port
+    port.dispatcher.stop()
+
+
+def test_command_gets_its_ack(port):
+    assert port.send('getstatus').result(1) == [">Status: 64"]
+    # data lines arriving before the ACK are not part of the answer
+    assert port.send('start').result(1) == [">ACK start acquisition"]
+    assert port.current is BOARD
+
+
+def test_getdata_burst_ends_on_silence(port):
+    assert port.send('getdata').result(1) == DATA + ["stray >"]
+    port.replies['getdata'] = [protocol.DATA_DEACTIVATED_REPLY]
+    assert port.send('getdata').result(1) == [protocol.DATA_DEACTIVATED_REPLY]
+
+
+def test_unanswered_command_is_retried_then_times_out(port):
+    assert isinstance(port.send('getid').exception(1), TimeoutError)
+    assert port.written == ['getid'] * 3 and port.dispatcher.stats()['retried'] == 2
+
+
+def test_silent_getdata_is_an_empty_burst(port):
+    port.replies['getdata'] = []
+    assert port.send('getdata').result(1) == []
+    # getdata, reset and setid are never repeated
+    assert isinstance(port.send('reset').exception(1), TimeoutError)
+    assert port.written == ['getdata', 'reset']
+
+
+def test_interactive_commands_overtake_the_periodic_ones(port):
+    release = threading.Event()
+    port.replies['gettemp'] = lambda: [">Temp"] if release.wait(1) else []
+    first = port.send('gettemp')
+    periodic = [port.send('getdata', PRIORITY_PERIODIC) for _ in range(2)]
+    interactive = port.send('getstatus')
+    release.set()
+    for future in [first, interactive] + periodic:
+        future.result(1)
+    assert port.written == ['gettemp', 'getstatus', 'getdata', 'getdata']
+
+
+def test_stop_cancels_the_queued_frames(port):
+    release = threading.Event()
+    port.replies['gettemp'] = lambda: [">Temp"] if release.wait(1) else []
+    first = port.send('gettemp')
+    queued = port.send('getstatus')
+    stopper = threading.Thread(target=port.dispatcher.stop)
+    stopper.start()
+    while port.dispatcher.pending() < 2:
+        time.sleep(0.001)
+    release.set()
+    stopper.join()
+    assert first.result(1) == [">Temp"] and queued.cancelled()
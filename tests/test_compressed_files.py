@@ -0,0 +1,59 @@
+import datetime
+import os
+import time
+
+import pytest
+
+import compressed_files
+
+CONTENT = b"".join(b"18/10/2026 10:00:%02d\t1\t2\t3\n" % (s % 60) for s in range(5000))
+
+
+def daily_file(tmp_path):
+    path = tmp_path / "received_data_17_10_2026.txt"
+    path.write_bytes(CONTENT)
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    return str(path)
+
+
+@pytest.mark.parametrize('ext', list(compressed_files.CODECS))
+def test_round_trip(tmp_path, ext):
+    path = daily_file(tmp_path)
+    size, compressed = compressed_files.compress_file(path, ext)
+    target = path + ext
+    assert (size, compressed) == (len(CONTENT), os.path.getsize(target))
+    assert not os.path.exists(path) and not os.path.exists(target + compressed_files.TMP_EXT)
+    assert os.path.getmtime(target) == 1_700_000_000
+    assert compressed_files.resolve(path) == target
+    assert compressed_files.glob_files(str(tmp_path / "received_data_*.txt")) == [target]
+    with compressed_files.open_file(target, 'rb') as f:
+        assert f.read() == CONTENT
+    with compressed_files.open_file(target, 'r') as f:
+        f.seek(len(CONTENT) // 2)
+        assert f.read() == CONTENT[len(CONTENT) // 2:].decode('ascii')
+
+
+def test_copy_that_does_not_match_is_discarded(tmp_path, monkeypatch):
+    path = daily_file(tmp_path)
+    monkeypatch.setattr(compressed_files, '_digest', lambda handle: ('0' * 64, len(CONTENT)))
+    with pytest.raises(ValueError):
+        compressed_files.compress_file(path)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_compressor_sweeps_closed_days_only(tmp_path):
+    old = daily_file(tmp_path)
+    today = tmp_path / "received_data_18_10_2026.txt"
+    today.write_bytes(CONTENT)
+    stale = tmp_path / ("received_data_16_10_2026.txt.xz" + compressed_files.TMP_EXT)
+    stale.write_bytes(b"partial")
+    compressor = compressed_files.Compressor().start()
+    compressor.sweep(str(tmp_path), ['received_data'], today=datetime.date(2026, 10, 18))
+    deadline = time.monotonic() + 10
+    while compressor.compressed + compressor.failed < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    compressor.stop()
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(old) + '.xz', today.name]
+    assert compressor.stats()['compressed'] == 1
@@ -0,0 +1,57 @@
+import numpy as np
+
+import data_parser
+
+GOOD = "18/10/2026 10:00:{s:02d}\t181026\t1000{s:02d}\t" + "\t".join(str(ch * 10) for ch in range(48)) + "\t{status}"
+BOARD = "181026\t100100\t" + "\t".join(str(ch + 7) for ch in range(48)) + "\t65"
+BAD = [
+    "18/10/2026 10:00:59\t181026\t100059\t" + "\t".join(["1"] * 47) + "\t64",        # 47 channels
+    "18/10/2026 10:00:59\t181026\t100059\t" + "\t".join(["1"] * 48) + "\t256",       # status out of range
+    "18/10/2026 10:00:59\t310226\t100059\t" + "\t".join(["1"] * 48) + "\t64",        # 31 February
+    "18/10/2026 10:00:59\t181026\t106059\t" + "\t".join(["1"] * 48) + "\t64",        # minute 60
+    "18/10/2026 10:00:59\t181026\t100059\t" + "\t".join(["x"] * 48) + "\t64",
+    ">Data req with Count Deactivated!",
+]
+
+
+def write_file(tmp_path):
+    lines = [GOOD.format(s=s, status=64 + s % 2) for s in range(20)]
+    lines[5:5] = BAD[:3]
+    lines[12:12] = [BOARD, "", "   "] + BAD[3:]
+    path = tmp_path / "received_data_18_10_2026.txt"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_bulk_and_streaming_parsers_agree(tmp_path):
+    path = write_file(tmp_path)
+    bulk_issues, stream_issues = [], []
+    arrays = data_parser.load_data_file(path, bulk_issues)
+    records = list(data_parser.iter_records(path, stream_issues))
+    assert len(records) == 21
+    assert arrays.timestamps.tolist() == [r.timestamp for r in records]
+    assert arrays.counts.T.tolist() == [r.counts for r in records]
+    assert arrays.status.tolist() == [r.status for r in records]
+    assert arrays.counts.dtype == np.uint32 and arrays.counts.shape == (48, 21)
+    assert [issue.line_no for issue in bulk_issues] == [issue.line_no for issue in stream_issues]
+    assert len(bulk_issues) == len(BAD)
+
+
+def test_board_time_is_seconds_since_1970():
+    record = data_parser.parse_data_line(BOARD)
+    assert data_parser.timestamp_to_datetime(record.timestamp).isoformat() == "2026-10-18T10:01:00"
+    assert record.counts[0] == 7 and record.status == 65
+
+
+def test_empty_data():
+    arrays = data_parser.parse_data_bytes(b"")
+    assert len(arrays.timestamps) == 0 and arrays.counts.shape == (48, 0)
+
+
+def test_command_log_entries(tmp_path):
+    path = tmp_path / "command_log_18_10_2026.txt"
+    path.write_text("18/10/2026 10:00:00\t>Status: 64\r\n\nnot a timestamp\t>ACK\n18/10/2026 10:00:05\t>ACK\n")
+    issues = []
+    entries = list(data_parser.iter_log_entries(str(path), issues))
+    assert [(e.time.second, e.text) for e in entries] == [(0, ">Status: 64"), (5, ">ACK")]
+    assert [(i.line_no, i.reason) for i in issues] == [(3, "bad timestamp")]
@@ -0,0 +1,48 @@
+import datetime
+import os
+
+import pytest
+
+from output_writers import DailyFileWriter, CommitPolicy, LINE_END
+
+DAY = datetime.datetime(2026, 10, 17, 23, 59, 58)
+NEXT_DAY = datetime.datetime(2026, 10, 18, 0, 0, 1)
+
+
+def test_offsets_and_daily_rotation(tmp_path):
+    closed = []
+    writer = DailyFileWriter(str(tmp_path), 'received_data', on_rollover=closed.append)
+    assert writer.write_line("first", DAY) == 0
+    assert writer.write_line("second", DAY) == len(b"first" + LINE_END)
+    assert writer.write_line("third", NEXT_DAY) == 0
+    writer.close()
+    old = tmp_path / "received_data_17_10_2026.txt"
+    assert old.read_bytes() == b"first" + LINE_END + b"second" + LINE_END
+    assert (tmp_path / "received_data_18_10_2026.txt").read_bytes() == b"third" + LINE_END
+    assert closed == [str(old)]
+
+
+def test_existing_file_is_appended(tmp_path):
+    (tmp_path / "command_log_17_10_2026.txt").write_bytes(b"before\n")
+    writer = DailyFileWriter(str(tmp_path), 'command_log')
+    assert writer.write_line("after", DAY) == len(b"before\n")
+    writer.close()
+
+
+def test_batched_policy_commits_every_n_lines(tmp_path):
+    writer = DailyFileWriter(str(tmp_path), 'received_data', CommitPolicy(every_lines=3))
+    path = writer.path_for(DAY.date())
+    for n in range(2):
+        writer.write_line(str(n), DAY)
+    assert os.path.getsize(path) == 0 and writer.stats()['pending'] == 2
+    writer.write_line("2", DAY)
+    assert os.path.getsize(path) == 3 * (1 + len(LINE_END)) and writer.commits == 1
+    writer.write_line("3", DAY)
+    writer.close()
+    assert writer.lines_written == 4 and writer.commits == 2
+
+
+@pytest.mark.parametrize('kwargs', [{'every_lines': 0}, {'every_ms': 0}])
+def test_invalid_policies(kwargs):
+    with pytest.raises(ValueError):
+        CommitPolicy(**kwargs)
@@ -0,0 +1,88 @@
+import datetime
+
+import pytest
+
+import protocol
+
+BOARD_IDS = [0, 1, protocol.MAX_BOARD_ID - 1, protocol.MAX_BOARD_ID, protocol.BOARD_MAGIC_ID]
+
+
+@pytest.mark.parametrize('board_id', BOARD_IDS)
+def test_fixed_frames_round_trip(board_id):
+    for cmd in protocol.OPCODES:
+        if cmd in protocol.PAYLOAD_COMMANDS:
+            continue
+        data = protocol.frame(board_id, cmd)
+        assert data.startswith(protocol.CMD_TERMINATOR) and data.endswith(protocol.CMD_TERMINATOR)
+        assert protocol.decode_frame(data) == protocol.Frame(board_id, cmd, None)
+
+
+@pytest.mark.parametrize('cmd, args, value', [
+    ('setdac', ['c', '1.5'], ('c', 1500)),
+    ('setdac', ['H', '0'], ('h', 0)),
+    ('setid', ['42'], 42),
+    ('setid', ['0'], 0),
+    ('setid', ['63'], 63),
+    ('setid', ['67'], protocol.BOARD_MAGIC_ID),
+    ('setoverv', ['12.5'], 12500),
+    ('setundv', ['0.1'], 100),
+    ('setovert', ['45.25'], 4525),
+    ('setundt', ['-25.5'], -2550),
+])
+def test_payload_round_trip(cmd, args, value):
+    data = protocol.frame(7, cmd, protocol.payload_from_args(cmd, args))
+    assert protocol.decode_frame(data) == protocol.Frame(7, cmd, value)
+
+
+def test_date_time_round_trip():
+    now = datetime.datetime(2026, 10, 18, 9, 5, 7)
+    date = protocol.decode_frame(protocol.frame(3, 'setdate', protocol.payload_from_args('setdate', [], now)))
+    time = protocol.decode_frame(protocol.frame(3, 'settime', protocol.payload_from_args('settime', [], now)))
+    assert date.value == now.date()
+    assert time.value == now.time()
+
+
+def test_command_is_case_insensitive():
+    assert protocol.frame(5, 'GetData') == protocol.frame(5, 'getdata')
+
+
+@pytest.mark.parametrize('board_id', [-1, protocol.MAX_BOARD_ID + 1, 66, 68, 255, '1'])
+def test_invalid_board_ids_are_rejected(board_id):
+    with pytest.raises(ValueError):
+        protocol.frame(board_id, 'getdata')
+
+
+@pytest.mark.parametrize('new_id', [-1, protocol.MAX_BOARD_ID + 1, 66, 1.0])
+def test_setid_rejects_invalid_ids(new_id):
+    with pytest.raises(ValueError):
+        protocol.encode_board_id(new_id)
+
+
+@pytest.mark.parametrize('cmd, payload', [
+    ('setdac', b''),
+    ('getdata', b'x'),
+    ('setdac', b'a\n100'),
+    ('nosuchcommand', b''),
+])
+def test_malformed_frames_are_rejected(cmd, payload):
+    with pytest.raises(ValueError):
+        protocol.frame(1, cmd, payload)
+
+
+@pytest.mark.parametrize('encode, value', [
+    (lambda v: protocol.encode_dac('a', v), protocol.DAC_MAX_MV + 1),
+    (lambda v: protocol.encode_dac('i', v), 100),
+    (protocol.encode_voltage, protocol.VOLTAGE_MAX_MV + 1),
+    (protocol.encode_temperature, -protocol.TEMPERATURE_MAX_CC - 1),
+])
+def test_payload_bounds(encode, value):
+    with pytest.raises(ValueError):
+        encode(value)
+
+
+def test_status_decoding():
+    assert protocol.status_from_reply('>Status: 65') == 65
+    assert protocol.status_from_reply('>Status: x') is None
+    assert protocol.status_from_data_line('180525\t123456\t1\t2\t64') == 64
+    assert protocol.status_from_data_line(protocol.DATA_DEACTIVATED_REPLY) is None
+    assert protocol.describe_status(0) == 'none'
@@ -0,0 +1,64 @@
+import datetime
+import os
+
+import numpy as np
+
+import data_parser
+import rollups
+
+START = datetime.datetime(2026, 10, 17, 23, 57, 30)
+N_RECORDS = 7 * 60 + 11                 # across two hours and midnight (board time)
+
+
+def board_line(when, n):
+    counts = "\t".join(str((n * 7 + ch * 13) % 1000) for ch in range(48))
+    return f"{when:%d%m%y}\t{when:%H%M%S}\t{counts}\t{64 | (n % 3 == 0)}"
+
+
+def write_day(directory, crash=False):
+    path = os.path.join(directory, "received_data_17_10_2026.txt")
+    writer = rollups.RollupWriter()
+    with open(path, 'w') as f:
+        for n in range(N_RECORDS):
+            when = START + datetime.timedelta(seconds=n)
+            line = board_line(when, n)
+            f.write(f"{when:%d/%m/%Y %H:%M:%S}\t{line}\n")
+            writer.observe(path, data_parser.parse_data_line(line))
+    if not crash:
+        writer.close()
+    return path
+
+
+def fields(entries):
+    return {name: entries[name].tolist() for name in ('start', 'records', 'status', 'sum', 'min', 'max', 'sumsq')}
+
+
+def test_online_roll_ups_equal_rebuilt_ones(tmp_path):
+    path = write_day(str(tmp_path))
+    online = {r: rollups.load_rollups(path, r) for r in rollups.RESOLUTIONS}
+    rollups.rebuild_rollups(path)
+    for resolution, entries in online.items():
+        rebuilt = rollups.load_rollups(path, resolution)
+        assert fields(entries) == fields(rebuilt)
+        assert int(entries['records'].sum()) == N_RECORDS
+    assert len(online[60]) == 8 and len(online[3600]) == 2
+
+
+def test_query_merges_and_derives_statistics(tmp_path):
+    path = write_day(str(tmp_path))
+    result = rollups.query_rollups(str(tmp_path), START, START + datetime.timedelta(hours=1), 60, channels=[1, 48])
+    arrays = data_parser.load_data_file(path)
+    first = arrays.counts[:, arrays.timestamps - arrays.timestamps % 60 == result.start[0]].astype(np.float64)
+    assert result.records.sum() == N_RECORDS
+    assert np.allclose(result.mean[:, 0], first[[0, 47]].mean(axis=1))
+    assert np.allclose(result.variance[:, 0], first[[0, 47]].var(axis=1))
+
+
+def test_query_repairs_the_windows_lost_in_a_crash(tmp_path):
+    path = write_day(str(tmp_path), crash=True)
+    for resolution in rollups.RESOLUTIONS:
+        os.utime(rollups.rollup_path_for(path, resolution), (1_700_000_000, 1_700_000_000))
+    stop = START + datetime.timedelta(hours=1)
+    assert rollups.query_rollups(str(tmp_path), START, stop, 60).records.sum() == N_RECORDS
+    # an older day: the repaired roll-ups are written back
+    assert int(rollups.load_rollups(path, 60)['records'].sum()) == N_RECORDS
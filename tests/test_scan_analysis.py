@@ -0,0 +1,64 @@
+import math
+
+import pytest
+
+import scan_analysis as sa
+
+HEADER = "DATE\tTIME\t" + "".join(f"CH_{ch + 1:02d}\t" for ch in range(sa.N_CHANNELS)) + "THRESHOLD\n"
+
+
+# Noise falling by e every 15 mV over a flat signal of 50 counts/s that ends at 600 mV
+def rate(mv):
+    return 50 + 1e4 * math.exp(-mv / 15) if mv <= 600 else 0
+
+
+def write_scan(path, thresholds=range(0, 801, 10), rows=3):
+    with open(path, "w") as f:
+        f.write(HEADER)
+        for mv in thresholds:
+            counts = "\t".join(str(round(rate(mv))) for _ in range(sa.N_CHANNELS))
+            f.writelines(f"010125\t120000\t{counts}\t{mv / 1000:.3f}\n" for _ in range(rows))
+    return str(path)
+
+
+def test_knee_plateau_and_setpoints(tmp_path):
+    result = sa.analyse_file(write_scan(tmp_path / "thrscan.csv"))
+    assert list(result.thresholds) == list(range(0, 801, 10))
+    assert all(100 <= knee <= 160 for knee in result.knee)
+    assert all(580 <= end <= 600 for end in result.plateau_end)
+    assert all(result.noise_edge < result.knee)
+    assert all(setpoint == result.knee.max() + sa.SETPOINT_MARGIN for setpoint in result.setpoints.values())
+
+
+def test_scans_of_the_same_board_are_combined(tmp_path):
+    even = write_scan(tmp_path / "even.csv", range(0, 801, 20))
+    odd = write_scan(tmp_path / "odd.csv", range(10, 801, 20))
+    curves = sa.load_scans([even, odd])
+    assert list(curves.thresholds) == list(range(0, 801, 10))
+    assert (curves.rows == 3).all()
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_empty_and_header_only_files_are_skipped(tmp_path, jobs):
+    good = write_scan(tmp_path / "good.csv")
+    empty = tmp_path / "empty.csv"
+    empty.write_text("")
+    header_only = tmp_path / "header.csv"
+    header_only.write_text(HEADER)
+    missing = tmp_path / "missing.csv"
+    results, skipped = sa.analyse_files([str(empty), good, str(header_only), str(missing)], jobs)
+    assert [result.path for result in results] == [good]
+    assert [path for path, _ in skipped] == [str(empty), str(header_only), str(missing)]
+    assert all(reason for _, reason in skipped)
+
+
+def test_combine_skips_unreadable_files(tmp_path):
+    good = write_scan(tmp_path / "good.csv")
+    empty = tmp_path / "empty.csv"
+    empty.write_text("")
+    skipped = []
+    curves = sa.load_scans([good, str(empty)], skipped)
+    assert len(curves.thresholds) == 81
+    assert skipped == [(str(empty), "empty file")]
+    with pytest.raises(ValueError):
+        sa.load_scans([str(empty)])
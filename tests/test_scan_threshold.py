@@ -0,0 +1,153 @@
+import math
+import os
+
+import pytest
+import serial
+
+import scan_threshold as st
+from scan_threshold import DwellPolicy, N_CHANNELS
+
+needs_pty = pytest.mark.skipif(not hasattr(os, 'openpty'), reason="needs a pseudo-terminal")
+
+
+# Seconds counted on a step whose channels count `rates` (counts/s, exact), as acquire_step does it
+def dwell_of(policy, rates):
+    dwell, sums = 0, [0] * N_CHANNELS
+    while True:
+        dwell = min(dwell + max(1, round(policy.next_wait(dwell, sums))), policy.max_dwell)
+        sums = [rate * dwell for rate in rates]
+        if policy.done(dwell, sums, dwell):
+            return dwell
+
+
+ADAPTIVE = DwellPolicy(target_error=0.01, max_dwell=st.MAX_DWELL)
+
+
+def test_fixed_dwell():
+    assert dwell_of(DwellPolicy(), [0] * N_CHANNELS) == st.FIXED_DWELL
+
+
+def test_busy_step_stops_at_the_target():
+    # 10000 counts needed for 1 %: 20 s at 500 cps
+    assert dwell_of(ADAPTIVE, [500] * N_CHANNELS) == 20
+
+
+@pytest.mark.parametrize('rate', [0, 0.05, 1])
+def test_empty_steps_end_at_the_base_dwell(rate):
+    assert dwell_of(ADAPTIVE, [rate] * N_CHANNELS) == st.MIN_DWELL
+
+
+def test_dead_channel_does_not_hold_a_busy_step():
+    assert dwell_of(ADAPTIVE, [0] + [500] * (N_CHANNELS - 1)) == 20
+
+
+def test_step_that_cannot_reach_the_target_runs_to_max_dwell():
+    assert dwell_of(ADAPTIVE, [20] * N_CHANNELS) == st.MAX_DWELL
+
+
+def test_only_selected_channels_count():
+    policy = DwellPolicy(target_error=0.01, max_dwell=st.MAX_DWELL, channels=st.parse_channels("1-6"))
+    assert dwell_of(policy, [1000] * 6 + [20] * (N_CHANNELS - 6)) == 10
+
+
+# Drive a steps object with group rates given by rate(group, mV); returns the steps measured
+def walk(steps, rate):
+    measured = []
+    while True:
+        mv = steps.next()
+        if mv is None:
+            return measured
+        thresholds = st.group_thresholds(mv)
+        steps.add(mv, [rate(g, thresholds[g]) for g in range(len(st.CHANNELS_GROUPS))])
+        measured.append(mv)
+
+
+def s_curve(knee):
+    return lambda g, mv: 1000 * 0.5 * math.erfc((mv - knee) / 8)
+
+
+def test_uniform_steps():
+    assert walk(st.UniformSteps(100, 120, 5), s_curve(0)) == [100, 105, 110, 115, 120]
+
+
+def test_adaptive_steps_refine_around_the_knee():
+    measured = walk(st.AdaptiveSteps(0, 600, 2, budget=40), s_curve(333))
+    assert len(measured) <= 40 and len(set(measured)) == len(measured)
+    assert all(mv % 2 == 0 and 0 <= mv <= 600 for mv in measured)
+    assert measured[:3] == [0, 74, 148]
+    refined = measured[10:]
+    assert refined and all(abs(mv - 333) < 60 for mv in refined)
+
+
+def test_adaptive_steps_stop_when_the_curve_is_resolved():
+    # flat curve: nothing to refine after the coarse pass
+    assert len(walk(st.AdaptiveSteps(0, 600, 2), lambda g, mv: 50.0)) == 10
+    steps = st.AdaptiveSteps(0, 600, 2, budget=200)
+    measured = sorted(walk(steps, s_curve(333)))
+    assert len(measured) < 200
+    assert all(steps.change(a, b) <= st.RESOLUTION or b - a < 4 for a, b in zip(measured, measured[1:]))
+
+
+
+def test_interleaved_steps_give_every_group_every_value_once():
+    steps = st.InterleavedSteps(0, 1000, 100)
+    configs = walk(steps, s_curve(500))
+    assert len(configs) == steps.total == 11
+    for g in range(len(st.CHANNELS_GROUPS)):
+        assert sorted(config[g] for config in configs) == list(range(0, 1001, 100))
+    assert all(len(set(config)) == len(config) for config in configs)
+
+
+def test_interleaved_adaptive_steps_resolve_spread_knees_together():
+    knees = [100 + 100 * g for g in range(len(st.CHANNELS_GROUPS))]
+    rate = lambda g, mv: s_curve(knees[g])(g, mv)
+    one_by_one = walk(st.AdaptiveSteps(0, 1000, 10, budget=200), rate)
+    steps = st.InterleavedAdaptiveSteps(0, 1000, 10, budget=200)
+    together = walk(steps, rate)
+    assert len(together) * 2 < len(one_by_one)
+    for g, knee in enumerate(knees):
+        assert {knee - 10, knee + 10} <= set(steps.group_rates[g])
+
+# Threshold column of every row of a scan file
+def thresholds_of(path):
+    with open(path) as f:
+        header = f.readline().rstrip('\n').split('\t')
+        column = header.index('THRESHOLD')
+        return [float(line.split('\t')[column]) for line in f]
+
+
+@needs_pty
+def test_adaptive_scan_file_is_sorted_also_when_the_scan_fails(tmp_path):
+    from board_simulator import PtyBoardSimulator, VirtualBoard
+    sim = PtyBoardSimulator([VirtualBoard(0, seed=1)], line_rate=50).start()
+    path = tmp_path / "thrscan.csv"
+    steps = st.AdaptiveSteps(0, 1000, 10, budget=30)
+    timer = st.ScanTimer()
+
+    def on_step(mv, rates):
+        if timer.steps == 12:
+            raise RuntimeError("board lost")
+
+    try:
+        with serial.Serial(sim.port, st.BAUD_RATE, timeout=1) as port, open(path, "w+") as output_file:
+            with pytest.raises(RuntimeError, match="board lost"):
+                st.run_scan(port, [st.BoardScan(0, output_file)], steps, DwellPolicy(max_dwell=0.2), timer, on_step=on_step)
+    finally:
+        sim.stop()
+    thresholds = thresholds_of(path)
+    assert thresholds == sorted(thresholds) and len(set(thresholds)) == 12
+
+
+@needs_pty
+def test_board_that_does_not_answer_leaves_no_files(tmp_path, monkeypatch):
+    from board_simulator import PtyBoardSimulator, VirtualBoard
+    monkeypatch.setattr(st, 'STARTUP_TIMEOUT', 1)
+    sim = PtyBoardSimulator([VirtualBoard(0, seed=1)], line_rate=50).start()
+    targets = [(0, str(tmp_path / "b00.csv")), (5, str(tmp_path / "b05.csv"))]
+    worker = st.ScanWorker(sim.port, targets, st.UniformSteps(0, 100, 50), DwellPolicy(max_dwell=0.2))
+    try:
+        worker.run()
+    finally:
+        sim.stop()
+    assert worker.status.startswith('error')
+    assert os.listdir(tmp_path) == []
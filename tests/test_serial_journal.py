@@ -0,0 +1,112 @@
+import contextlib
+import filecmp
+import glob
+import os
+import time
+
+import pytest
+
+import protocol
+import serial_journal as sj
+
+LINES = [f"181026\t1200{n:02d}\t" + "\t".join(str(n + ch) for ch in range(48)) + "\t64\r\n" for n in range(20)]
+
+
+class FakeSerial:
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.closed = False
+
+    def read(self, size=1):
+        return self.chunks.pop(0) if self.chunks else b''
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+
+def write_journal(path, chunk_size=37):
+    journal = sj.SerialJournal(str(path), 'COM6', 115200)
+    data = "".join(LINES).encode()
+    for i in range(0, len(data), chunk_size):
+        journal.record(sj.RX, data[i:i + chunk_size])
+    journal.record(sj.TX, protocol.frame(0, 'getdata'))
+    journal.close()
+    return str(path)
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / "capture.tbj")
+    port = sj.CapturingSerial(FakeSerial([b'>Ack', b'', b'181026\t']), sj.SerialJournal(path, 'COM6', 115200))
+    assert port.read(64) == b'>Ack'
+    port.write(protocol.frame(0, 'start'))
+    assert port.read(64) == b''
+    port.read(64)
+    port.close()
+    assert port.ser.closed
+    header, records = sj.read_journal(path)
+    assert (header['port'], header['baud_rate'], header['version']) == ('COM6', 115200, sj.FORMAT_VERSION)
+    records = list(records)
+    # empty reads are not recorded
+    assert [(direction, data) for _, direction, data in records] == [
+        (sj.RX, b'>Ack'), (sj.TX, protocol.frame(0, 'start')), (sj.RX, b'181026\t')]
+    times = [t for t, _, _ in records]
+    assert times == sorted(times) and times[0] >= 0
+
+
+def test_truncated_last_record_is_ignored(tmp_path):
+    path = write_journal(tmp_path / "capture.tbj")
+    _, records = sj.read_journal(path)
+    complete = list(records)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 2)
+    _, records = sj.read_journal(path)
+    assert list(records) == complete[:-1]
+
+
+def test_not_a_journal(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_bytes(b"181026\t120000\n")
+    with pytest.raises(ValueError):
+        sj.read_journal(str(path))
+
+
+def test_replay_at_max_speed(tmp_path, capsys):
+    path = write_journal(tmp_path / "capture.tbj")
+    started = sj.read_journal(path)[0]['started']
+    result = sj.replay(path, str(tmp_path / "replay"), speed=None, quiet=True)
+    assert result['lines'] == len(LINES)
+    (received,) = glob.glob(str(tmp_path / "replay" / "received_data_*.txt"))
+    with open(received) as f:
+        rows = f.read().splitlines()
+    assert [row.split('\t', 1)[1] for row in rows] == [line.rstrip("\r\n") for line in LINES]
+    assert rows[0].startswith(time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(started)))
+
+
+def test_replay_of_a_capture_gives_the_same_files(tmp_path, capsys):
+    pytest.importorskip('pty')
+    from acquisition_engine import AcquisitionEngine
+    from board_simulator import PtyBoardSimulator, VirtualBoard
+    sim = PtyBoardSimulator([VirtualBoard(0, seed=1)], line_rate=50).start()
+    field = str(tmp_path / "field")
+    os.makedirs(field)
+    engine = AcquisitionEngine(lambda cmd, payload, board: protocol.frame(board, cmd, payload), field, capture=True)
+    engine.configure([(sim.port, 0, 0.5)])
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            engine.start(trigger_delay=0)
+            engine.boards[0].send('start').result(5)
+            time.sleep(1.5)
+            engine.stop()
+    finally:
+        sim.stop()
+    (journal,) = glob.glob(os.path.join(field, "*" + sj.JOURNAL_EXT))
+    result = sj.replay(journal, str(tmp_path / "replay"), speed=None, quiet=True)
+    (original,) = glob.glob(os.path.join(field, "received_data_*.txt"))
+    with open(original) as f:
+        assert result['lines'] >= len(f.read().splitlines()) > 0
+    (replayed,) = glob.glob(str(tmp_path / "replay" / "received_data_*.txt"))
+    assert filecmp.cmp(original, replayed, shallow=False)
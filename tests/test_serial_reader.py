@@ -0,0 +1,85 @@
+import queue
+
+import pytest
+import serial
+
+from serial_reader import SerialReader, synthetic_data_line
+
+LINES = [synthetic_data_line(n, 64) for n in (1, 22, 333)] + [b'>Status: 64\r\n', b'\n', b'>ACK\n']
+STREAM = b''.join(LINES)
+EXPECTED = [line.decode('ascii').strip() for line in LINES if line.strip()]
+
+
+def drain(reader):
+    out = []
+    while True:
+        try:
+            out.append(reader.lines.get_nowait())
+        except queue.Empty:
+            return out
+
+
+# cuts: start, inside a line, just before / after a terminator, between '\r' and '\n', end
+CUTS = [0, 10, len(LINES[0]) - 1, len(LINES[0]), STREAM.index(b'\r') + 1, len(STREAM) - 1, len(STREAM)]
+
+
+@pytest.mark.parametrize('cut', CUTS)
+def test_lines_split_across_two_chunks(cut):
+    reader = SerialReader(ser=None)
+    reader.feed(STREAM[:cut], 1.0)
+    reader.feed(STREAM[cut:], 2.0)
+    lines = drain(reader)
+    assert [line for arrival, line in lines] == EXPECTED
+    assert reader.lines_read == len(EXPECTED)
+    assert reader.bytes_read == len(STREAM)
+
+
+@pytest.mark.parametrize('size', [1, 7, 4096])
+def test_lines_fed_in_small_chunks(size):
+    reader = SerialReader(ser=None)
+    for start in range(0, len(STREAM), size):
+        reader.feed(STREAM[start:start + size])
+    assert [line for arrival, line in drain(reader)] == EXPECTED
+
+
+def test_incomplete_tail_waits_for_its_terminator():
+    reader = SerialReader(ser=None)
+    reader.feed(b'>Sta', 1.0)
+    assert drain(reader) == []
+    reader.feed(b'tus: 0', 2.0)
+    assert drain(reader) == []
+    reader.feed(b'\n>ACK', 3.0)
+    # a line gets the arrival time of the chunk that completes it
+    assert drain(reader) == [(3.0, '>Status: 0')]
+
+
+# Port that returns the given chunks, then fails as an unplugged port does
+class ChunkSerial:
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, size=1):
+        if not self.chunks:
+            raise serial.SerialException("unplugged")
+        chunk = self.chunks.pop(0)
+        data, rest = chunk[:size], chunk[size:]
+        if rest:
+            self.chunks.insert(0, rest)
+        return data
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+
+def test_reader_thread_drains_the_port_and_ends_with_none(capsys):
+    reader = SerialReader(ChunkSerial([STREAM[:50], b'', STREAM[50:]]), clock=lambda: 5.0).start()
+    lines = []
+    while True:
+        item = reader.lines.get(timeout=5)
+        if item is None:
+            break
+        lines.append(item)
+    assert lines == [(5.0, line) for line in EXPECTED]
+    assert "unplugged" in capsys.readouterr().out
@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+import protocol
+import status_monitor
+
+ON = protocol.STATUS_ACQUISITION_ON
+SD_ERROR = protocol.STATUS_SD_ERROR
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(status_monitor, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def monitor(holdoff=status_monitor.ALARM_HOLDOFF):
+    notified = []
+    return status_monitor.StatusMonitor(notified.append, holdoff), notified
+
+
+def test_edges_only(clock):
+    m, notified = monitor(holdoff=0)
+    for word in (ON, ON, ON | SD_ERROR, ON | SD_ERROR, ON):
+        m.observe(word)
+    assert [(e.name, e.set, e.level) for e in notified] == [
+        (protocol.STATUS_BITS[ON], True, 'info'),
+        (protocol.STATUS_BITS[SD_ERROR], True, 'alarm'),
+        (protocol.STATUS_BITS[SD_ERROR], False, 'info'),
+    ]
+    assert (m.edges, m.alarms) == (3, 1)
+
+
+def test_unexpected_stop_is_an_alarm(clock):
+    m, notified = monitor(holdoff=0)
+    m.observe(ON)
+    m.observe_stopped()
+    assert notified[-1].level == 'alarm' and notified[-1].source == 'getdata'
+    assert notified[-1].text == "acquisition stopped unexpectedly"
+
+
+def test_expected_stop_is_not_an_alarm(clock):
+    m, notified = monitor(holdoff=0)
+    m.observe(ON)
+    m.expect_stop()
+    m.observe(0)
+    assert notified[-1].level == 'info' and notified[-1].text == "acquisition stopped"
+    # the next start clears the expectation
+    m.observe(ON)
+    m.observe(0)
+    assert notified[-1].level == 'alarm'
+
+
+def test_holdoff_counts_then_summarizes(clock):
+    m, notified = monitor(holdoff=300)
+    m.observe(ON)
+    for word in (ON | SD_ERROR, ON, ON | SD_ERROR, ON, ON | SD_ERROR):
+        clock[0] += 10
+        m.observe(word)
+    assert [e.text for e in notified] == ["acquisition on", protocol.STATUS_BITS[SD_ERROR]]
+    assert m.suppressed == 4 and m.edges == 6 and len(m.recent(100)) == 6
+    # the same word again before the end of the holdoff: nothing new
+    m.observe(ON | SD_ERROR)
+    assert len(notified) == 2
+    clock[0] += 300
+    m.observe(ON | SD_ERROR)
+    assert notified[-1].text == f"{protocol.STATUS_BITS[SD_ERROR]}: 4 more change(s), now set"
+    assert notified[-1].level == 'alarm'
+    # other bits are not held back by the SD error holdoff
+    m.observe(SD_ERROR)
+    assert notified[-1].bit == ON and notified[-1].level == 'alarm'
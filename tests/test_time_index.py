@@ -0,0 +1,62 @@
+import datetime
+import os
+
+import data_parser
+import time_index
+from output_writers import DailyFileWriter
+
+START = datetime.datetime(2026, 10, 17, 23, 50, 15)
+N_RECORDS = 20 * 60             # 20 minutes, across midnight (board time)
+
+
+def board_line(when, n):
+    return f"{when:%d%m%y}\t{when:%H%M%S}\t" + "\t".join(str(n + ch) for ch in range(48)) + "\t64"
+
+
+# Writes the data files as the acquisition does: PC time = board time, index written online
+def write_data(directory):
+    writer = DailyFileWriter(directory, 'received_data')
+    index = time_index.TimeIndexWriter()
+    for n in range(N_RECORDS):
+        when = START + datetime.timedelta(seconds=n)
+        line = board_line(when, n)
+        offset = writer.write_line(f"{when:%d/%m/%Y %H:%M:%S}\t{line}", when)
+        index.observe(writer.path, data_parser.parse_data_line(line).timestamp, offset)
+        if n == 100:
+            writer.write_line(f"{when:%d/%m/%Y %H:%M:%S}\tgarbage", when)
+    writer.close()
+    index.close()
+    return [os.path.join(directory, f"received_data_{day}_10_2026.txt") for day in (17, 18)]
+
+
+def test_online_index_equals_rebuilt_index(tmp_path):
+    paths = write_data(str(tmp_path))
+    online = [time_index.load_index(path) for path in paths]
+    assert time_index.rebuild_all(str(tmp_path)) == len(online[0][0]) + len(online[1][0])
+    assert [time_index.load_index(path) for path in paths] == online
+    assert len(online[0][0]) == 10 and online[1][1][0] == 0
+
+
+def test_query_reads_only_the_requested_range(tmp_path):
+    write_data(str(tmp_path))
+    start, stop = datetime.datetime(2026, 10, 17, 23, 58, 30), datetime.datetime(2026, 10, 18, 0, 1, 10)
+    timestamps, counts, status, channels = time_index.query_range(str(tmp_path), start, stop, channels=[1, 48])
+    first = (start - START).seconds
+    assert timestamps.tolist() == list(range(time_index.to_timestamp(start), time_index.to_timestamp(stop) + 1))
+    assert counts.shape == (2, len(timestamps)) and counts[:, 0].tolist() == [first, first + 47]
+    begin, end = time_index.byte_range(os.path.join(str(tmp_path), "received_data_17_10_2026.txt"),
+                                       time_index.to_timestamp(start), time_index.to_timestamp(stop))
+    assert begin > 0 and end is None
+
+
+def test_query_without_index_builds_it(tmp_path):
+    paths = write_data(str(tmp_path))
+    for path in paths:
+        os.remove(time_index.index_path_for(path))
+    timestamps = time_index.query_range(str(tmp_path), START, START + datetime.timedelta(minutes=1))[0]
+    assert len(timestamps) == 61 and os.path.exists(time_index.index_path_for(paths[0]))
+
+
+def test_empty_range(tmp_path):
+    timestamps, counts, status, channels = time_index.query_range(str(tmp_path), START, START, channels=[3])
+    assert len(timestamps) == 0 and counts.shape == (1, 0)
@@ -0,0 +1,90 @@
+import types
+from concurrent.futures import Future
+
+import protocol
+import trigger_scheduler
+from trigger_scheduler import TriggerScheduler, IDLE_MAX_PERIOD
+
+PERIOD = 20                     # PERIODIC_TRIGGER_PERIOD of Digitech_Bril_Com
+DATA = "181026\t120000\t" + "\t".join(["5"] * 48) + "\t64"
+
+
+# Wall clock that only moves while the scheduler sleeps
+class FakeWake:
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.flag = False
+
+    def wait(self, timeout):
+        self.clock.now += timeout
+        return self.flag
+
+    def set(self):
+        self.flag = True
+
+    def clear(self):
+        self.flag = False
+
+
+# Board counting before stopped_at and again from started_at (started from its front panel)
+class FakeBoard:
+
+    name = 'fake#0'
+
+    def __init__(self, clock, stopped_at, started_at, end):
+        self.clock = clock
+        self.stopped_at, self.started_at, self.end = stopped_at, started_at, end
+        self.polls = []
+        self.trigger = None
+
+    def format_command(self, cmd):
+        return cmd
+
+    def submit(self, frame, priority):
+        now = self.clock.now
+        self.polls.append((now, self.trigger.idle_period))
+        if now >= self.end:
+            self.trigger.stop()
+        future = Future()
+        running = now < self.stopped_at or now >= self.started_at
+        future.set_result([DATA] if running else [protocol.DATA_DEACTIVATED_REPLY])
+        return future
+
+
+def run(monkeypatch, capsys, stopped_at, started_at, end):
+    clock = types.SimpleNamespace(now=0.0)
+    monkeypatch.setattr(trigger_scheduler, 'time', types.SimpleNamespace(time=lambda: clock.now))
+    board = FakeBoard(clock, stopped_at, started_at, end)
+    board.trigger = TriggerScheduler(board, PERIOD)
+    board.trigger._wake = FakeWake(clock)
+    board.trigger._run(0)
+    capsys.readouterr()
+    return board
+
+
+def test_stopped_board_is_polled_less_and_less(monkeypatch, capsys):
+    board = run(monkeypatch, capsys, stopped_at=100, started_at=3700, end=4100)
+    idle = [period for t, period in board.polls if period is not None]
+    assert idle[:5] == [2 * PERIOD, 4 * PERIOD, 8 * PERIOD, IDLE_MAX_PERIOD, IDLE_MAX_PERIOD]
+    stopped = [t for t, period in board.polls if 100 <= t < 3700]
+    assert len(stopped) < 20                    # 180 at the normal period
+    # data lines again: back to the normal period at once
+    restarted = [t for t, period in board.polls if t >= 3700]
+    assert {round(b - a, 6) for a, b in zip(restarted[1:], restarted[2:])} == {PERIOD}
+    assert board.polls[-1][1] is None
+    assert board.trigger.missed == 0 and board.trigger.errors == 0
+
+
+def test_running_board_keeps_the_normal_period(monkeypatch, capsys):
+    board = run(monkeypatch, capsys, stopped_at=10 ** 9, started_at=10 ** 9, end=1000)
+    times = [t for t, period in board.polls]
+    assert len(times) > 40 and {round(b - a, 6) for a, b in zip(times, times[1:])} == {PERIOD}
+    assert all(period is None for t, period in board.polls)
+
+
+def test_start_command_resumes_at_once(monkeypatch, capsys):
+    board = run(monkeypatch, capsys, stopped_at=0, started_at=10 ** 9, end=500)
+    assert board.trigger.idle_period is not None
+    board.trigger.resume()
+    assert board.trigger.idle_period is None
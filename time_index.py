@@ -0,0 +1,153 @@
+import bisect
+import datetime
+import os
+import struct
+import sys
+import threading
+
+from data_parser import parse_data_line, parse_data_bytes, EPOCH_ORDINAL, N_CHANNELS
+from compressed_files import open_file, resolve, glob_files, strip_compression
+
+# Sidecar time index for the daily received_data files.
+# received_data_DD_MM_YYYY.idx holds one fixed size entry per minute of board time:
+#   int64 minute (board wall clock, seconds since 1970, multiple of INDEX_RESOLUTION) | int64 byte offset
+# pointing at the first data line of that minute. Entries are strictly increasing in time, so
+# a time range maps to a byte range with two binary searches and only those bytes are parsed.
+# A compressed data file keeps the index of the text file (offsets are uncompressed offsets).
+
+INDEX_RESOLUTION = 60           # seconds per index entry
+INDEX_EXT = '.idx'
+ENTRY_STRUCT = struct.Struct('<qq')
+
+
+def index_path_for(data_path):
+    return os.path.splitext(strip_compression(data_path))[0] + INDEX_EXT
+
+
+def to_timestamp(when):
+    return ((when.date().toordinal() - EPOCH_ORDINAL) * 86400
+            + when.hour * 3600 + when.minute * 60 + when.second)
+
+
+def load_index(data_path):
+    path = index_path_for(data_path)
+    if not os.path.exists(path):
+        return [], []
+    with open(path, 'rb') as f:
+        raw = f.read()
+    n = len(raw) // ENTRY_STRUCT.size
+    entries = [ENTRY_STRUCT.unpack_from(raw, i * ENTRY_STRUCT.size) for i in range(n)]
+    return [e[0] for e in entries], [e[1] for e in entries]
+
+
+# Incremental index builder used by the acquisition writer: call observe() for every data line
+# with the data file path, the board timestamp and the byte offset returned by the writer.
+class TimeIndexWriter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._handle = None
+        self._last = None
+
+    def observe(self, data_path, timestamp, offset):
+        slot = timestamp - timestamp % INDEX_RESOLUTION
+        with self._lock:
+            if data_path != self._path:
+                self._open(data_path)
+            if self._last is None or slot > self._last:
+                self._handle.write(ENTRY_STRUCT.pack(slot, offset))
+                self._handle.flush()
+                self._last = slot
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+                self._path = None
+
+    def _open(self, data_path):
+        if self._handle is not None:
+            self._handle.close()
+        slots, offsets = load_index(data_path)
+        self._last = slots[-1] if slots else None
+        self._path = data_path
+        self._handle = open(index_path_for(data_path), 'ab')
+
+
+# Rebuild the index of an existing data file in one pass
+def rebuild_index(data_path):
+    entries = []
+    last = None
+    offset = 0
+    with open_file(data_path, 'rb') as f:
+        for raw in f:
+            record = parse_data_line(raw.decode('utf-8', errors='ignore'))
+            if record is not None:
+                slot = record.timestamp - record.timestamp % INDEX_RESOLUTION
+                if last is None or slot > last:
+                    entries.append(ENTRY_STRUCT.pack(slot, offset))
+                    last = slot
+            offset += len(raw)
+    with open(index_path_for(data_path), 'wb') as f:
+        f.write(b''.join(entries))
+    return len(entries)
+
+
+def rebuild_all(directory, prefix='received_data'):
+    total = 0
+    for data_path in glob_files(os.path.join(directory, f"{prefix}_*.txt")):
+        total += rebuild_index(data_path)
+    return total
+
+
+# Byte range [begin, end) of data_path that can contain records between start and stop (timestamps)
+def byte_range(data_path, start, stop):
+    slots, offsets = load_index(data_path)
+    if not slots:
+        return 0, None
+    i = bisect.bisect_right(slots, start) - 1
+    j = bisect.bisect_right(slots, stop)
+    begin = offsets[i] if i >= 0 else 0
+    end = offsets[j] if j < len(offsets) else None
+    return begin, end
+
+
+# Records between start and stop (datetimes, board time) for the given 1-based channels.
+# Data arriving after midnight is stored in the next day's file, so that file is searched too.
+# Returns (timestamps, counts[len(channels), N], status, channels).
+def query_range(directory, start, stop, channels=None, prefix='received_data'):
+    import numpy as np
+    channels = list(channels) if channels else list(range(1, N_CHANNELS + 1))
+    t0, t1 = to_timestamp(start), to_timestamp(stop)
+    parts = []
+    day = start.date()
+    while day <= stop.date() + datetime.timedelta(days=1):
+        data_path = resolve(os.path.join(directory, f"{prefix}_{day.strftime('%d_%m_%Y')}.txt"))
+        day += datetime.timedelta(days=1)
+        if data_path is None:
+            continue
+        if not os.path.exists(index_path_for(data_path)):
+            rebuild_index(data_path)
+        begin, end = byte_range(data_path, t0, t1)
+        with open_file(data_path, 'rb') as f:
+            f.seek(begin)
+            data = f.read() if end is None else f.read(end - begin)
+        arrays = parse_data_bytes(data)
+        keep = (arrays.timestamps >= t0) & (arrays.timestamps <= t1)
+        parts.append((arrays.timestamps[keep], arrays.counts[:, keep], arrays.status[keep]))
+    rows = [c - 1 for c in channels]
+    if not parts:
+        return (np.empty(0, dtype=np.int64), np.empty((len(rows), 0), dtype=np.uint32),
+                np.empty(0, dtype=np.uint8), channels)
+    timestamps = np.concatenate([p[0] for p in parts])
+    counts = np.concatenate([p[1][rows] for p in parts], axis=1)
+    status = np.concatenate([p[2] for p in parts])
+    return timestamps, counts, status, channels
+
+
+if __name__ == '__main__':
+    # python time_index.py <directory>   -> rebuild the indexes of all received_data files
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    print(f"{rebuild_all(directory)} index entries written in {directory}")
@@ -0,0 +1,149 @@
+import collections
+import math
+import threading
+import time
+
+import metrics
+import protocol
+from command_dispatcher import PRIORITY_PERIODIC
+
+# Periodic getdata trigger of one board.
+# Requests fire on absolute wall-clock boundaries (multiples of the period since midnight UTC,
+# plus TRIGGER_OFFSET so that the board has closed the current second), so the batches stay
+# aligned to the clock whatever the time spent writing and waiting for the data.
+# The getdata reply tells whether the board is counting: '>Data req with Count Deactivated!' (or a
+# last data line without status bit 64) means stopped, and the poll period doubles from twice the
+# normal period up to IDLE_MAX_PERIOD. getdata keeps being sent, so the first data lines (board
+# started from its front panel or by another host) bring the trigger back to the normal period, as do
+# a start or reset command sent from here and a reset banner. A board started from elsewhere is only
+# seen at the next idle poll: what it counted before the last 23 s (its buffer) is lost.
+# The period can be changed while running with set_period(); stats() reports the firing jitter,
+# which also goes to the trigger_lateness_seconds histogram.
+
+TRIGGER_OFFSET = 0.1            # s after the boundary (was the 100 ms alignment pad)
+IDLE_MAX_PERIOD = 300.0         # s between getdata polls while the acquisition is stopped
+RESPONSE_WAIT = 30.0            # s to wait for a getdata burst before giving up on it
+JITTER_SAMPLES = 1000           # firing delays kept for the statistics
+MAX_SLEEP = 1.0                 # s; re-check the wall clock at least this often
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class TriggerScheduler:
+
+    def __init__(self, board, period, offset=TRIGGER_OFFSET, idle_backoff=True):
+        self.board = board
+        self.period = period
+        self.offset = offset
+        self.idle_backoff = idle_backoff
+        self.idle_period = None         # poll period while the acquisition is stopped, None when running
+        self.fired = 0
+        self.missed = 0
+        self.errors = 0
+        self.lateness = metrics.REGISTRY.histogram('trigger_lateness_seconds', "Periodic trigger firing delay",
+                                                   board=board.name)
+        self.jitter = collections.deque(maxlen=JITTER_SAMPLES)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, start_delay=0):
+        self._thread = threading.Thread(target=self._run, args=(start_delay,), name=f"trigger-{self.board.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def set_period(self, period):
+        if period <= 0:
+            raise ValueError("Trigger period must be positive")
+        self.period = period
+        self._wake.set()
+
+    # Back to the normal period at the next boundary (acquisition started or board reset)
+    def resume(self):
+        if self.idle_period is not None:
+            self.idle_period = None
+            self._wake.set()
+
+    # First boundary after now (wall clock, s)
+    def next_boundary(self, period, now=None):
+        now = time.time() if now is None else now
+        return math.floor((now - self.offset) / period) * period + period + self.offset
+
+    # Sleep until target; False if woken (period change, resume or stop)
+    def _sleep_until(self, target):
+        while True:
+            delay = target - time.time()
+            if delay <= 0:
+                return True
+            if self._wake.wait(min(delay, MAX_SLEEP)):
+                self._wake.clear()
+                return False
+
+    def _run(self, start_delay):
+        if self._stop.wait(start_delay):
+            return
+        getdata = self.board.format_command('getdata')
+        last_target = None
+        while not self._stop.is_set():
+            idle = self.idle_period is not None
+            period = self.idle_period or self.period
+            target = self.next_boundary(period)
+            if not self._sleep_until(target) or self._stop.is_set():
+                continue
+            fired = time.time()
+            self.fired += 1
+            self.jitter.append((fired - target) * 1000)
+            self.lateness.observe(max(fired - target, 0.0))
+            if last_target is not None and not idle and target - last_target > 1.5 * period:
+                self.missed += int(round((target - last_target) / period)) - 1
+            # the idle polls are not missed triggers
+            last_target = None if idle else target
+            try:
+                self._after_getdata(self.board.submit(getdata, PRIORITY_PERIODIC).result(RESPONSE_WAIT))
+            except Exception as e:
+                self.errors += 1
+                print(f"Error Periodic trigger ({self.board.name}): {e}")
+
+    # No lines (empty buffer) says nothing about the state: keep the current period
+    def _after_getdata(self, lines):
+        if not self.idle_backoff or not lines:
+            return
+        if lines == [protocol.DATA_DEACTIVATED_REPLY]:
+            self._go_idle()
+            return
+        status = protocol.status_from_data_line(lines[-1])
+        if status is not None and not status & protocol.STATUS_ACQUISITION_ON:
+            self._go_idle()
+        elif status is not None and self.idle_period is not None:
+            # data again: the board was started from elsewhere
+            self.idle_period = None
+            print(f"[Trigger] {self.board.name}: acquisition running, back to every {self.period:g} s")
+
+    def _go_idle(self):
+        # 2, 4, 8... times the normal period, up to IDLE_MAX_PERIOD (never below the normal period)
+        previous = self.idle_period
+        self.idle_period = max(self.period, min(2 * (previous or self.period), IDLE_MAX_PERIOD))
+        if previous is None:
+            print(f"[Trigger] {self.board.name}: acquisition stopped, polling every {self.idle_period:g} s or more")
+
+    def stats(self):
+        jitter = list(self.jitter)
+        return {
+            'period_s': self.period,
+            'idle_poll_s': self.idle_period,
+            'fired': self.fired,
+            'missed': self.missed,
+            'errors': self.errors,
+            'jitter_p50_ms': round(percentile(jitter, 50), 3) if jitter else None,
+            'jitter_p99_ms': round(percentile(jitter, 99), 3) if jitter else None,
+            'jitter_max_ms': round(max(jitter), 3) if jitter else None,
+        }